@@ -0,0 +1,107 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Admission control for a listening server.
+
+An AdmissionControl object decides whether a newly accepted connection
+is taken on or shed. There are three limits, each disabled by a zero;
+
+* the number of concurrent connections,
+* the rate of acceptance, as a token bucket with a burst allowance,
+* the number of concurrent connections from one IP address.
+
+A shed connection is sent a Rejected message and closed, i.e. the
+client is told why rather than left to guess at the lost connection.
+Admission is decided on the thread of the owning server object, so
+there is no locking.
+'''
+import time
+import ansar.encode as ar
+
+__all__ = [
+	'Rejected',
+	'AdmissionControl',
+]
+
+class Rejected(object):
+	'''Notification to a client that its connection is being shed.'''
+	def __init__(self, reason=None, retry_after=0.0):
+		self.reason = reason
+		self.retry_after = retry_after
+
+REJECTED_SCHEMA = {
+	'reason': str,
+	'retry_after': float,		# Suggested pause before another attempt.
+}
+
+ar.bind(Rejected, object_schema=REJECTED_SCHEMA)
+
+class AdmissionControl(object):
+	def __init__(self, max_connections=0, accept_rate=0.0, accept_burst=0, per_ip=0):
+		self.max_connections = max_connections
+		self.accept_rate = accept_rate
+		self.accept_burst = max(1, accept_burst or int(accept_rate))
+		self.per_ip = per_ip
+
+		self.tokens = float(self.accept_burst)
+		self.refilled = time.monotonic()
+		self.connection = {}		# Remote address to IP.
+		self.ip_count = {}			# IP to number of connections.
+		self.rejected = 0
+
+	def refill(self):
+		now = time.monotonic()
+		self.tokens = min(float(self.accept_burst), self.tokens + (now - self.refilled) * self.accept_rate)
+		self.refilled = now
+
+	def admit(self, remote_address, accepted_ipp):
+		'''Take on the connection or return a Rejected.'''
+		ip = accepted_ipp.host
+		if self.max_connections and len(self.connection) >= self.max_connections:
+			return self.reject(f'at maximum connections ({self.max_connections})', 1.0)
+		if self.per_ip and self.ip_count.get(ip, 0) >= self.per_ip:
+			return self.reject(f'at maximum connections from {ip} ({self.per_ip})', 1.0)
+		if self.accept_rate:
+			self.refill()
+			if self.tokens < 1.0:
+				return self.reject(f'over accept rate ({self.accept_rate:.1f}/s)', (1.0 - self.tokens) / self.accept_rate)
+			self.tokens -= 1.0
+
+		self.connection[remote_address] = ip
+		self.ip_count[ip] = self.ip_count.get(ip, 0) + 1
+		return None
+
+	def reject(self, reason, retry_after):
+		self.rejected += 1
+		return Rejected(reason=reason, retry_after=retry_after)
+
+	def release(self, remote_address):
+		'''Forget an admitted connection. Return true if it was known.'''
+		ip = self.connection.pop(remote_address, None)
+		if ip is None:
+			return False
+		n = self.ip_count[ip] - 1
+		if n:
+			self.ip_count[ip] = n
+		else:
+			del self.ip_count[ip]
+		return True
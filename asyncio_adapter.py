@@ -0,0 +1,244 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Connections and listens for asyncio applications.
+
+The library runs its networking on threads of its own and delivers
+messages to objects through queues. An asyncio application using
+that machinery needs a bridging thread and pays for two handoffs
+per message. This adapter speaks the same framing directly, from
+coroutines on the running loop. Peers cannot tell the difference,
+e.g. a coroutine client can talk to listen-at-address and a coroutine
+server can answer connect-to-address.
+
+	c = await connect(ipp)			# Connection or NotConnected
+	c.send(Hello(my_name='Gladys'))
+	m = await c.receive()			# Welcome, Blob or Abandoned
+	c.close()
+
+	listener = await listen(ipp)	# Listener or NotListening
+	async for c in listener:		# Accepted connections
+		...
+	async for m in c:				# Messages until closed
+		...
+
+Each connection is treated as a single object at each end, i.e.
+responses go back to whoever sent the request. Binary blocks, e.g.
+from the compact codec, travel as ar.Blob.
+
+The framing is the wire format of the library. It is declared here
+rather than imported from the internals of the library, and keep-alive
+messages are found by their names on the wire. A malformed frame ends
+that connection with a Faulted, leaving any others untouched.
+'''
+import asyncio
+import functools
+import ansar.connect as ar
+
+__all__ = [
+	'Connection',
+	'Listener',
+	'connect',
+	'listen',
+	'stopped',
+]
+
+# Local identity of the coroutine end of a connection.
+LOCAL_ADDRESS = (1,)
+GIANT_FRAME = 1048576
+
+# Leading part of every frame. Encoded without a type name,
+# i.e. the same on the wire as the header of the library.
+class FrameHeader(object):
+	def __init__(self, to_address=None, return_address=None, tunnel=False):
+		self.to_address = to_address
+		self.return_address = return_address
+		self.tunnel = tunnel
+
+HEADER_SCHEMA = {
+	'to_address': ar.TargetAddress(),
+	'return_address': ar.Address(),
+	'tunnel': ar.Boolean(),
+}
+
+ar.bind(FrameHeader, object_schema=HEADER_SCHEMA)
+
+HEADING = ar.UserDefined(FrameHeader)
+SPACE = ar.VectorOf(ar.Address())
+
+# Keep-alives of the library transport.
+TRANSPORT_ENQUIRY = ar.decode_type('ansar.connect.socketry.TransportEnquiry')
+TRANSPORT_ACK = ar.decode_type('ansar.connect.socketry.TransportAck')
+
+def frame_sizes(line):
+	'''Parse the leading line of a frame. Return the three sizes or raise ValueError.'''
+	a = line[:-1].split(b',')
+	if len(a) != 3 or not all(n.isdigit() for n in a):
+		raise ValueError(f'mangled frame dimensions {bytes(line[:32])!r}')
+	n0, n1, n3 = [int(n) for n in a]
+	if n0 + n1 > n3:
+		raise ValueError(f'unlikely frame offsets {n0},{n1},{n3}')
+	if n3 > GIANT_FRAME:
+		raise ValueError(f'oversize frame of {n3} bytes')
+	return n0, n1, n3
+
+class Connection(object):
+	def __init__(self, reader, writer, opened_ipp):
+		self.reader = reader
+		self.writer = writer
+		self.opened_ipp = opened_ipp
+		self.codec = ar.CodecJson()
+		self.remote = (0,)			# Default object at remote end.
+		self.closed = None			# Closed, Abandoned or Faulted.
+
+	def send(self, m):
+		'''Queue the message for sending. Use drain() to wait for the transport.'''
+		if self.closed:
+			return
+		codec = self.codec
+		tunnel = isinstance(m, ar.Blob)
+		b0 = codec.encode(FrameHeader(self.remote, LOCAL_ADDRESS, tunnel), HEADING).encode('utf-8')
+		if tunnel:
+			b1 = m.block
+			space = []
+		else:
+			space = []
+			b1 = codec.encode(m, ar.Any(), space=space).encode('utf-8')
+		b2 = codec.encode(space, SPACE).encode('utf-8')
+		n3 = len(b0) + len(b1) + len(b2)
+		self.writer.writelines((f'{len(b0)},{len(b1)},{n3}\n'.encode('ascii'), b0, b1, b2, b'\n'))
+
+	async def drain(self):
+		await self.writer.drain()
+
+	async def receive(self):
+		'''Wait for the next message. Return it, or Closed/Abandoned/Faulted at the end.'''
+		while not self.closed:
+			try:
+				line = await self.reader.readuntil(b'\n')
+				n0, n1, n3 = frame_sizes(line)
+				frame = await self.reader.readexactly(n3 + 1)
+				if frame[-1] != 10:		# ord('\n')
+					raise ValueError(f'unexpected {frame[-1]} at end-of-frame')
+
+				codec = self.codec
+				b = n0 + n1
+				header, _ = codec.decode(frame[:n0].decode('utf-8'), HEADING)
+				space, _ = codec.decode(frame[b:n3].decode('utf-8'), SPACE)
+				if header.tunnel:
+					m = ar.Blob(block=frame[n0:b])
+				else:
+					m, _ = codec.decode(frame[n0:b].decode('utf-8'), ar.Any(), space=space)
+			except (asyncio.IncompleteReadError, ConnectionError):
+				self.closed = ar.Abandoned()
+				break
+			except asyncio.LimitOverrunError:
+				self.fault('frame dimensions too long')
+				break
+			except (ValueError, UnicodeDecodeError, ar.CodecFailed) as e:
+				self.fault(str(e))
+				break
+
+			self.remote = tuple(header.return_address[:-1]) + (0,)		# Reply to sender.
+			if isinstance(m, TRANSPORT_ENQUIRY):		# Keep-alive.
+				self.send(TRANSPORT_ACK())
+				continue
+			return m
+		return self.closed
+
+	def fault(self, reason):
+		'''Close the connection after a framing error.'''
+		self.closed = ar.Faulted('malformed frame', reason)
+		self.writer.close()
+
+	def __aiter__(self):
+		return self
+
+	async def __anext__(self):
+		m = await self.receive()
+		if isinstance(m, (ar.Closed, ar.Abandoned, ar.Faulted)):
+			raise StopAsyncIteration
+		return m
+
+	def close(self):
+		if not self.closed:
+			self.closed = ar.Closed()
+		self.writer.close()
+
+	async def wait_closed(self):
+		try:
+			await self.writer.wait_closed()
+		except ConnectionError:
+			pass
+
+async def connect(ipp):
+	'''Open a connection to the address. Return a Connection or NotConnected.'''
+	try:
+		reader, writer = await asyncio.open_connection(ipp.host, ipp.port)
+	except OSError as e:
+		return ar.NotConnected(ipp, e.errno or 0, str(e))
+	return Connection(reader, writer, ipp)
+
+class Listener(object):
+	def __init__(self, listening_ipp):
+		self.listening_ipp = listening_ipp
+		self.server = None
+		self.accepted = asyncio.Queue()
+
+	def accept(self, reader, writer):
+		host, port = writer.get_extra_info('peername')[:2]
+		self.accepted.put_nowait(Connection(reader, writer, ar.HostPort(host, port)))
+
+	def __aiter__(self):
+		return self
+
+	async def __anext__(self):
+		c = await self.accepted.get()
+		if c is None:
+			raise StopAsyncIteration
+		return c
+
+	def close(self):
+		self.server.close()
+		self.accepted.put_nowait(None)
+
+async def listen(ipp):
+	'''Listen at the address. Return a Listener or NotListening.'''
+	listener = Listener(ipp)
+	async def accepted(reader, writer):
+		listener.accept(reader, writer)
+	try:
+		listener.server = await asyncio.start_server(accepted, ipp.host, ipp.port, reuse_address=True)
+	except OSError as e:
+		return ar.NotListening(ipp, e.errno or 0, str(e))
+	return listener
+
+async def stopped(self, seconds=0.25):
+	'''Wait for a Stop to arrive at the object hosting the loop, e.g. control-c.'''
+	loop = asyncio.get_running_loop()
+	select = functools.partial(self.select, ar.Stop, seconds=seconds)
+	while True:
+		# Poll, so that a cancelled wait releases its
+		# executor thread promptly.
+		m = await loop.run_in_executor(None, select)
+		if isinstance(m, ar.Stop):
+			return m
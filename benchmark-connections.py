@@ -0,0 +1,219 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A memory benchmark of idle connections.
+
+Starts listen-compact-sessions-at-address on loopback, with the read
+and idle timeouts disabled. Opens a number of plain sockets to it, in
+batches, sending nothing. Source addresses are spread across 127.0.0.x
+so that the ephemeral ports of a single address are not exhausted. Once
+the server holds every connection (counted as descriptors in /proc),
+the growth in server RSS is divided by the number of connections, i.e.
+Linux only.
+
+Both processes need a descriptor limit above the number of connections.
+The soft limit of this process is raised to the hard limit and the
+server inherits it.
+'''
+import os
+import sys
+import time
+import signal
+import socket
+import resource
+import subprocess
+import ansar.connect as ar
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SERVER_SCRIPT = 'listen-compact-sessions-at-address.py'
+
+# Ephemeral ports per source address, allowing
+# for what is already in use.
+PORTS_PER_ADDRESS = 20000
+
+def process_memory(pid):
+	'''Current resident memory of a process, in kilobytes.'''
+	with open(f'/proc/{pid}/status') as f:
+		for line in f:
+			if line.startswith('VmRSS:'):
+				return int(line.split()[1])
+	return 0
+
+def process_descriptors(pid):
+	'''Number of open descriptors in a process.'''
+	return len(os.listdir(f'/proc/{pid}/fd'))
+
+def raise_descriptor_limit():
+	'''Raise the soft limit on descriptors to the hard limit. Return the new limit.'''
+	soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+	if hard == resource.RLIM_INFINITY or hard > soft:
+		try:
+			resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+			soft = hard
+		except (ValueError, OSError):
+			pass
+	return soft
+
+class ConnectionsReport(object):
+	def __init__(self, connections=0, seconds=0.0, baseline_kb=0, rss_kb=0, bytes_per_connection=0):
+		self.connections = connections
+		self.seconds = seconds
+		self.baseline_kb = baseline_kb
+		self.rss_kb = rss_kb
+		self.bytes_per_connection = bytes_per_connection
+
+	def __str__(self):
+		return (f'{self.connections} connections in {self.seconds:.2f}s, '
+			f'rss {self.baseline_kb}kB to {self.rss_kb}kB, {self.bytes_per_connection} bytes per connection')
+
+REPORT_SCHEMA = {
+	'connections': int,
+	'seconds': float,				# To open them all.
+	'baseline_kb': int,				# Server RSS before.
+	'rss_kb': int,					# And after.
+	'bytes_per_connection': int,
+}
+
+ar.bind(ConnectionsReport, object_schema=REPORT_SCHEMA)
+
+# Confirm the server is accepting connections. Allow for
+# the time taken to start a process.
+def server_ready(self, ipp, attempts=20):
+	for i in range(attempts):
+		s = socket.socket()
+		try:
+			s.connect((ipp.host, ipp.port))
+			return None
+		except OSError as e:
+			not_connected = ar.Faulted(f'cannot connect to {ipp}', str(e))
+		finally:
+			s.close()
+		t = self.select(ar.Stop, seconds=0.25)
+		if isinstance(t, ar.Stop):
+			return ar.Aborted()
+	return not_connected
+
+# Wait for the server to hold the expected number of descriptors.
+def server_holds(self, server, expected, seconds):
+	ends = time.monotonic() + seconds
+	while process_descriptors(server.pid) < expected:
+		if time.monotonic() > ends:
+			return ar.Faulted('server not keeping up', f'{expected} descriptors not reached after {seconds} seconds')
+		t = self.select(ar.Stop, seconds=0.25)
+		if isinstance(t, ar.Stop):
+			return ar.Aborted()
+	return None
+
+# Open the idle connections, holding every socket.
+def open_connections(self, settings, server, held, base):
+	address = settings.host.split('.')
+	spread = settings.host.startswith('127.')
+	for i in range(settings.connections):
+		s = socket.socket()
+		if spread:		# Next source address on loopback.
+			source = '.'.join(address[:3] + [str(1 + (i // PORTS_PER_ADDRESS) % 254)])
+			s.bind((source, 0))
+		s.connect((settings.host, settings.port))
+		held.append(s)
+		if len(held) % settings.batch == 0:
+			r = server_holds(self, server, base + len(held), settings.batch_seconds)
+			if r is not None:
+				return r
+	return server_holds(self, server, base + len(held), settings.batch_seconds)
+
+# The benchmark object.
+def benchmark_connections(self, settings):
+	limit = raise_descriptor_limit()
+	if limit != resource.RLIM_INFINITY and limit < settings.connections + 64:
+		return ar.Faulted('descriptor limit too low', f'{settings.connections} connections against a limit of {limit}')
+
+	command = [sys.executable, os.path.join(HERE, SERVER_SCRIPT),
+		f'--host={settings.host}',
+		f'--port={settings.port}',
+		'--read-seconds=0.0',
+		'--idle-seconds=0.0',
+	]
+	server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+	self.console(f'Started server ({server.pid})')
+
+	held = []
+	try:
+		ipp = ar.HostPort(settings.host, settings.port)
+		r = server_ready(self, ipp)
+		if r is not None:
+			return r
+		t = self.select(ar.Stop, seconds=1.0)		# Settle.
+		if isinstance(t, ar.Stop):
+			return ar.Aborted()
+
+		base = process_descriptors(server.pid)
+		baseline = process_memory(server.pid)
+		started = time.monotonic()
+		try:
+			r = open_connections(self, settings, server, held, base)
+		except OSError as e:
+			r = ar.Faulted(f'cannot open connection {len(held) + 1}', str(e))
+		if r is not None:
+			return r
+		seconds = time.monotonic() - started
+
+		rss = process_memory(server.pid)
+		report = ConnectionsReport(connections=len(held), seconds=seconds,
+			baseline_kb=baseline, rss_kb=rss,
+			bytes_per_connection=(rss - baseline) * 1024 // len(held))
+		self.console(f'Result - {report}')
+		return report
+	finally:
+		for s in held:
+			s.close()
+		server.send_signal(signal.SIGINT)
+		server.wait()
+
+ar.bind(benchmark_connections)
+
+# Configuration for this executable.
+class Settings(object):
+	def __init__(self, host=None, port=None, connections=None, batch=None, batch_seconds=None):
+		self.host = host
+		self.port = port
+		self.connections = connections
+		self.batch = batch
+		self.batch_seconds = batch_seconds
+
+SETTINGS_SCHEMA = {
+	'host': str,
+	'port': int,
+	'connections': int,			# Idle clients to hold.
+	'batch': int,				# Connections between checks on the server.
+	'batch_seconds': float,		# Allowed for the server to catch up.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(host='127.0.0.1', port=32011,
+	connections=100000, batch=1000, batch_seconds=30.0)
+
+# Entry point.
+if __name__ == '__main__':
+	ar.create_object(benchmark_connections, factory_settings=factory_settings)
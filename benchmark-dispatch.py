@@ -0,0 +1,173 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A micro-benchmark of state machine dispatch.
+
+Two machines with the same states, messages and handlers. One uses
+the dispatch of the library, the other is a CompiledStateMachine.
+Messages are passed to the received method of each machine directly,
+i.e. no queues or threads, and the rate of dispatch is measured for
+three cases;
+
+	exact		message class named in the dispatch
+	subclass	message derived from a class named in the dispatch
+	dropped		message not expected in the current state
+
+Logging of receives is disabled for both machines, as it costs the
+same for each. Results are returned as a DispatchReport.
+'''
+import time
+import ansar.connect as ar
+from hello_welcome import *
+from compiled_dispatch import *
+
+class READY: pass
+
+class StockMachine(ar.Point, ar.StateMachine):
+	def __init__(self):
+		ar.Point.__init__(self)
+		ar.StateMachine.__init__(self, READY)
+
+class CompiledMachine(ar.Point, CompiledStateMachine):
+	def __init__(self):
+		ar.Point.__init__(self)
+		CompiledStateMachine.__init__(self, READY)
+
+def StockMachine_READY_Hello(self, message):
+	return READY
+
+def StockMachine_READY_HelloBatch(self, message):
+	return READY
+
+def StockMachine_READY_Welcome(self, message):
+	return READY
+
+def StockMachine_READY_WelcomeBatch(self, message):
+	return READY
+
+def StockMachine_READY_Faulted(self, message):
+	return READY
+
+def StockMachine_READY_Stop(self, message):
+	return READY
+
+DISPATCH = {
+	READY: (
+		(Hello, HelloBatch, Welcome, WelcomeBatch, ar.Faulted, ar.Stop), ()
+	),
+}
+
+# Same handlers for both.
+for m in DISPATCH[READY][0]:
+	globals()[f'CompiledMachine_READY_{m.__name__}'] = globals()[f'StockMachine_READY_{m.__name__}']
+
+ar.bind(StockMachine, DISPATCH, execution_trace=False)
+ar.bind(CompiledMachine, DISPATCH, execution_trace=False)
+compile_dispatch(CompiledMachine)
+
+CASE = {
+	'exact': Hello(my_name='Gladys'),
+	'subclass': ar.NotConnected(),
+	'dropped': ar.Ack(),
+}
+
+# Results for one case.
+class DispatchResult(object):
+	def __init__(self, case=None, messages=0, stock_rate=0.0, compiled_rate=0.0, speedup=0.0):
+		self.case = case
+		self.messages = messages
+		self.stock_rate = stock_rate
+		self.compiled_rate = compiled_rate
+		self.speedup = speedup
+
+	def __str__(self):
+		return (f'{self.case} stock={self.stock_rate:.0f}/s compiled={self.compiled_rate:.0f}/s '
+			f'speedup={self.speedup:.2f}')
+
+RESULT_SCHEMA = {
+	'case': str,
+	'messages': int,
+	'stock_rate': float,		# Messages per second.
+	'compiled_rate': float,
+	'speedup': float,
+}
+
+ar.bind(DispatchResult, object_schema=RESULT_SCHEMA)
+
+class DispatchReport(object):
+	def __init__(self, results=None):
+		self.results = results or []
+
+REPORT_SCHEMA = {
+	'results': ar.VectorOf(ar.UserDefined(DispatchResult)),
+}
+
+ar.bind(DispatchReport, object_schema=REPORT_SCHEMA)
+
+def dispatch_rate(machine, message, count):
+	'''Best of three runs, in messages per second.'''
+	received = machine.received
+	return_address = (1,)
+	best = None
+	for r in range(3):
+		started = time.perf_counter()
+		for i in range(count):
+			received(None, message, return_address)
+		s = time.perf_counter() - started
+		best = s if best is None else min(best, s)
+	return count / best
+
+# The benchmark object.
+def benchmark_dispatch(self, settings):
+	count = settings.message_count
+	stock, compiled = StockMachine(), CompiledMachine()
+	report = DispatchReport()
+	for case, message in CASE.items():
+		m = self.select(ar.Stop, seconds=0.25)		# Between cases.
+		if isinstance(m, ar.Stop):
+			return ar.Aborted()
+		s = dispatch_rate(stock, message, count)
+		c = dispatch_rate(compiled, message, count)
+		r = DispatchResult(case=case, messages=count, stock_rate=s, compiled_rate=c, speedup=c / s)
+		self.console(f'Result - {r}')
+		report.results.append(r)
+	return report
+
+ar.bind(benchmark_dispatch)
+
+# Configuration for this executable.
+class Settings(object):
+	def __init__(self, message_count=None):
+		self.message_count = message_count
+
+SETTINGS_SCHEMA = {
+	'message_count': int,		# Per run, per case and machine.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(message_count=200000)
+
+# Entry point.
+if __name__ == '__main__':
+	ar.create_object(benchmark_dispatch, factory_settings=factory_settings)
@@ -0,0 +1,284 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A benchmark of the three server styles.
+
+Starts each of listen-at-address, listen-sessions-at-address and
+listen-fsm-at-address in turn, on loopback. Each is driven by
+load-sessions-to-address across a matrix of client counts (sessions
+in progress) and rates (sessions started per second). The server
+CPU and RSS are sampled from /proc around each run, i.e. Linux only.
+
+Every server and load process runs in a temporary home of its own,
+i.e. on the factory settings of its script rather than values stored
+by earlier runs. The few settings that differ in factory value across
+the styles, e.g. console logging, are given explicitly and are the same
+for every style.
+
+Results are returned as a BenchmarkReport and optionally stored as
+JSON in the report file. Runs headless, suitable for CI.
+'''
+import os
+import sys
+import signal
+import tempfile
+import subprocess
+import ansar.connect as ar
+from latency import *
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+STYLE_SCRIPT = {
+	'select': 'listen-at-address.py',
+	'sessions': 'listen-sessions-at-address.py',
+	'fsm': 'listen-fsm-at-address.py',
+}
+
+# Shared baseline, passed to every style on top of
+# its factory settings.
+BASELINE_SETTINGS = [
+	'--console-log=false',
+	'--welcome-cache=0',
+	'--reuse-port=false',
+]
+
+def factory_environment(home):
+	'''Environment of a sub-process, with a home for its settings.'''
+	return dict(os.environ, ANSAR_TOOL=home)
+
+LOAD_SCRIPT = 'load-sessions-to-address.py'
+
+# Wait for termination of a sub-process. Runs
+# in a thread of its own.
+def wait_for_process(self, p):
+	out, err = p.communicate()
+	return p.returncode, out
+
+ar.bind(wait_for_process)
+
+def process_output(out):
+	'''Recover the value returned by a standard sub-process, or None.'''
+	if not out:
+		return None
+	try:
+		value, v = ar.CodecJson().decode(out, ar.Any())
+	except ar.CodecFailed:
+		return None
+	return value
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+def process_cpu(pid):
+	'''Total user and system time of a process, in seconds.'''
+	with open(f'/proc/{pid}/stat') as f:
+		stat = f.read()
+	fields = stat[stat.rindex(')') + 2:].split()
+	return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+def process_memory(pid):
+	'''Current and peak resident memory of a process, in kilobytes.'''
+	rss, peak = 0, 0
+	with open(f'/proc/{pid}/status') as f:
+		for line in f:
+			if line.startswith('VmRSS:'):
+				rss = int(line.split()[1])
+			elif line.startswith('VmHWM:'):
+				peak = int(line.split()[1])
+	return rss, peak
+
+# Results for one server style at one point in the matrix.
+class BenchmarkResult(object):
+	def __init__(self, style=None, clients=0, rate=0.0, latency=None,
+			cpu_seconds=0.0, rss_kb=0, peak_rss_kb=0):
+		self.style = style
+		self.clients = clients
+		self.rate = rate
+		self.latency = latency
+		self.cpu_seconds = cpu_seconds
+		self.rss_kb = rss_kb
+		self.peak_rss_kb = peak_rss_kb
+
+	def __str__(self):
+		return (f'{self.style} clients={self.clients} rate={self.rate:.1f} - {self.latency}, '
+			f'cpu={self.cpu_seconds:.2f}s rss={self.rss_kb}kB')
+
+RESULT_SCHEMA = {
+	'style': str,
+	'clients': int,
+	'rate': float,
+	'latency': ar.UserDefined(LatencyReport),
+	'cpu_seconds': float,
+	'rss_kb': int,
+	'peak_rss_kb': int,
+}
+
+ar.bind(BenchmarkResult, object_schema=RESULT_SCHEMA)
+
+class BenchmarkReport(object):
+	def __init__(self, hello_count=0, results=None):
+		self.hello_count = hello_count
+		self.results = results or []
+
+REPORT_SCHEMA = {
+	'hello_count': int,
+	'results': ar.VectorOf(ar.UserDefined(BenchmarkResult)),
+}
+
+ar.bind(BenchmarkReport, object_schema=REPORT_SCHEMA)
+
+# Confirm the server is accepting connections. Allow for
+# the time taken to start a process.
+def server_ready(self, ipp, attempts=20):
+	for i in range(attempts):
+		ar.connect(self, ipp)
+		m = self.select(ar.Connected, ar.NotConnected, ar.Stop)
+		if isinstance(m, ar.Connected):
+			self.send(ar.Close(), self.return_address)
+			self.select(ar.Closed, ar.Abandoned)
+			return None
+		elif isinstance(m, ar.Stop):
+			return ar.Aborted()
+		not_connected = m
+		t = self.select(ar.Stop, seconds=0.25)
+		if isinstance(t, ar.Stop):
+			return ar.Aborted()
+	return not_connected
+
+# Run the load against the server at the given point in the
+# matrix. Return the result or a fault.
+def run_load(self, settings, style, server, clients, rate, home):
+	command = [sys.executable, os.path.join(HERE, LOAD_SCRIPT),
+		'--pure-object', '--call-signature=o',
+		f'--host={settings.host}',
+		f'--port={settings.port}',
+		f'--sessions={clients * settings.sessions_per_client}',
+		f'--concurrency={clients}',
+		f'--ramp-up={float(rate)}',
+		f'--hello-count={settings.hello_count}',
+		'--client-name=Gladys',
+	]
+	cpu = process_cpu(server.pid)
+	p = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, encoding='utf-8',
+		env=factory_environment(home))
+	self.create(wait_for_process, p)
+	m = self.select(ar.Completed, ar.Stop)
+	if isinstance(m, ar.Stop):
+		p.send_signal(signal.SIGINT)
+		self.select(ar.Completed)
+		return ar.Aborted()
+	code, out = m.value
+	value = process_output(out)
+	if not isinstance(value, LatencyReport):
+		return ar.Faulted(f'load against "{style}" failed', f'exit code {code}, {value}')
+
+	cpu = process_cpu(server.pid) - cpu
+	rss, peak = process_memory(server.pid)
+	return BenchmarkResult(style=style, clients=clients, rate=rate, latency=value,
+		cpu_seconds=cpu, rss_kb=rss, peak_rss_kb=peak)
+
+# Each style in turn. Return None or a fault.
+def run_styles(self, settings, ipp, report, home):
+	for style in settings.styles:
+		script = STYLE_SCRIPT.get(style, None)
+		if script is None:
+			return ar.Faulted(f'unknown server style "{style}"', f'expecting one of {", ".join(STYLE_SCRIPT.keys())}')
+
+		command = [sys.executable, os.path.join(HERE, script),
+			'--pure-object',
+			f'--host={settings.host}',
+			f'--port={settings.port}',
+		] + BASELINE_SETTINGS
+		server = subprocess.Popen(command, stdout=subprocess.DEVNULL, env=factory_environment(home))
+		self.console(f'Started "{style}" server ({server.pid})')
+
+		r = server_ready(self, ipp)
+		for clients in settings.clients:
+			if r is not None:
+				break
+			for rate in settings.rates:
+				r = run_load(self, settings, style, server, clients, rate, home)
+				if not isinstance(r, BenchmarkResult):
+					break
+				self.console(f'Result - {r}')
+				report.results.append(r)
+				r = None
+
+		server.send_signal(signal.SIGINT)
+		self.create(wait_for_process, server)
+		self.select(ar.Completed)
+		if r is not None:
+			return r
+	return None
+
+# The benchmark object.
+def benchmark_servers(self, settings):
+	ipp = ar.HostPort(settings.host, settings.port)
+	report = BenchmarkReport(hello_count=settings.hello_count)
+	with tempfile.TemporaryDirectory(prefix='benchmark-servers-') as home:
+		r = run_styles(self, settings, ipp, report, home)
+	if r is not None:
+		return r
+
+	if settings.report_file:
+		f = ar.File(settings.report_file, BenchmarkReport, decorate_names=False)
+		f.store(report)
+	return report
+
+ar.bind(benchmark_servers)
+
+# Configuration for this executable.
+class Settings(object):
+	def __init__(self, host=None, port=None, styles=None, clients=None, rates=None,
+			sessions_per_client=None, hello_count=None, report_file=None):
+		self.host = host
+		self.port = port
+		self.styles = styles
+		self.clients = clients
+		self.rates = rates
+		self.sessions_per_client = sessions_per_client
+		self.hello_count = hello_count
+		self.report_file = report_file
+
+SETTINGS_SCHEMA = {
+	'host': str,
+	'port': int,
+	'styles': ar.VectorOf(ar.Unicode()),		# Servers to compare.
+	'clients': ar.VectorOf(ar.Integer8()),		# Sessions in progress.
+	'rates': ar.VectorOf(ar.Float8()),			# Sessions started per second.
+	'sessions_per_client': int,
+	'hello_count': int,							# Hellos per session.
+	'report_file': str,							# JSON results, or empty.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(host='127.0.0.1', port=32011,
+	styles=['select', 'sessions', 'fsm'],
+	clients=[10, 50, 100],
+	rates=[100.0, 1000.0],
+	sessions_per_client=5, hello_count=10,
+	report_file='')
+
+# Entry point.
+if __name__ == '__main__':
+	ar.create_object(benchmark_servers, factory_settings=factory_settings)
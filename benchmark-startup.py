@@ -0,0 +1,191 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A benchmark of client startup.
+
+Starts listen-at-address on loopback and runs each of the one-shot
+clients a number of times in sequence, timing every process from
+start to exit, i.e. interpreter, imports, settings, connection and
+the single Hello-Welcome. A bare interpreter is timed alongside, as
+the floor. Each client is run once beforehand to prime any caches.
+
+Results are returned as a StartupReport and optionally stored as
+JSON in the report file.
+'''
+import os
+import sys
+import time
+import signal
+import subprocess
+import ansar.connect as ar
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVER = 'listen-at-address.py'
+BARE = 'python'
+
+# Run a client to completion. Runs in a thread of
+# its own, timing the process.
+def time_process(self, command):
+	started = time.monotonic()
+	p = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+	return p.returncode, time.monotonic() - started
+
+ar.bind(time_process)
+
+# Wait for termination of the server.
+def wait_for_process(self, p):
+	p.wait()
+	return p.returncode
+
+ar.bind(wait_for_process)
+
+# Results for one client.
+class StartupResult(object):
+	def __init__(self, client=None, runs=0, failed=0, mean=0.0, p50=0.0, p90=0.0, lowest=0.0, highest=0.0):
+		self.client = client
+		self.runs = runs
+		self.failed = failed
+		self.mean = mean
+		self.p50 = p50
+		self.p90 = p90
+		self.lowest = lowest
+		self.highest = highest
+
+	def __str__(self):
+		return (f'{self.client} runs={self.runs} failed={self.failed} - '
+			f'mean={self.mean * 1000.0:.1f}ms p50={self.p50 * 1000.0:.1f}ms p90={self.p90 * 1000.0:.1f}ms')
+
+RESULT_SCHEMA = {
+	'client': str,
+	'runs': int,
+	'failed': int,
+	'mean': float,
+	'p50': float,
+	'p90': float,
+	'lowest': float,
+	'highest': float,
+}
+
+ar.bind(StartupResult, object_schema=RESULT_SCHEMA)
+
+class StartupReport(object):
+	def __init__(self, results=None):
+		self.results = results or []
+
+REPORT_SCHEMA = {
+	'results': ar.VectorOf(ar.UserDefined(StartupResult)),
+}
+
+ar.bind(StartupReport, object_schema=REPORT_SCHEMA)
+
+def summarize(client, seconds, failed):
+	t = sorted(seconds)
+	n = len(t)
+	if n == 0:
+		return StartupResult(client=client, failed=failed)
+	def at(p):
+		return t[min(n - 1, int(n * p / 100.0))]
+	return StartupResult(client=client, runs=n, failed=failed,
+		mean=sum(t) / n, p50=at(50.0), p90=at(90.0), lowest=t[0], highest=t[-1])
+
+# Time the runs of one client. Return the result or Aborted.
+def run_client(self, client, command, runs):
+	seconds, failed = [], 0
+	for i in range(runs + 1):
+		self.create(time_process, command)
+		m = self.select(ar.Completed, ar.Stop)
+		if isinstance(m, ar.Stop):
+			self.select(ar.Completed)
+			return ar.Aborted()
+		if i == 0:				# Priming.
+			continue
+		code, s = m.value
+		if code != 0:
+			failed += 1
+		seconds.append(s)
+	return summarize(client, seconds, failed)
+
+# The benchmark object.
+def benchmark_startup(self, settings):
+	address = [f'--host={settings.host}', f'--port={settings.port}']
+	command = [sys.executable, os.path.join(HERE, SERVER), '--console-log=false'] + address
+	server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+	m = self.select(ar.Stop, seconds=1.0)		# Allow for server startup.
+
+	report = StartupReport()
+	r = None
+	if isinstance(m, ar.Stop):
+		r = ar.Aborted()
+	for client in settings.clients:
+		if r is not None:
+			break
+		if client == BARE:
+			command = [sys.executable, '-c', 'pass']
+		else:
+			command = [sys.executable, os.path.join(HERE, client)] + address
+		r = run_client(self, client, command, settings.runs)
+		if not isinstance(r, StartupResult):
+			break
+		self.console(f'Result - {r}')
+		report.results.append(r)
+		r = None
+
+	server.send_signal(signal.SIGINT)
+	self.create(wait_for_process, server)
+	self.select(ar.Completed)
+	if r is not None:
+		return r
+
+	if settings.report_file:
+		f = ar.File(settings.report_file, StartupReport, decorate_names=False)
+		f.store(report)
+	return report
+
+ar.bind(benchmark_startup)
+
+# Configuration for this executable.
+class Settings(object):
+	def __init__(self, host=None, port=None, clients=None, runs=None, report_file=None):
+		self.host = host
+		self.port = port
+		self.clients = clients
+		self.runs = runs
+		self.report_file = report_file
+
+SETTINGS_SCHEMA = {
+	'host': str,
+	'port': int,
+	'clients': ar.VectorOf(ar.Unicode()),	# Scripts to time, or python for the floor.
+	'runs': int,							# Per client, after priming.
+	'report_file': str,						# JSON results, or empty.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(host='127.0.0.1', port=32011,
+	clients=[BARE, 'connect-to-address.py', 'connect-session-to-address.py', 'connect-lean-to-address.py'],
+	runs=20, report_file='')
+
+# Entry point.
+if __name__ == '__main__':
+	ar.create_object(benchmark_startup, factory_settings=factory_settings)
@@ -0,0 +1,82 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Faster recovery of inbound frames.
+
+The transport recovers frames from the bytes received on a socket
+by passing every byte through a small state machine. That is fine
+for small messages but limits the receiving of large ones, e.g. the
+chunks of a stream, to a few megabytes per second. Calling
+enable_block_framing() before any connections are established
+arranges for the body of each frame to be taken in slices, in this
+process. The dimensions and the end-of-frame are still checked a
+byte at a time by the existing state machine.
+'''
+import ansar.connect.socketry as socketry
+
+__all__ = [
+	'enable_block_framing',
+]
+
+def recover_frame(self, received):
+	key_box = self.transport.key_box
+	shift = self.shift
+	view = memoryview(received)
+	i, n = 0, len(received)
+	while i < n:
+		state = self.analysis_state
+		if state == 2:			# Inside the frame.
+			take = min(self.jump_size, n - i)
+			self.frame_byte += view[i:i + take]
+			self.jump_size -= take
+			i += take
+			if self.jump_size == 0:
+				self.analysis_state = 3
+			continue
+
+		next = shift[state](received[i])
+		i += 1
+		if next:
+			self.analysis_state = next
+			continue
+
+		# Completed frame.
+		f = bytes(self.frame_byte)
+		if key_box:
+			f = key_box.decrypt(f)
+
+		# Breakout parts and yield.
+		n0 = self.size_len[0]
+		n1 = self.size_len[1]
+		b2 = n0 + n1
+		yield f[0:n0], f[n0:b2], f[b2:]
+
+		# Restart.
+		self.analysis_state = 1
+		self.size_byte = bytearray()
+		self.size_len = []
+		self.frame_size = 0
+		self.frame_byte = bytearray()
+
+def enable_block_framing():
+	'''Frames received from here on, are recovered in slices.'''
+	socketry.MessageStream.recover_frame = recover_frame
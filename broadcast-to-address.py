@@ -0,0 +1,121 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Send a notice to every client of a server.
+
+Connects to listen-at-address, started with --broadcast-enabled,
+sends a Broadcast of a Notice and returns the BroadcastReport, i.e.
+how many clients were sent the notice and how many were skipped or
+dropped as slow receivers.
+
+With listen enabled, sends nothing and waits for the given number of
+notices from other clients, returning the last. Any number of
+listeners can be started before a sender.
+'''
+import ansar.connect as ar
+from broadcast import *
+
+# Wait for notices from the server. Return the
+# last, or the reason there are no more.
+def receive_notices(self, notices):
+	m = None
+	for i in range(notices):
+		m = self.select(Notice, ar.Closed, ar.Abandoned, ar.Stop)
+		if isinstance(m, Notice):
+			self.console(f'Notice {i + 1} of {notices} "{m.text}"')
+			continue
+		elif isinstance(m, ar.Stop):
+			return ar.Aborted()
+		return m
+	return m
+
+# The client object.
+def broadcast_to_address(self, settings):
+	ipp = ar.HostPort(settings.host, settings.port)		# Where to expect the service.
+	ar.connect(self, ipp)
+
+	m = self.select(ar.Connected, ar.NotConnected, ar.Stop)
+	if isinstance(m, ar.NotConnected):
+		return m
+	elif isinstance(m, ar.Stop):
+		return ar.Aborted()
+	server_address = self.return_address
+
+	if settings.listen:
+		m = receive_notices(self, settings.notices)
+		if isinstance(m, (ar.Closed, ar.Abandoned)):
+			return m
+		self.send(ar.Close(), server_address)
+		self.select(ar.Closed, ar.Abandoned, ar.Stop)
+		return m
+
+	self.send(Broadcast(value=Notice(text=settings.text), include_sender=settings.include_sender), server_address)
+
+	while True:
+		m = self.select(BroadcastReport, Notice, ar.Faulted, ar.Stop, seconds=10.0)
+		if not isinstance(m, Notice):
+			break
+		self.console(f'Notice "{m.text}"')		# Own, with include_sender.
+
+	if isinstance(m, (ar.Closed, ar.Abandoned)):
+		return m
+	elif isinstance(m, (BroadcastReport, ar.Faulted)):
+		pass
+	elif isinstance(m, ar.Stop):
+		return ar.Aborted()
+	elif isinstance(m, ar.SelectTimer):
+		return ar.TimedOut(m)
+
+	self.send(ar.Close(), server_address)
+	self.select(ar.Closed, ar.Abandoned, ar.Stop)
+	return m
+
+ar.bind(broadcast_to_address)
+
+#
+#
+class Settings(object):
+	def __init__(self, host=None, port=None, text=None, include_sender=None, listen=None, notices=None):
+		self.host = host
+		self.port = port
+		self.text = text
+		self.include_sender = include_sender
+		self.listen = listen
+		self.notices = notices
+
+SETTINGS_SCHEMA = {
+	'host': str,
+	'port': int,
+	'text': str,				# Content of the notice.
+	'include_sender': bool,		# Also send to this client.
+	'listen': bool,				# Receive rather than send.
+	'notices': int,				# Number to receive.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(host='127.0.0.1', port=32011, text='Hello everyone', include_sender=False,
+	listen=False, notices=1)
+
+if __name__ == '__main__':
+	ar.create_object(broadcast_to_address, factory_settings=factory_settings)
@@ -0,0 +1,182 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Encode-once broadcast to the connected clients.
+
+Sending the same message to many connections normally costs an
+encoding per connection, on the sockets thread. The Broadcaster
+encodes the message once into an EncodedMessage, i.e. the transport
+form of a message passing through, and sends that same block to
+every connection accepted on a listen, or a selected subset. Only
+the small header is encoded per connection.
+
+A connection with more than max_outbound_bytes already waiting is a
+slow receiver. By policy it is either skipped for this broadcast or
+dropped altogether. Messages carrying addresses cannot be encoded
+ahead of the transport and are refused.
+
+A client can ask a server to broadcast with a Broadcast, which only
+ever carries a Notice, i.e. a client cannot pass arbitrary messages
+to the other clients.
+'''
+import time
+import ansar.connect as ar
+import ansar.connect.socketry as socketry
+from outbound import *
+
+__all__ = [
+	'SKIP_SLOW',
+	'DROP_SLOW',
+	'SLOW_POLICIES',
+	'Notice',
+	'Broadcast',
+	'BroadcastReport',
+	'EncodedMessage',
+	'encode_once',
+	'Broadcaster',
+]
+
+SKIP_SLOW = 'skip'
+DROP_SLOW = 'drop'
+
+SLOW_POLICIES = (SKIP_SLOW, DROP_SLOW)
+
+class Notice(object):
+	def __init__(self, text=None):
+		self.text = text
+
+NOTICE_SCHEMA = {
+	'text': ar.Unicode(),
+}
+
+ar.bind(Notice, object_schema=NOTICE_SCHEMA)
+
+class Broadcast(object):
+	'''Request to pass the Notice to every client of the server.'''
+	def __init__(self, value=None, include_sender=False):
+		self.value = value
+		self.include_sender = include_sender
+
+BROADCAST_SCHEMA = {
+	'value': ar.UserDefined(Notice),
+	'include_sender': ar.Boolean(),
+}
+
+ar.bind(Broadcast, object_schema=BROADCAST_SCHEMA)
+
+class BroadcastReport(object):
+	def __init__(self, sent=0, skipped=0, dropped=0, encoded_bytes=0, seconds=0.0):
+		self.sent = sent
+		self.skipped = skipped
+		self.dropped = dropped
+		self.encoded_bytes = encoded_bytes
+		self.seconds = seconds
+
+	def __str__(self):
+		return (f'sent {self.sent}, skipped {self.skipped}, dropped {self.dropped}, '
+			f'{self.encoded_bytes} bytes encoded once, {self.seconds * 1000.0:.1f}ms')
+
+REPORT_SCHEMA = {
+	'sent': ar.Integer8(),
+	'skipped': ar.Integer8(),		# Slow, this time.
+	'dropped': ar.Integer8(),		# Slow and closed.
+	'encoded_bytes': ar.Integer8(),	# Body, encoded the once.
+	'seconds': ar.Float8(),			# To queue every send.
+}
+
+ar.bind(BroadcastReport, object_schema=REPORT_SCHEMA)
+
+# The transport puts a Relay on the wire as it is. The
+# block is shared by every send rather than copied.
+class EncodedMessage(socketry.Relay):
+	pass
+
+ar.bind(EncodedMessage, object_schema={'block': ar.Block(), 'space': ar.VectorOf(ar.Address())},
+	copy_before_sending=False)
+
+def encode_once(message):
+	'''Encode the message for sending to any number of connections. Return the EncodedMessage.'''
+	space = []
+	e = ar.CodecJson().encode(message, ar.Any(), space=space)
+	if space:
+		raise ValueError(f'cannot broadcast {type(message).__name__} carrying addresses')
+	return EncodedMessage(block=e.encode('utf-8'), space=space)
+
+# Runtime image of the connections to one server. Updated
+# on Accepted and Closed/Abandoned.
+class Broadcaster(object):
+	def __init__(self, max_outbound_bytes=0, slow=SKIP_SLOW):
+		self.max_outbound_bytes = max_outbound_bytes
+		self.slow = slow
+		self.listen = {}			# Key of listening ipp, to connections.
+
+	def add(self, accepted):
+		k = str(accepted.listening_ipp)
+		c = self.listen.setdefault(k, {})
+		c[accepted.remote_address] = accepted.accepted_ipp
+
+	def lost(self, remote_address):
+		for c in self.listen.values():
+			if c.pop(remote_address, None) is not None:
+				return
+
+	def connections(self, listening_ipp=None):
+		if listening_ipp is not None:
+			return len(self.listen.get(str(listening_ipp), ()))
+		return sum(len(c) for c in self.listen.values())
+
+	def send(self, sender, message, listening_ipp=None, select=None, dropped=None):
+		'''Send the message to every connection, or those on the listen and accepted by select(address, ipp). Return a BroadcastReport.'''
+		# Slow receivers closed under DROP_SLOW are
+		# passed to dropped(address), if given.
+		started = time.monotonic()
+		encoded = encode_once(message)
+		report = BroadcastReport(encoded_bytes=len(encoded.block))
+
+		if listening_ipp is None:
+			listen = list(self.listen.values())
+		else:
+			listen = [self.listen.get(str(listening_ipp), {})]
+
+		limit = self.max_outbound_bytes
+		frame_bytes = max(FRAME_BYTES, len(encoded.block))	# Waiting messages are likely more of the same.
+		for c in listen:
+			for a, ipp in list(c.items()):
+				if select is not None and not select(a, ipp):
+					continue
+				if limit:
+					n = outbound_bytes(a, frame_bytes)
+					if n is not None and n > limit:
+						if self.slow == DROP_SLOW:
+							sender.send(ar.Close(), a)
+							c.pop(a, None)
+							if dropped is not None:
+								dropped(a)
+							report.dropped += 1
+						else:
+							report.skipped += 1
+						continue
+				sender.send(encoded, a)
+				report.sent += 1
+
+		report.seconds = time.monotonic() - started
+		return report
@@ -0,0 +1,257 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A compact binary encoding for bound message types.
+
+The default encoding of the library is JSON text, including the
+names of the type and of every member. For small messages at a high
+rate that is most of the bytes and most of the CPU. A CompactCodec
+encodes a message as a type tag followed by the member values, in
+a fixed order and without names;
+
+* tags are interned, i.e. the position of the type in the list
+  given to the codec, and both ends must use the same list,
+* strings are length-prefixed UTF-8,
+* integers are zigzag varints, floats are 8 bytes and booleans 1,
+* vectors are a varint count followed by the elements.
+
+Encoded bytes travel as the block of an ar.Blob, which the library
+passes through its framing untouched. Decoding works directly on
+the received block through a memoryview. Messages are constructed
+without calling __init__; the member values are assigned as a
+single dict.
+
+Use of the codec is negotiated per connection. A client sends a
+CodecOffer and switches only on receiving a CodecSelected that names
+the codec. A server replies in the same encoding as the request, so
+clients that never make an offer carry on with the default. The
+name of the codec carries the version of the member layout, changed
+whenever a member is added to an encoded type. Peers with different
+layouts never agree on the codec and carry on with the default.
+
+A block that is truncated, carries an unknown tag or is otherwise
+malformed raises CompactFailed, whatever the point of failure.
+'''
+import struct
+import ansar.connect as ar
+
+__all__ = [
+	'COMPACT',
+	'CodecOffer',
+	'CodecSelected',
+	'CompactFailed',
+	'CompactCodec',
+	'select_codec',
+]
+
+COMPACT = 'compact-2'		# Hello gained trace_id.
+
+class CodecOffer(object):
+	def __init__(self, codecs=None):
+		self.codecs = codecs or []
+
+class CodecSelected(object):
+	def __init__(self, codec=None):
+		self.codec = codec
+
+OFFER_SCHEMA = {
+	'codecs': ar.VectorOf(ar.Unicode()),	# Acceptable to the client.
+	'codec': str,							# Chosen by the server, or empty.
+}
+
+ar.bind(CodecOffer, object_schema=OFFER_SCHEMA)
+ar.bind(CodecSelected, object_schema=OFFER_SCHEMA)
+
+def select_codec(offer, supported=(COMPACT,)):
+	'''Answer an offer with the first acceptable codec, or none.'''
+	for c in offer.codecs:
+		if c in supported:
+			return CodecSelected(codec=c)
+	return CodecSelected(codec='')
+
+class CompactFailed(Exception):
+	'''A block that cannot be decoded.'''
+
+#
+#
+FLOAT = struct.Struct('<d')
+
+def put_varint(b, n):
+	while n > 0x7f:
+		b.append((n & 0x7f) | 0x80)
+		n >>= 7
+	b.append(n)
+
+def get_varint(v, i):
+	c = v[i]
+	if c < 0x80:
+		return c, i + 1
+	n, shift = 0, 0
+	while True:
+		c = v[i]
+		i += 1
+		n |= (c & 0x7f) << shift
+		if c < 0x80:
+			return n, i
+		shift += 7
+
+# Pairs of encoding and decoding functions, one pair
+# for each supported portable type.
+def put_str(b, s):
+	if s is None:
+		b.append(0)
+		return
+	e = s.encode('utf-8')
+	put_varint(b, len(e) + 1)
+	b += e
+
+def get_str(v, i):
+	n, i = get_varint(v, i)
+	if n == 0:
+		return None, i
+	j = i + n - 1
+	if j > len(v):
+		raise CompactFailed(f'string of {n - 1} bytes truncated at {len(v) - i}')
+	return str(v[i:j], 'utf-8'), j
+
+def put_int(b, n):
+	put_varint(b, (n << 1) ^ (n >> 63))
+
+def get_int(v, i):
+	n, i = get_varint(v, i)
+	return (n >> 1) ^ -(n & 1), i
+
+def put_float(b, f):
+	b += FLOAT.pack(f)
+
+def get_float(v, i):
+	return FLOAT.unpack_from(v, i)[0], i + 8
+
+def put_bool(b, f):
+	b.append(1 if f else 0)
+
+def get_bool(v, i):
+	return v[i] != 0, i + 1
+
+class CompactCodec(object):
+	def __init__(self, *types):
+		self.tag = {}			# Type to tag.
+		self.type = []			# Tag to type and its functions.
+		self.member = {}		# Type to list of member functions.
+		for t in types:
+			put, get = self.members(t)
+			self.tag[t] = (len(self.type), put)
+			self.type.append(get)
+
+	def portable(self, p):
+		if isinstance(p, ar.Unicode):
+			return put_str, get_str
+		elif isinstance(p, ar.Integer8):
+			return put_int, get_int
+		elif isinstance(p, ar.Float8):
+			return put_float, get_float
+		elif isinstance(p, ar.Boolean):
+			return put_bool, get_bool
+		elif isinstance(p, ar.UserDefined):
+			return self.members(p.element)
+		elif isinstance(p, ar.VectorOf):
+			put_e, get_e = self.portable(p.element)
+			def put(b, a):
+				put_varint(b, len(a))
+				for e in a:
+					put_e(b, e)
+			def get(v, i):
+				n, i = get_varint(v, i)
+				if n > len(v) - i:		# At least a byte each.
+					raise CompactFailed(f'vector of {n} elements in {len(v) - i} bytes')
+				a = []
+				for _ in range(n):
+					e, i = get_e(v, i)
+					a.append(e)
+				return a, i
+			return put, get
+		raise ValueError(f'no compact encoding for {type(p).__name__}')
+
+	def members(self, t):
+		'''Build the encoding and decoding of a bound type.'''
+		schema = t.__art__.value
+		names = sorted(schema.keys())
+		member = [(n,) + self.portable(schema[n]) for n in names]
+		self.member[t] = member
+		def put(b, m):
+			for n, p, _ in member:
+				p(b, getattr(m, n))
+		def get(v, i):
+			d = {}
+			for n, _, g in member:
+				d[n], i = g(v, i)
+			m = t.__new__(t)
+			m.__dict__ = d
+			return m, i
+		return put, get
+
+	def encode(self, m):
+		'''Encode the message as a block of bytes.'''
+		tag, put = self.tag[type(m)]
+		b = bytearray()
+		put_varint(b, tag)
+		put(b, m)
+		return b
+
+	def decode(self, block):
+		'''Recover a message from the block.'''
+		v = memoryview(block)
+		try:
+			tag, i = get_varint(v, 0)
+			if tag >= len(self.type):
+				raise CompactFailed(f'unknown tag {tag}')
+			m, i = self.type[tag](v, i)
+		except (IndexError, struct.error, UnicodeDecodeError) as e:
+			raise CompactFailed(f'malformed block ({e})')
+		if i != len(v):
+			raise CompactFailed(f'{len(v) - i} bytes left over')
+		return m
+
+	def template(self, m, name):
+		'''Encode all but the named member. Return a function that completes the encoding with a value.'''
+		t = type(m)
+		tag, _ = self.tag[t]
+		before, after = bytearray(), bytearray()
+		put_varint(before, tag)
+		b, hole = before, None
+		for n, p, _ in self.member[t]:
+			if n == name:
+				b, hole = after, p
+				continue
+			p(b, getattr(m, n))
+		if hole is None:
+			raise ValueError(f'no member "{name}" in {t.__name__}')
+		def fill(value):
+			e = bytearray(before)
+			hole(e, value)
+			e += after
+			return e
+		return fill
+
+	def blob(self, m):
+		'''Encode the message, ready for sending.'''
+		return ar.Blob(block=self.encode(m))
@@ -0,0 +1,103 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Cheaper dispatch for state machines.
+
+The library resolves handler names once, at bind time, into a table
+of states and message classes. Every message still pays for a search
+of that table, i.e. a lookup on the state, a lookup on the class and,
+for a message that is a subclass of an expected class or is not
+expected at all, a scan with isinstance and a second search under the
+DEFAULT state.
+
+A CompiledStateMachine flattens the table into a single dict keyed
+on (state, message class). Entries for the classes named in the
+dispatch are filled by compile_dispatch, right after ar.bind. Any
+other class is resolved by the library rules on first arrival in a
+state and the outcome is cached, including the outcome that there
+is no handler. Whether the receive is logged is cached alongside.
+'''
+import ansar.connect as ar
+
+__all__ = [
+	'CompiledStateMachine',
+	'compile_dispatch',
+]
+
+def resolve(shift, state, message):
+	'''Find the handler in the bound table, following the library rules.'''
+	r = shift.get(state, None)
+	if r is None:
+		return None
+	f = r.get(message.__class__, None)
+	if f:
+		return f
+	for c, f in r.items():
+		if isinstance(message, c):
+			return f
+	return r.get(ar.Unknown, None)
+
+def compile_dispatch(machine):
+	'''Flatten the bound dispatch of the machine. Return the table.'''
+	pf = machine.__art__
+	compiled = {}
+	for state, r in pf.value.items():
+		for c, f in r.items():
+			traced = pf.execution_trace and getattr(c, '__art__', None) is not None and c.__art__.execution_trace
+			compiled[(state, c)] = (f, traced)
+	machine.__compiled__ = compiled
+	return compiled
+
+class CompiledStateMachine(ar.StateMachine):
+	'''A StateMachine with dispatch through a flattened table.'''
+	def received(self, queue, message, return_address):
+		machine = self.__class__
+		compiled = machine.__dict__.get('__compiled__', None)
+		if compiled is None:
+			compiled = compile_dispatch(machine)
+
+		k = (self.current_state, message.__class__)
+		try:
+			f, traced = compiled[k]
+		except KeyError:
+			pf = machine.__art__
+			shift = pf.value
+			f = resolve(shift, self.current_state, message) or resolve(shift, ar.DEFAULT, message)
+			traced = pf.execution_trace and message.__art__.execution_trace
+			compiled[k] = (f, traced)
+
+		if f is None:
+			if traced:
+				self.traced(message, return_address, 'Dropped')
+			return
+
+		if traced:
+			self.traced(message, return_address, 'Received')
+		self.current_state = f(self, message)
+		self.previous_message = message
+
+	def traced(self, message, return_address, action):
+		name = message.__art__.name
+		if isinstance(message, ar.Faulted):
+			self.log(ar.TAG_RECEIVED, '%s %s from <%08x>, %s' % (action, name, return_address[-1], str(message)))
+			return
+		self.log(ar.TAG_RECEIVED, '%s %s from <%08x>' % (action, name, return_address[-1]))
@@ -20,21 +20,52 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+'''A network client that reconnects.
+
+The connection is maintained by a GroupTable around a BackoffConnectToAddress,
+i.e. retries use exponential backoff with decorrelated jitter and stop when
+the circuit breaker opens. Progress of reconnection is reported in
+ReconnectMetrics messages.
+
+With hello_seconds set to zero the client makes a single Hello and
+returns the Welcome. Otherwise it says Hello at that interval until
+user intervention, riding through loss of the server, and returns
+the latest ReconnectMetrics.
+'''
 import ansar.connect as ar
 from hello_welcome import *
+from reconnect_backoff import *
 
-def say_hello(self, client_name, group):
+class Reconnecting(object):
+    def __init__(self):
+        self.metrics = ReconnectMetrics()
+        self.ended = False
+
+def reconnect_update(self, reconnecting, m):
+    if m.breaker != reconnecting.metrics.breaker:
+        self.console(f'Reconnect - {m}')      # Report breaker changes.
+    reconnecting.metrics = m
+
+def get_ready(self, group, reconnecting):
     while True:
-        m = self.select(ar.GroupUpdate, ar.Ready, ar.Completed, ar.Stop)
+        m = self.select(ar.GroupUpdate, ar.Ready, ar.Completed, ReconnectMetrics, ar.Stop)
         if isinstance(m, ar.GroupUpdate):
             group.update(m)                 # Connected or existing connection lost.
+        elif isinstance(m, ReconnectMetrics):
+            reconnect_update(self, reconnecting, m)    # Retry scheduled or breaker change.
         elif isinstance(m, ar.Ready):
-            break                           # Full set of connections.
+            return None                     # Full set of connections.
         elif isinstance(m, ar.Completed):
-            return m.value                  # There was a group problem, e.g. retries were exhausted.
+            reconnecting.ended = True
+            return m.value                  # There was a group problem, e.g. the breaker opened.
         elif isinstance(m, ar.Stop):
             return ar.Aborted()
 
+def say_hello(self, client_name, group, reconnecting):
+    r = get_ready(self, group, reconnecting)
+    if r is not None:
+        return r
+
     server_address = group.server
 
     hello = Hello(my_name=client_name)
@@ -58,45 +89,92 @@ def say_hello(self, client_name, group):
 
     return welcome
 
+def keep_saying_hello(self, client_name, group, reconnecting, hello_seconds):
+    r = None
+    while r is None:
+        r = get_ready(self, group, reconnecting)
+        if r is not None:
+            break
+
+        # Hello at intervals until the connection is lost.
+        self.start(ar.T1, hello_seconds, repeating=True)
+        while group.server:
+            m = self.select(ar.T1, Welcome, ar.GroupUpdate, ar.NotReady, ReconnectMetrics, ar.Stop)
+            if isinstance(m, ar.T1):
+                self.send(Hello(my_name=client_name), group.server)
+            elif isinstance(m, ar.GroupUpdate):
+                group.update(m)
+            elif isinstance(m, ReconnectMetrics):
+                reconnect_update(self, reconnecting, m)
+            elif isinstance(m, ar.Stop):
+                r = ar.Aborted()
+                break
+        self.cancel(ar.T1)
+
+    self.console(f'Reconnect - {reconnecting.metrics}')
+    if isinstance(r, ar.Aborted):
+        return reconnecting.metrics
+    return r
+
 # The client object.
 def connect_to_address(self, settings):
     client_name = settings.client_name
 
     ipp = ar.HostPort(settings.host, settings.port)     # Where to expect the service.
+    backoff = BackoffIntervals(base=settings.backoff_base, cap=settings.backoff_cap,
+        breaker_failures=settings.breaker_failures, breaker_seconds=settings.breaker_seconds)
 
     group = ar.GroupTable(
-        server=ar.CreateFrame(ar.ConnectToAddress, ipp),
+        server=ar.CreateFrame(BackoffConnectToAddress, ipp, backoff=backoff, metrics_address=self.address),
     )
     g = group.create(self)
 
-    welcome = say_hello(self, client_name, group)
+    reconnecting = Reconnecting()
+    if settings.hello_seconds:
+        value = keep_saying_hello(self, client_name, group, reconnecting, settings.hello_seconds)
+    else:
+        value = say_hello(self, client_name, group, reconnecting)
 
-    self.send(ar.Stop(), g)     # Clean up.
-    self.select(ar.Completed)
+    if not reconnecting.ended:
+        self.send(ar.Stop(), g)     # Clean up.
+        self.select(ar.Completed)
 
-    return welcome
+    return value
 
 ar.bind(connect_to_address)
 
 #
 #
 class Settings(object):
-    def __init__(self, client_name=None, host=None, port=None):
+    def __init__(self, client_name=None, host=None, port=None,
+            backoff_base=None, backoff_cap=None, breaker_failures=None, breaker_seconds=None,
+            hello_seconds=None):
         self.client_name = client_name
         self.host = host
         self.port = port
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker_failures = breaker_failures
+        self.breaker_seconds = breaker_seconds
+        self.hello_seconds = hello_seconds
 
 SETTINGS_SCHEMA = {
     'client_name': str,
     'host': str,
     'port': int,
+    'backoff_base': float,      # First retry delay and lower bound.
+    'backoff_cap': float,       # Upper bound on retry delay.
+    'breaker_failures': int,    # Consecutive failures that open the breaker, or zero.
+    'breaker_seconds': float,   # Open period before a probe, or zero to give up.
+    'hello_seconds': float,     # Interval between Hellos, or zero for one.
 }
 
 ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
 
 # Initial values.
-factory_settings = Settings(client_name='Gladys', host='127.0.0.1', port=32011)
+factory_settings = Settings(client_name='Gladys', host='127.0.0.1', port=32011,
+    backoff_base=0.5, backoff_cap=30.0, breaker_failures=8, breaker_seconds=0.0,
+    hello_seconds=0.0)
 
 if __name__ == '__main__':
     ar.create_object(connect_to_address, factory_settings=factory_settings)
-
@@ -0,0 +1,122 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A network client written with asyncio.
+
+The coroutine equivalent of connect-to-address.py, using the adapter
+in asyncio_adapter.py. A number of clients run concurrently on the one
+event loop, each connecting and exchanging a series of Hello-Welcome
+round trips. The results are returned as a LatencyReport.
+
+Settings and output are managed in the usual way. The loop runs
+inside the object and abandons the clients on user intervention.
+'''
+import time
+import asyncio
+import ansar.connect as ar
+from hello_welcome import *
+from latency import *
+from asyncio_adapter import *
+
+# One client. Return the failure or None.
+async def say_hello(ipp, client_name, hello_count, latency):
+	c = await connect(ipp)
+	if isinstance(c, ar.NotConnected):
+		return c
+
+	try:
+		for i in range(hello_count):
+			started = time.perf_counter()
+			c.send(Hello(my_name=client_name, request_id=i))
+			await c.drain()
+			try:
+				m = await asyncio.wait_for(c.receive(), 3.0)
+			except asyncio.TimeoutError:
+				return ar.TimedOut()
+			if not isinstance(m, Welcome):
+				return m
+			latency.sample(time.perf_counter() - started)
+	finally:
+		c.close()
+		await c.wait_closed()
+	return None
+
+async def connect_and_greet(self, settings):
+	ipp = ar.HostPort(settings.host, settings.port)
+	clients = max(1, settings.clients)
+	latency = Latency()
+
+	started = time.perf_counter()
+	greet = asyncio.gather(*[say_hello(ipp, f'{settings.client_name}-{i}', settings.hello_count, latency)
+		for i in range(clients)])
+	stop = asyncio.ensure_future(stopped(self))
+
+	# At this point can expect;
+	# 1. Completion of every client,
+	# 2. User intervention.
+	done, _ = await asyncio.wait((greet, stop), return_when=asyncio.FIRST_COMPLETED)
+	stop.cancel()
+	if stop in done:
+		greet.cancel()
+		await asyncio.gather(greet, return_exceptions=True)
+		return ar.Aborted()
+	seconds = time.perf_counter() - started
+
+	failed = [r for r in greet.result() if r is not None]
+	if len(failed) == clients:
+		return failed[0]
+	report = latency.report(seconds, sessions=clients, failed=len(failed))
+	self.console(f'At client - {report}')
+	return report
+
+# The client object.
+def connect_to_address(self, settings):
+	return asyncio.run(connect_and_greet(self, settings))
+
+ar.bind(connect_to_address)
+
+#
+#
+class Settings(object):
+	def __init__(self, client_name=None, host=None, port=None, clients=None, hello_count=None):
+		self.client_name = client_name
+		self.host = host
+		self.port = port
+		self.clients = clients
+		self.hello_count = hello_count
+
+SETTINGS_SCHEMA = {
+	'client_name': str,
+	'host': str,
+	'port': int,
+	'clients': int,			# Concurrent connections.
+	'hello_count': int,		# Round trips per connection.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(client_name='Gladys', host='127.0.0.1', port=32011,
+	clients=10, hello_count=100)
+
+if __name__ == '__main__':
+	ar.create_object(connect_to_address, factory_settings=factory_settings)
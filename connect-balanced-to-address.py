@@ -0,0 +1,200 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A network client balancing across several servers.
+
+Connects to every server in the list, each maintained by a GroupTable
+member around a BackoffConnectToAddress, i.e. with reconnection. A window
+of Hellos is kept outstanding and each Hello goes to one of the connected
+servers, chosen by the balancing policy. Welcomes are matched to Hellos
+using the request_id. Hellos outstanding at a server that is lost are
+sent again elsewhere.
+
+Returns a BalancedReport, the overall latency and the share of Welcomes
+from each server.
+'''
+import time
+import ansar.connect as ar
+from hello_welcome import *
+from latency import *
+from reconnect_backoff import *
+from load_balancing import *
+
+class ServerShare(object):
+	def __init__(self, requested_ipp=None, welcomes=0, lost=0):
+		self.requested_ipp = requested_ipp or ar.HostPort()
+		self.welcomes = welcomes
+		self.lost = lost
+
+	def __str__(self):
+		return f'{self.requested_ipp} {self.welcomes} welcomes, {self.lost} lost'
+
+SHARE_SCHEMA = {
+	'requested_ipp': ar.UserDefined(ar.HostPort),
+	'welcomes': int,
+	'lost': int,			# Connections.
+}
+
+ar.bind(ServerShare, object_schema=SHARE_SCHEMA)
+
+class BalancedReport(object):
+	def __init__(self, policy=None, latency=None, resent=0, servers=None):
+		self.policy = policy
+		self.latency = latency
+		self.resent = resent
+		self.servers = servers or []
+
+REPORT_SCHEMA = {
+	'policy': str,
+	'latency': ar.UserDefined(LatencyReport),
+	'resent': int,			# Hellos orphaned by a lost server.
+	'servers': ar.VectorOf(ar.UserDefined(ServerShare)),
+}
+
+ar.bind(BalancedReport, object_schema=REPORT_SCHEMA)
+
+# The client object.
+def connect_to_address(self, settings):
+	client_name = settings.client_name
+	window = max(1, settings.window)
+	hello_count = settings.hello_count
+	if settings.policy not in BALANCING_POLICIES:
+		return ar.Faulted(f'unknown balancing policy "{settings.policy}"', f'expecting one of {", ".join(BALANCING_POLICIES)}')
+	if not settings.servers:
+		return ar.Faulted('no servers', 'expecting at least one address')
+
+	backoff = BackoffIntervals(base=settings.backoff_base, cap=settings.backoff_cap,
+		breaker_failures=settings.breaker_failures, breaker_seconds=settings.breaker_seconds)
+
+	share = {}
+	member_frame = {}
+	for i, ipp in enumerate(settings.servers):
+		k = f'server{i}'
+		share[k] = ServerShare(requested_ipp=ipp)
+		member_frame[k] = ar.CreateFrame(BackoffConnectToAddress, ipp, backoff=backoff)
+	group = ar.GroupTable(**member_frame)
+	g = group.create(self)
+
+	balancer = Balancer(policy=settings.policy, decay_seconds=settings.decay_seconds)
+	latency = Latency()
+	queued = []				# Ids to send, or send again.
+	next_id = 1
+	received = 0
+	resent = 0
+
+	value = None
+	first = time.perf_counter()
+	while received < hello_count:
+		while next_id <= hello_count and len(balancer.request) + len(queued) < window:
+			queued.append(next_id)
+			next_id += 1
+
+		now = time.perf_counter()
+		while queued and balancer.up():
+			i = queued.pop(0)
+			member = balancer.pick(now)
+			balancer.sent(member, i, now)
+			self.send(Hello(my_name=client_name, request_id=i), member.address)
+
+		m = self.select(Welcome, ar.GroupUpdate, ar.Ready, ar.NotReady, ar.Completed, ar.Stop, seconds=settings.reply_seconds)
+		if isinstance(m, Welcome):		# Intended outcome.
+			r = balancer.received(m.request_id, time.perf_counter())
+			if r is None:				# From a lost server.
+				continue
+			member, seconds = r
+			latency.sample(seconds)
+			share[member.key].welcomes += 1
+			received += 1
+		elif isinstance(m, ar.GroupUpdate):		# Server connected or lost.
+			orphaned = balancer.update(m.key, m.address)
+			if m.address is None:
+				share[m.key].lost += 1
+				self.console(f'Lost {share[m.key].requested_ipp}, sending {len(orphaned)} again')
+			queued = orphaned + queued
+			resent += len(orphaned)
+		elif isinstance(m, (ar.Ready, ar.NotReady)):
+			continue
+		elif isinstance(m, ar.Completed):		# Group ended, e.g. breakers open.
+			return m.value
+		elif isinstance(m, ar.Stop):
+			value = ar.Aborted()
+			break
+		elif isinstance(m, ar.SelectTimer):
+			value = ar.TimedOut(m)
+			break
+
+	self.send(ar.Stop(), g)		# Clean up.
+	self.select(ar.Completed)
+	if value is not None:
+		return value
+
+	report = BalancedReport(policy=settings.policy, resent=resent, servers=list(share.values()),
+		latency=latency.report(time.perf_counter() - first, sessions=len(share)))
+	self.console(f'Balanced - {report.latency}')
+	for s in report.servers:
+		self.console(f'Server - {s}')
+	return report
+
+ar.bind(connect_to_address)
+
+#
+#
+class Settings(object):
+	def __init__(self, client_name=None, servers=None, policy=None, window=None, hello_count=None,
+			decay_seconds=None, reply_seconds=None,
+			backoff_base=None, backoff_cap=None, breaker_failures=None, breaker_seconds=None):
+		self.client_name = client_name
+		self.servers = servers
+		self.policy = policy
+		self.window = window
+		self.hello_count = hello_count
+		self.decay_seconds = decay_seconds
+		self.reply_seconds = reply_seconds
+		self.backoff_base = backoff_base
+		self.backoff_cap = backoff_cap
+		self.breaker_failures = breaker_failures
+		self.breaker_seconds = breaker_seconds
+
+SETTINGS_SCHEMA = {
+	'client_name': str,
+	'servers': ar.VectorOf(ar.UserDefined(ar.HostPort)),	# Where to expect the service.
+	'policy': str,				# Round-robin, least-outstanding or power-of-two.
+	'window': int,				# Maximum Hellos outstanding, over all servers.
+	'hello_count': int,			# Total Hellos to send.
+	'decay_seconds': float,		# Response time averaging.
+	'reply_seconds': float,		# Longest wait for any message.
+	'backoff_base': float,		# First retry delay and lower bound.
+	'backoff_cap': float,		# Upper bound on retry delay.
+	'breaker_failures': int,	# Consecutive failures that open the breaker, or zero.
+	'breaker_seconds': float,	# Open period before a probe, or zero to give up.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(client_name='Gladys',
+	servers=[ar.HostPort('127.0.0.1', 32011), ar.HostPort('127.0.0.1', 32012)],
+	policy=POWER_OF_TWO, window=16, hello_count=10000, decay_seconds=1.0, reply_seconds=10.0,
+	backoff_base=0.5, backoff_cap=30.0, breaker_failures=8, breaker_seconds=10.0)
+
+if __name__ == '__main__':
+	ar.create_object(connect_to_address, factory_settings=factory_settings)
@@ -27,16 +27,17 @@ replacement for connect-to-address or connect-session-to-address.
 '''
 import ansar.connect as ar
 from hello_welcome import *
+from compiled_dispatch import *
 
 # Client FSM object.
 class INITIAL: pass
 class PENDING: pass
 class CONNECTED: pass
 
-class ConnectToAddress(ar.Point, ar.StateMachine):
+class ConnectToAddress(ar.Point, CompiledStateMachine):
 	def __init__(self, settings):
 		ar.Point.__init__(self)
-		ar.StateMachine.__init__(self, INITIAL)
+		CompiledStateMachine.__init__(self, INITIAL)
 		self.settings = settings
 		self.client_name = settings.client_name
 		self.ipp = None
@@ -81,6 +82,7 @@ CONNECT_TO_ADDRESS_DISPATCH = {
 }
 
 ar.bind(ConnectToAddress, CONNECT_TO_ADDRESS_DISPATCH)
+compile_dispatch(ConnectToAddress)
 
 #
 #
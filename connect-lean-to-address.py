@@ -0,0 +1,169 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A lean, one-shot network client.
+
+Equivalent to connect-to-address.py for use from cron jobs and scripts,
+where a process is started for every Hello and startup dominates. The
+standard library covers the connection and reading of the Welcome,
+with minimal parsing of arguments, i.e. --client-name, --host, --port
+and --timeout.
+
+Encoding of the Hello needs the full framework. The encoded frame is
+cached per client name and installed version of the framework. The
+framework is only imported when there is no cached frame, or the
+message definitions have changed since it was cached. Run with
+--no-cache for the cold path every time.
+
+Prints the Welcome and exits with zero, or prints the failure to
+stderr and exits with 1.
+'''
+import os
+import sys
+import json
+import socket
+import hashlib
+import importlib.util
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(HERE, 'hello_welcome.py')
+CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'ansar-lean')
+NAME = 'connect-lean-to-address'
+WELCOME = 'hello_welcome.Welcome'
+
+def encode_hello(client_name):
+	'''Full encoding of a Hello frame, using the framework.'''
+	import ansar.connect as ar
+	from ansar.connect.socketry import Header, HEADING, SPACE
+	from hello_welcome import Hello
+
+	codec = ar.CodecJson()
+	space = []
+	b0 = codec.encode(Header((0,), (1,), False), HEADING).encode('utf-8')
+	b1 = codec.encode(Hello(my_name=client_name), ar.Any(), space=space).encode('utf-8')
+	b2 = codec.encode(space, SPACE).encode('utf-8')
+	n3 = len(b0) + len(b1) + len(b2)
+	return b''.join((f'{len(b0)},{len(b1)},{n3}\n'.encode('ascii'), b0, b1, b2, b'\n'))
+
+def framework_version():
+	'''Identity of the installed framework, without importing it.'''
+	spec = importlib.util.find_spec('ansar.connect')
+	if spec is None or spec.origin is None:
+		return ''
+	site = os.path.dirname(os.path.dirname(os.path.dirname(spec.origin)))
+	try:
+		# Distribution metadata is named for the version,
+		# e.g. ansar_connect-1.1.54.dist-info.
+		info = sorted(n for n in os.listdir(site) if n.startswith('ansar_connect-'))
+	except OSError:
+		info = []
+	return ':'.join([spec.origin] + info)
+
+def hello_frame(client_name, cache=True):
+	'''Encoded Hello, from the cache where still valid.'''
+	if not cache:
+		return encode_hello(client_name)
+	identity = f'{client_name}\0{framework_version()}'
+	key = hashlib.sha256(identity.encode('utf-8')).hexdigest()[:32]
+	path = os.path.join(CACHE, f'hello-{key}.frame')
+	try:
+		if os.stat(path).st_mtime >= os.stat(SOURCE).st_mtime:
+			with open(path, 'rb') as f:
+				return f.read()
+	except OSError:
+		pass
+
+	frame = encode_hello(client_name)
+	try:
+		os.makedirs(CACHE, exist_ok=True)
+		temporary = f'{path}.{os.getpid()}'
+		with open(temporary, 'wb') as f:
+			f.write(frame)
+		os.replace(temporary, path)
+	except OSError:
+		pass		# Cold path next time.
+	return frame
+
+def receive(f):
+	'''Read one frame. Return the type name and members of the body.'''
+	line = f.readline()
+	if not line:
+		raise ConnectionError('connection closed')
+	n0, n1, n3 = [int(n) for n in line[:-1].split(b',')]
+	frame = f.read(n3 + 1)
+	if len(frame) < n3 + 1:
+		raise ConnectionError('connection closed')
+	value = json.loads(frame[n0:n0 + n1])['value']
+	return value[0], value[1]
+
+def arguments(argv):
+	'''Minimal --name=value parsing.'''
+	a = {'client-name': 'Gladys', 'host': '127.0.0.1', 'port': '32011', 'timeout': '3.0', 'cache': 'true'}
+	for s in argv:
+		if s == '--no-cache':
+			a['cache'] = 'false'
+			continue
+		name, equals, value = s.partition('=')
+		if not name.startswith('--') or not equals or name[2:] not in a:
+			raise ValueError(f'unknown argument "{s}"')
+		a[name[2:]] = value
+	return a
+
+def connect_to_address(argv):
+	try:
+		a = arguments(argv)
+		client_name = a['client-name']
+		host, port = a['host'], int(a['port'])
+		timeout = float(a['timeout'])
+	except ValueError as e:
+		print(f'{NAME}: {e}', file=sys.stderr)
+		return 1
+
+	frame = hello_frame(client_name, a['cache'] != 'false')
+	try:
+		s = socket.create_connection((host, port), timeout=timeout)
+	except OSError as e:
+		print(f'{NAME}: cannot connect to "{host}:{port}" ({e})', file=sys.stderr)
+		return 1
+
+	try:
+		s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		s.sendall(frame)
+		f = s.makefile('rb')
+		name, members = receive(f)
+	except socket.timeout:
+		print(f'{NAME}: timed out', file=sys.stderr)
+		return 1
+	except (OSError, ValueError, KeyError, IndexError) as e:
+		print(f'{NAME}: {e}', file=sys.stderr)
+		return 1
+	finally:
+		s.close()
+
+	if name != WELCOME:
+		print(f'{NAME}: unexpected {name} {members}', file=sys.stderr)
+		return 1
+	print(f'Hello "{members["your_name"]}", my name is "{members["my_name"]}"')
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(connect_to_address(sys.argv[1:]))
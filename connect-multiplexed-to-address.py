@@ -0,0 +1,117 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A multiplexed load generator.
+
+Runs many sessions against a single server, all over one connection.
+Each session sends a series of Hellos and records the Hello-Welcome round
+trips, as in load-sessions-to-address. The server must be started with
+multiplex enabled, e.g. listen-sessions-at-address --multiplex=true.
+The merged results are returned as a LatencyReport.
+'''
+import time
+import ansar.connect as ar
+from hello_welcome import *
+from latency import *
+from multiplex import *
+
+# Session object, one per stream.
+def streamed_to_address(self, client_name, hello_count, remote_address=None, **kv):
+	latency = Latency()
+	for i in range(hello_count):
+		hello = Hello(my_name=client_name)
+		sent = time.perf_counter()
+		self.send(hello, remote_address)
+
+		m = self.select(Welcome, ar.Stop)
+		if isinstance(m, ar.Stop):
+			return ar.Aborted()
+		latency.sample(time.perf_counter() - sent)
+	return latency
+
+ar.bind(streamed_to_address)
+
+# Client object.
+def connect_to_address(self, settings):
+	client_name = settings.client_name
+	streams = settings.streams
+
+	ipp = ar.HostPort(settings.host, settings.port)
+	session = ar.CreateFrame(streamed_to_address, client_name, settings.hello_count)
+	mux = ar.CreateFrame(multiplexer, session, streams, settings.window)
+
+	first = time.perf_counter()
+	ar.connect(self, ipp, session=mux)
+	m = self.select(ar.Connected, ar.NotConnected, ar.Stop)
+	if isinstance(m, ar.NotConnected):
+		return m
+	elif isinstance(m, ar.Stop):
+		return ar.Aborted()
+
+	# Streams have started.
+	m = self.select(ar.Abandoned, ar.Closed, ar.Stop)
+	if isinstance(m, ar.Abandoned):
+		return m
+	elif isinstance(m, ar.Stop):
+		return ar.Aborted()
+
+	latency = Latency()
+	failed = 0
+	for v in m.value:
+		if isinstance(v, Latency):
+			latency.merge(v)
+		else:
+			failed += 1
+	report = latency.report(time.perf_counter() - first, sessions=streams, failed=failed)
+	self.console(f'Multiplexed - {report}')
+	return report
+
+ar.bind(connect_to_address)
+
+#
+#
+class Settings(object):
+	def __init__(self, client_name=None, host=None, port=None,
+			streams=None, window=None, hello_count=None):
+		self.client_name = client_name
+		self.host = host
+		self.port = port
+		self.streams = streams
+		self.window = window
+		self.hello_count = hello_count
+
+SETTINGS_SCHEMA = {
+	'client_name': str,
+	'host': str,
+	'port': int,
+	'streams': int,			# Sessions over the one connection.
+	'window': int,			# Messages in flight, per stream.
+	'hello_count': int,		# Hellos per session.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+factory_settings = Settings(client_name='Gladys', host='127.0.0.1', port=32011,
+	streams=1000, window=8, hello_count=10)
+
+if __name__ == '__main__':
+	ar.create_object(connect_to_address, factory_settings=factory_settings)
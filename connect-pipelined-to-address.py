@@ -0,0 +1,217 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A pipelining async, network client.
+
+A variation of connect-to-address. Rather than waiting for each Welcome
+before sending the next Hello, a window of Hellos is kept outstanding
+on the one connection. Each Welcome is matched to its Hello using the
+request_id. Optionally, queued Hellos are coalesced into a HelloBatch
+of up to batch_size entries, answered by a single WelcomeBatch. Works
+with any of the listen-at-address servers.
+
+Optionally, the client offers a codec, e.g. compact-2. If the server
+selects it, every Hello and Welcome is carried in that encoding.
+
+Requests refused by a saturated server, i.e. Busy, are queued again
+and sending pauses for the period suggested by the server.
+'''
+import time
+import ansar.connect as ar
+from hello_welcome import *
+from latency import *
+from compact_codec import *
+from offload import Busy
+from local_socket import *
+
+# The client object.
+def connect_to_address(self, settings):
+	client_name = settings.client_name
+	window = max(1, settings.window)
+	hello_count = settings.hello_count
+	batch_size = max(1, settings.batch_size)
+	batch_seconds = settings.batch_seconds
+
+	# Initiate the connection.
+	enable_local_sockets()		# A path as host.
+	ipp = ar.HostPort(settings.host, settings.port)		# Where to expect the service.
+	ar.connect(self, ipp)
+
+	m = self.select(ar.Connected, ar.NotConnected, ar.Stop)
+	if isinstance(m, ar.NotConnected):
+		return m
+	elif isinstance(m, ar.Stop):
+		return ar.Aborted()
+	server_address = self.return_address	# Where the Connected message came from.
+
+	# Negotiate the encoding.
+	compact = False
+	if settings.codec:
+		self.send(CodecOffer(codecs=[settings.codec]), server_address)
+		m = self.select(CodecSelected, ar.Closed, ar.Abandoned, ar.Stop, seconds=3.0)
+		if isinstance(m, (ar.Closed, ar.Abandoned)):
+			return m
+		elif isinstance(m, ar.Stop):
+			return ar.Aborted()
+		elif isinstance(m, ar.SelectTimer):
+			return ar.TimedOut(m)
+		compact = m.codec == COMPACT
+		self.console(f'Codec "{m.codec or "default"}"')
+
+	def send_request(r):
+		self.send(HELLO_CODEC.blob(r) if compact else r, server_address)
+
+	# Keep the pipe full. Outstanding requests are
+	# remembered by id, along with the moment of sending.
+	latency = Latency()
+	outstanding = {}
+	queued = []
+	next_id = 1
+	received = 0
+
+	def send_queued():
+		batch = queued[:batch_size]
+		del queued[:batch_size]
+		sent = time.perf_counter()
+		for h in batch:
+			outstanding[h.request_id] = sent
+		if len(batch) == 1:
+			send_request(batch[0])
+		else:
+			send_request(HelloBatch(hellos=batch))
+
+	held = False
+	batching = False		# Window of a partial batch is running.
+	waiting = 3.0			# For a response, or the end of a hold.
+	first = time.perf_counter()
+	while received < hello_count:
+		while len(outstanding) + len(queued) < window and next_id <= hello_count:
+			queued.append(Hello(my_name=client_name, request_id=next_id))
+			next_id += 1
+
+		# Coalesce queued requests into batches. Send when a
+		# batch is full or nothing else is in flight. A partial
+		# batch is held for no longer than the batch window.
+		while not held and (len(queued) >= batch_size or (queued and not outstanding)):
+			send_queued()
+		if not queued and batching:
+			self.cancel(ar.T2)
+			batching = False
+		elif queued and not held and not batching:		# Batch opened.
+			self.start(ar.T2, batch_seconds)
+			batching = True
+
+		# Expect a response. Which might be;
+		# 1. Server acknowledgement of any outstanding request(s),
+		# 2. Expiry of the batch window,
+		# 3. Loss of connection,
+		# 4. Server failure, e.g. a malformed request,
+		# 5. User intervention.
+		# 6. Time out.
+		m = self.select(Welcome, WelcomeBatch, ar.Blob, Busy, ar.T2, ar.T3, ar.Faulted, ar.Stop, seconds=waiting)
+		if isinstance(m, ar.Blob):
+			try:
+				m = HELLO_CODEC.decode(m.block)
+			except CompactFailed as e:
+				return ar.Faulted('malformed response', str(e))
+
+		if isinstance(m, Welcome):		# Intended outcome.
+			welcomes = [m]
+		elif isinstance(m, WelcomeBatch):
+			welcomes = m.welcomes
+		elif isinstance(m, ar.T2):
+			batching = False
+			if queued and not held:
+				send_queued()
+			continue
+		elif isinstance(m, Busy):		# Server saturated, try again later.
+			for i in m.request_ids:
+				if outstanding.pop(i, None) is not None:
+					queued.append(Hello(my_name=client_name, request_id=i))
+			held = True
+			hold = max(0.25, m.retry_after)
+			self.start(ar.T3, hold)
+			waiting = hold + 3.0
+			continue
+		elif isinstance(m, ar.T3):
+			held = False
+			waiting = 3.0
+			continue
+		elif isinstance(m, ar.Faulted):	# Including Closed and Abandoned.
+			return m
+		elif isinstance(m, ar.Stop):
+			return ar.Aborted()
+		elif isinstance(m, ar.SelectTimer):
+			return ar.TimedOut(m)
+
+		now = time.perf_counter()
+		for welcome in welcomes:
+			sent = outstanding.pop(welcome.request_id, None)
+			if sent is None:
+				self.warning(f'Welcome for unknown request [{welcome.request_id}]')
+				continue
+			latency.sample(now - sent)
+			received += 1
+
+	self.send(ar.Close(), server_address)
+	self.select(ar.Closed, ar.Abandoned, ar.Stop)
+
+	report = latency.report(time.perf_counter() - first, sessions=1)
+	self.console(f'Pipelined - {report}')
+
+	return report
+
+ar.bind(connect_to_address)
+
+#
+#
+class Settings(object):
+	def __init__(self, client_name=None, host=None, port=None, window=None, hello_count=None,
+			batch_size=None, batch_seconds=None, codec=None):
+		self.client_name = client_name
+		self.host = host
+		self.port = port
+		self.window = window
+		self.hello_count = hello_count
+		self.batch_size = batch_size
+		self.batch_seconds = batch_seconds
+		self.codec = codec
+
+SETTINGS_SCHEMA = {
+	'client_name': str,
+	'host': str,
+	'port': int,
+	'window': int,			# Maximum Hellos outstanding.
+	'hello_count': int,		# Total Hellos to send.
+	'batch_size': int,		# Maximum Hellos in a HelloBatch, 1 to disable.
+	'batch_seconds': float,	# Longest wait for a batch to fill.
+	'codec': str,			# Encoding to offer, or empty for the default.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(client_name='Gladys', host='127.0.0.1', port=32011, window=16, hello_count=1000,
+	batch_size=1, batch_seconds=0.25, codec='')
+
+if __name__ == '__main__':
+	ar.create_object(connect_to_address, factory_settings=factory_settings)
@@ -0,0 +1,141 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A network client using a pool of connections.
+
+A variation of connect-to-address that makes many short Hello-Welcome
+exchanges. Each exchange checks out a connection from a connection_pool,
+uses it and checks it back in, i.e. only the first exchanges pay for
+the connect. With pooled set to false, each exchange makes its own
+connection, for comparison. Latency of each exchange includes the cost
+of acquiring the connection.
+'''
+import time
+import ansar.connect as ar
+from hello_welcome import *
+from latency import *
+from connection_pool import *
+
+# Acquire a connection. Either a lease from the pool or
+# a fresh connection.
+def acquire(self, pool, ipp):
+	if pool:
+		self.send(Checkout(requested_ipp=ipp), pool)
+		m = self.select(Lease, ar.NotConnected, ar.Stop)
+		if isinstance(m, Lease):
+			return m.remote_address
+		return m
+	ar.connect(self, ipp)
+	m = self.select(ar.Connected, ar.NotConnected, ar.Stop)
+	if isinstance(m, ar.Connected):
+		return self.return_address
+	return m
+
+def release(self, pool, server_address, discard=False):
+	if pool:
+		self.send(Checkin(remote_address=server_address, discard=discard), pool)
+		return
+	self.send(ar.Close(), server_address)
+	self.select(ar.Closed, ar.Abandoned)
+
+# The client object.
+def connect_to_address(self, settings):
+	client_name = settings.client_name
+	hello_count = settings.hello_count
+	ipp = ar.HostPort(settings.host, settings.port)		# Where to expect the service.
+
+	pool = None
+	if settings.pooled:
+		pool = self.create(connection_pool, settings.pool_size, settings.idle_seconds, warm=[ipp])
+
+	latency = Latency()
+	failed = 0
+	first = time.perf_counter()
+	for i in range(1, hello_count + 1):
+		sent = time.perf_counter()
+		a = acquire(self, pool, ipp)
+		if isinstance(a, ar.Stop):
+			break
+		elif isinstance(a, ar.NotConnected):
+			failed += 1
+			continue
+		server_address = a
+
+		self.send(Hello(my_name=client_name, request_id=i), server_address)
+		while True:
+			m = self.select(Welcome, LeaseLost, ar.Closed, ar.Abandoned, ar.Stop, seconds=3.0)
+			if isinstance(m, Welcome) and m.request_id != i:
+				continue			# Late response on a discarded connection.
+			elif isinstance(m, LeaseLost) and m.remote_address != server_address:
+				continue			# Earlier lease.
+			break
+		if isinstance(m, Welcome):
+			latency.sample(time.perf_counter() - sent)
+			release(self, pool, server_address)
+			continue
+		elif isinstance(m, ar.Stop):
+			break
+		elif isinstance(m, ar.SelectTimer):		# Response may yet arrive.
+			release(self, pool, server_address, discard=True)
+		# Lost connection or timed out.
+		failed += 1
+
+	report = latency.report(time.perf_counter() - first, sessions=1, failed=failed)
+	if pool:
+		self.send(ar.Stop(), pool)
+		self.select(ar.Completed)
+	self.console(f'Pooled - {report}')
+	return report
+
+ar.bind(connect_to_address)
+
+#
+#
+class Settings(object):
+	def __init__(self, client_name=None, host=None, port=None, hello_count=None,
+			pooled=None, pool_size=None, idle_seconds=None):
+		self.client_name = client_name
+		self.host = host
+		self.port = port
+		self.hello_count = hello_count
+		self.pooled = pooled
+		self.pool_size = pool_size
+		self.idle_seconds = idle_seconds
+
+SETTINGS_SCHEMA = {
+	'client_name': str,
+	'host': str,
+	'port': int,
+	'hello_count': int,			# Exchanges to make.
+	'pooled': bool,				# Or connect for each exchange.
+	'pool_size': int,			# Connections kept warm.
+	'idle_seconds': float,		# Before closing surplus connections.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(client_name='Gladys', host='127.0.0.1', port=32011,
+	hello_count=1000, pooled=True, pool_size=2, idle_seconds=30.0)
+
+if __name__ == '__main__':
+	ar.create_object(connect_to_address, factory_settings=factory_settings)
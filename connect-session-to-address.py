@@ -27,16 +27,17 @@ replacement for connect-to-address or connect-fsm-to-address.
 '''
 import ansar.connect as ar
 from hello_welcome import *
+from local_socket import *
 
 # Session object.
 def connected_to_address(self, client_name, remote_address=None, **kv):
 	hello = Hello(my_name=client_name)
 	self.send(hello, remote_address)
 
-	m = self.select(Welcome, ar.Stop)
+	m = self.select(Welcome, ar.Faulted, ar.Stop)
 	if isinstance(m, ar.Stop):
 		return ar.Aborted()
-	return m
+	return m		# Welcome or Faulted.
 
 ar.bind(connected_to_address)
 
@@ -44,6 +45,7 @@ ar.bind(connected_to_address)
 def connect_to_address(self, settings):
 	client_name = settings.client_name
 
+	enable_local_sockets()		# A path as host.
 	ipp = ar.HostPort(settings.host, settings.port)				# Where to expect the service.
 	session = ar.CreateFrame(connected_to_address, client_name)	# Description of a session.
 	ar.connect(self, ipp, session=session)
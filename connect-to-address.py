@@ -23,16 +23,33 @@
 '''A mimimal async, network client.
 
 The client for the server in listen-at-address.py.
+
+Optionally, the exchange is traced. Where the trace file is configured
+and the sample is taken, the connect and the round trip are recorded
+and the Hello asks the server to record its part, e.g. the time spent
+waiting in the server queue and in dispatch.
+
+With a record file configured, the traffic is appended to that file.
 '''
+import time
 import ansar.connect as ar
 from hello_welcome import *
+from tracing import *
+from local_socket import *
+from recording import *
 
 # The client object.
 def connect_to_address(self, settings):
 	client_name = settings.client_name
+	tracer = Tracer(settings.trace_file, settings.trace_rate)
+	trace_id = tracer.sample()
 
 	# Initiate the connection.
+	enable_local_sockets()		# A path as host.
+	if settings.record_file:
+		enable_recording(settings.record_file)
 	ipp = ar.HostPort(settings.host, settings.port)		# Where to expect the service.
+	connecting = time.monotonic()
 	ar.connect(self, ipp)
 
 	# At this point can expect;
@@ -45,21 +62,29 @@ def connect_to_address(self, settings):
 	elif isinstance(m, ar.Stop):
 		return ar.Aborted()
 	server_address = self.return_address	# Where the Connected message came from.
+	if trace_id:
+		tracer.span('connect', trace_id, connecting, requested_ipp=str(ipp))
 
 	# Make the request.
-	hello = Hello(my_name=client_name)
+	hello = Hello(my_name=client_name, trace_id=trace_id)
+	sent = time.monotonic()
 	self.send(hello, server_address)
 
 	# Expect a response. Which might be;
 	# 1. Server acknowledgement,
-	# 2. Loss of connection,
-	# 3. User intervention.
-	# 4. Time out.
-	m = self.select(Welcome, ar.Closed, ar.Abandoned, ar.Stop, seconds=3.0)
+	# 2. Failure at the server,
+	# 3. Loss of connection,
+	# 4. User intervention.
+	# 5. Time out.
+	m = self.select(Welcome, ar.Faulted, ar.Closed, ar.Abandoned, ar.Stop, seconds=3.0)
+	if trace_id:
+		tracer.flow(trace_id, sent, True)
+		tracer.span('Hello', trace_id, sent, outcome=type(m).__name__)
+		tracer.store()
 
 	if isinstance(m, Welcome):		# Intended outcome.
 		pass
-	elif isinstance(m, (ar.Closed, ar.Abandoned)):
+	elif isinstance(m, (ar.Faulted, ar.Closed, ar.Abandoned)):
 		return m
 	elif isinstance(m, ar.Stop):
 		return ar.Aborted()
@@ -78,21 +103,28 @@ ar.bind(connect_to_address)
 #
 #
 class Settings(object):
-	def __init__(self, client_name=None, host=None, port=None):
+	def __init__(self, client_name=None, host=None, port=None, trace_file=None, trace_rate=None, record_file=None):
 		self.client_name = client_name
 		self.host = host
 		self.port = port
+		self.trace_file = trace_file
+		self.trace_rate = trace_rate
+		self.record_file = record_file
 
 SETTINGS_SCHEMA = {
 	'client_name': str,
 	'host': str,
 	'port': int,
+	'trace_file': str,		# Chrome trace output, or empty.
+	'trace_rate': float,	# Fraction of requests traced.
+	'record_file': str,		# Traffic capture, or empty.
 }
 
 ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
 
 # Initial values.
-factory_settings = Settings(client_name='Gladys', host='127.0.0.1', port=32011)
+factory_settings = Settings(client_name='Gladys', host='127.0.0.1', port=32011,
+	trace_file='', trace_rate=1.0, record_file='')
 
 if __name__ == '__main__':
 	ar.create_object(connect_to_address, factory_settings=factory_settings)
@@ -0,0 +1,215 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A pool of client connections, keyed by address.
+
+The connection_pool object keeps a number of connections open to each
+server address it knows about. A caller sends a Checkout and receives
+a Lease, i.e. the address of an established transport. Requests sent
+to that address are answered directly to the caller. The connection
+is returned with a Checkin, or a Checkin with discard where the state
+of the connection is unknown, e.g. after a request timed out. A
+discarded connection is closed rather than lent again.
+
+Connections lost, whether idle or leased, are replaced. The holder of
+a lost lease is sent a LeaseLost. Connections beyond the pool size,
+opened to meet a burst of demand, are closed once they have been idle
+for the configured period.
+
+A connection is considered live until its Closed or Abandoned arrives.
+No traffic is exchanged on checkout, so a connection that has silently
+gone (half-open) is only detected by the keep-alives of the transport
+or by the request of the caller.
+'''
+import time
+from collections import deque
+import ansar.connect as ar
+
+__all__ = [
+	'Checkout',
+	'Lease',
+	'Checkin',
+	'LeaseLost',
+	'connection_pool',
+]
+
+class Checkout(object):
+	def __init__(self, requested_ipp=None):
+		self.requested_ipp = requested_ipp or ar.HostPort()
+
+class Lease(object):
+	def __init__(self, requested_ipp=None, remote_address=None):
+		self.requested_ipp = requested_ipp or ar.HostPort()
+		self.remote_address = remote_address
+
+class Checkin(object):
+	def __init__(self, remote_address=None, discard=False):
+		self.remote_address = remote_address
+		self.discard = discard
+
+class LeaseLost(object):
+	def __init__(self, remote_address=None):
+		self.remote_address = remote_address
+
+POOL_SCHEMA = {
+	'requested_ipp': ar.UserDefined(ar.HostPort),
+	'remote_address': ar.Address(),
+	'discard': bool,			# Close rather than lend again.
+}
+
+ar.bind(Checkout, object_schema=POOL_SCHEMA)
+ar.bind(Lease, object_schema=POOL_SCHEMA)
+ar.bind(Checkin, object_schema=POOL_SCHEMA)
+ar.bind(LeaseLost, object_schema=POOL_SCHEMA)
+
+# Runtime image of the connections to one address.
+class PoolEntry(object):
+	def __init__(self, ipp):
+		self.ipp = ipp
+		self.idle = deque()			# (remote_address, idle since)
+		self.leased = {}			# Remote address to caller.
+		self.connecting = 0
+		self.waiting = deque()		# Callers.
+
+	def size(self):
+		return len(self.idle) + len(self.leased) + self.connecting
+
+# The pool object.
+def connection_pool(self, size, idle_seconds, warm=None):
+	entry = {}			# Key of address to PoolEntry.
+	remote = {}			# Remote address to key.
+
+	def top_up(e):
+		wanted = max(size, len(e.leased) + len(e.waiting))
+		for i in range(wanted - e.size()):
+			ar.connect(self, e.ipp)
+			e.connecting += 1
+
+	def find(ipp):
+		k = str(ipp)
+		e = entry.get(k, None)
+		if e is None:
+			e = PoolEntry(ipp)
+			entry[k] = e
+		return e
+
+	def lend(e, remote_address, caller):
+		e.leased[remote_address] = caller
+		self.send(Lease(requested_ipp=e.ipp, remote_address=remote_address), caller)
+
+	for ipp in warm or ():
+		top_up(find(ipp))
+
+	# Check idle connections at a quarter of the idle period.
+	self.start(ar.T1, max(0.25, idle_seconds / 4.0), repeating=True)
+
+	while True:
+		m = self.select(Checkout, Checkin, ar.Connected, ar.NotConnected,
+			ar.Closed, ar.Abandoned, ar.T1, ar.Stop)
+
+		if isinstance(m, Checkout):
+			e = find(m.requested_ipp)
+			# Anything lost while idle has already been removed,
+			# i.e. the remote is live as far as is known.
+			while e.idle:
+				a, _ = e.idle.pop()			# Most recently used.
+				if a in remote:
+					lend(e, a, self.return_address)
+					break
+			else:
+				e.waiting.append(self.return_address)
+				top_up(e)
+
+		elif isinstance(m, Checkin):
+			a = m.remote_address
+			k = remote.get(a, None)
+			if k is None:		# Lost while leased.
+				continue
+			e = entry[k]
+			e.leased.pop(a, None)
+			if m.discard:			# Unknown state, e.g. a late response.
+				self.send(ar.Close(), a)
+				continue
+			if e.waiting:
+				lend(e, a, e.waiting.popleft())
+				continue
+			e.idle.append((a, time.monotonic()))
+
+		elif isinstance(m, ar.Connected):
+			e = find(m.requested_ipp)
+			e.connecting -= 1
+			a = self.return_address
+			remote[a] = str(e.ipp)
+			if e.waiting:
+				lend(e, a, e.waiting.popleft())
+				continue
+			e.idle.append((a, time.monotonic()))
+
+		elif isinstance(m, ar.NotConnected):
+			e = find(m.requested_ipp)
+			e.connecting -= 1
+			if e.connecting > 0:	# Others may yet succeed.
+				continue
+			while e.waiting:		# Nothing to give.
+				self.send(m, e.waiting.popleft())
+
+		elif isinstance(m, (ar.Closed, ar.Abandoned)):
+			a = self.return_address
+			k = remote.pop(a, None)
+			if k is None:
+				continue
+			e = entry[k]
+			caller = e.leased.pop(a, None)
+			if caller is not None:		# Lost while leased.
+				self.send(LeaseLost(remote_address=a), caller)
+			e.idle = deque(i for i in e.idle if i[0] != a)
+			top_up(e)
+
+		elif isinstance(m, ar.T1):
+			# Close the oldest idle connections that are
+			# beyond the size of the pool.
+			expired = time.monotonic() - idle_seconds
+			for e in entry.values():
+				surplus = e.size() - size
+				while surplus > 0 and e.idle and e.idle[0][1] < expired:
+					a, _ = e.idle.popleft()
+					self.send(ar.Close(), a)
+					surplus -= 1
+
+		elif isinstance(m, ar.Stop):
+			break
+
+	# Close everything and wait for confirmation.
+	for a in remote.keys():
+		self.send(ar.Close(), a)
+	while remote:
+		m = self.select(ar.Closed, ar.Abandoned, ar.Connected, ar.NotConnected, seconds=3.0)
+		if isinstance(m, (ar.Closed, ar.Abandoned)):
+			remote.pop(self.return_address, None)
+		elif isinstance(m, ar.Connected):
+			self.send(ar.Close(), self.return_address)
+			remote[self.return_address] = None
+		elif isinstance(m, ar.SelectTimer):
+			break
+	return ar.Aborted()
+
+ar.bind(connection_pool)
@@ -0,0 +1,96 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Graceful shutdown of a listening server.
+
+On the first Stop a server stops listening and continues to serve the
+connections it already has. A Drain decides when each of those is sent
+a Close. Closes are spread over the first half of the drain period,
+choosing connections that have been quiet for at least a tick, so that
+a request in progress is answered and clients reconnect over a period
+rather than all at once. Anything remaining at the deadline is closed.
+
+Combined with port sharing, a replacement process can start listening
+before the current process drains, e.g. --reuse-port=true on both and
+--replace-pid on the replacement. Connections are accepted throughout.
+'''
+import time
+
+__all__ = [
+	'Drain',
+	'DRAIN_TICK',
+]
+
+DRAIN_TICK = 0.25
+
+class Drain(object):
+	def __init__(self, connections, seconds, tick=DRAIN_TICK):
+		now = time.monotonic()
+		self.started = now
+		self.deadline = now + seconds
+		self.spread = max(tick, seconds / 2.0)
+		self.tick = tick
+		self.live = {a: now for a in connections}		# Address to last activity.
+		self.total = len(self.live)
+		self.closing = set()
+
+	def add(self, remote_address):
+		'''Connection accepted before the listen was stopped.'''
+		self.live[remote_address] = time.monotonic()
+		self.total += 1
+
+	def touch(self, return_address):
+		'''Note activity on the connection.'''
+		# Requests from remote objects have the address of
+		# the local proxy at the end.
+		a = return_address[-1:]
+		if a in self.live:
+			self.live[a] = time.monotonic()
+
+	def lost(self, remote_address):
+		self.live.pop(remote_address, None)
+		self.closing.discard(remote_address)
+
+	def due(self):
+		'''Connections that should be closed now.'''
+		now = time.monotonic()
+		waiting = [a for a in self.live.keys() if a not in self.closing]
+		if now >= self.deadline:
+			self.closing.update(waiting)
+			return waiting
+		# Quota grows linearly over the spread.
+		quota = int(self.total * min(1.0, (now - self.started) / self.spread) + 0.999)
+		allowed = quota - (self.total - len(waiting))
+		if allowed < 1:
+			return []
+		quiet = now - self.tick
+		idle = sorted((t, a) for a, t in self.live.items() if a not in self.closing and t <= quiet)
+		close = [a for _, a in idle[:allowed]]
+		self.closing.update(close)
+		return close
+
+	def expired(self, grace=1.0):
+		'''Past the deadline, with time for the closes to complete.'''
+		return time.monotonic() >= self.deadline + grace
+
+	def done(self):
+		return not self.live
@@ -24,20 +24,32 @@
 
 '''
 import ansar.encode as ar
+from compact_codec import CompactCodec, CompactFailed
 
 __all__ = [
 	'Hello',
 	'Welcome',
+	'HelloBatch',
+	'WelcomeBatch',
+	'HELLO_CODEC',
+	'compact_request',
 ]
 
+# The request_id is chosen by the client and echoed by the
+# server, so that a Welcome can be matched to its Hello when
+# there are several outstanding on the one connection. A
+# non-zero trace_id asks both ends to record the exchange.
 class Hello(object):
-	def __init__(self, my_name=None):
+	def __init__(self, my_name=None, request_id=0, trace_id=0):
 		self.my_name = my_name
+		self.request_id = request_id
+		self.trace_id = trace_id
 
 class Welcome(object):
-	def __init__(self, your_name=None, my_name=None):
+	def __init__(self, your_name=None, my_name=None, request_id=0):
 		self.your_name = your_name
 		self.my_name = my_name
+		self.request_id = request_id
 	
 	def __str__(self):
 		return f'Hello "{self.your_name}", my name is "{self.my_name}"'
@@ -45,7 +57,47 @@ class Welcome(object):
 SCHEMA = {
 	'my_name': str,
 	'your_name': str,
+	'request_id': int,
 }
 
-ar.bind(Hello, object_schema=SCHEMA)
+HELLO_SCHEMA = {
+	'my_name': str,
+	'request_id': int,
+	'trace_id': int,
+}
+
+ar.bind(Hello, object_schema=HELLO_SCHEMA)
 ar.bind(Welcome, object_schema=SCHEMA)
+
+# Envelopes for multiple requests and responses. A server
+# answers a HelloBatch with a single WelcomeBatch, in the
+# same order.
+class HelloBatch(object):
+	def __init__(self, hellos=None):
+		self.hellos = hellos or []
+
+class WelcomeBatch(object):
+	def __init__(self, welcomes=None):
+		self.welcomes = welcomes or []
+
+BATCH_SCHEMA = {
+	'hellos': ar.VectorOf(ar.UserDefined(Hello)),
+	'welcomes': ar.VectorOf(ar.UserDefined(Welcome)),
+}
+
+ar.bind(HelloBatch, object_schema=BATCH_SCHEMA)
+ar.bind(WelcomeBatch, object_schema=BATCH_SCHEMA)
+
+# Compact encoding of all the above. The order of the
+# types is the wire format - append only.
+HELLO_CODEC = CompactCodec(Hello, Welcome, HelloBatch, WelcomeBatch)
+
+def compact_request(block):
+	'''Recover a Hello or HelloBatch in compact encoding. Return the request or a Faulted.'''
+	try:
+		m = HELLO_CODEC.decode(block)
+	except CompactFailed as e:
+		return ar.Faulted('cannot decode request', str(e))
+	if not isinstance(m, (Hello, HelloBatch)):
+		return ar.Faulted('unexpected request', f'compact {type(m).__name__}')
+	return m
@@ -0,0 +1,156 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Latency recording for the load and benchmark clients.
+
+Samples are recorded in microseconds into log-linear buckets (in the
+style of HDR histograms), i.e. fixed memory and a bounded relative error
+no matter how many samples are taken. Histograms are registered messages
+so that sessions can return them and the results from many sessions can
+be merged into a single report.
+'''
+import ansar.encode as ar
+
+__all__ = [
+	'Latency',
+	'LatencyReport',
+]
+
+SUB_BITS = 5				# 32 sub-buckets per power of two, i.e. ~3% error.
+SUB_COUNT = 1 << SUB_BITS
+LINEAR = SUB_COUNT * 2		# Below this, one bucket per microsecond.
+
+def to_bucket(microseconds):
+	if microseconds < LINEAR:
+		return microseconds
+	e = microseconds.bit_length() - (SUB_BITS + 1)
+	return e * SUB_COUNT + (microseconds >> e)
+
+def from_bucket(b):
+	if b < LINEAR:
+		return b
+	e = b // SUB_COUNT - 1
+	m = b - e * SUB_COUNT
+	return ((m + 1) << e) - 1		# Highest value in the bucket.
+
+class Latency(object):
+	'''Accumulated samples of a round-trip, e.g. Hello to Welcome.'''
+	def __init__(self, counts=None, lowest=None, highest=None):
+		self.counts = counts or []
+		self.lowest = lowest
+		self.highest = highest
+
+	def sample(self, seconds):
+		us = max(0, int(seconds * 1000000))
+		b = to_bucket(us)
+		c = self.counts
+		if b >= len(c):
+			c.extend([0] * (b + 1 - len(c)))
+		c[b] += 1
+		if self.lowest is None or us < self.lowest:
+			self.lowest = us
+		if self.highest is None or us > self.highest:
+			self.highest = us
+
+	def merge(self, other):
+		c = self.counts
+		d = other.counts
+		if len(d) > len(c):
+			c.extend([0] * (len(d) - len(c)))
+		for i, n in enumerate(d):
+			c[i] += n
+		if other.lowest is not None and (self.lowest is None or other.lowest < self.lowest):
+			self.lowest = other.lowest
+		if other.highest is not None and (self.highest is None or other.highest > self.highest):
+			self.highest = other.highest
+
+	def total(self):
+		return sum(self.counts)
+
+	def percentile(self, p):
+		'''Return the latency in seconds at or below which p percent of samples fall.'''
+		n = self.total()
+		if n == 0:
+			return 0.0
+		rank = max(1, int(n * p / 100.0 + 0.5))
+		seen = 0
+		for b, c in enumerate(self.counts):
+			seen += c
+			if seen >= rank:
+				us = min(from_bucket(b), self.highest)
+				return us / 1000000.0
+		return self.highest / 1000000.0
+
+	def report(self, seconds, sessions=0, failed=0):
+		'''Summarize the samples taken over the given period.'''
+		n = self.total()
+		r = LatencyReport(sessions=sessions, failed=failed, round_trips=n, seconds=seconds)
+		r.rate = n / seconds if seconds > 0.0 else 0.0
+		r.p50 = self.percentile(50.0)
+		r.p99 = self.percentile(99.0)
+		r.p999 = self.percentile(99.9)
+		r.lowest = (self.lowest or 0) / 1000000.0
+		r.highest = (self.highest or 0) / 1000000.0
+		return r
+
+LATENCY_SCHEMA = {
+	'counts': ar.VectorOf(ar.Integer8()),
+	'lowest': ar.Integer8(),
+	'highest': ar.Integer8(),
+}
+
+ar.bind(Latency, object_schema=LATENCY_SCHEMA)
+
+class LatencyReport(object):
+	'''Results of a load run, all latencies in seconds.'''
+	def __init__(self, sessions=0, failed=0, round_trips=0, seconds=0.0, rate=0.0,
+			p50=0.0, p99=0.0, p999=0.0, lowest=0.0, highest=0.0):
+		self.sessions = sessions
+		self.failed = failed
+		self.round_trips = round_trips
+		self.seconds = seconds
+		self.rate = rate
+		self.p50 = p50
+		self.p99 = p99
+		self.p999 = p999
+		self.lowest = lowest
+		self.highest = highest
+
+	def __str__(self):
+		return (f'{self.round_trips} round-trips over {self.sessions} sessions ({self.failed} failed) '
+			f'in {self.seconds:.3f}s, {self.rate:.1f}/s, '
+			f'p50={self.p50 * 1000.0:.3f}ms p99={self.p99 * 1000.0:.3f}ms p999={self.p999 * 1000.0:.3f}ms')
+
+REPORT_SCHEMA = {
+	'sessions': ar.Integer8(),
+	'failed': ar.Integer8(),
+	'round_trips': ar.Integer8(),
+	'seconds': ar.Float8(),
+	'rate': ar.Float8(),
+	'p50': ar.Float8(),
+	'p99': ar.Float8(),
+	'p999': ar.Float8(),
+	'lowest': ar.Float8(),
+	'highest': ar.Float8(),
+}
+
+ar.bind(LatencyReport, object_schema=REPORT_SCHEMA)
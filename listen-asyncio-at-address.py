@@ -0,0 +1,124 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A network service written with asyncio.
+
+The coroutine equivalent of listen-at-address.py, using the adapter
+in asyncio_adapter.py. Each accepted connection is served by a
+coroutine of its own, answering Hello and HelloBatch in either
+encoding. Clients such as connect-to-address.py and
+connect-pipelined-to-address.py work unchanged.
+
+Termination is by user intervention, i.e. control-c.
+'''
+import asyncio
+import ansar.connect as ar
+from hello_welcome import *
+from compact_codec import *
+from welcome_cache import *
+from asyncio_adapter import *
+
+# One client. Respond until the connection is closed.
+async def serve(self, c, cache, console_log):
+	if console_log:
+		self.console(f'Accepted {c.opened_ipp}')			# Acquired a client.
+	async for m in c:
+		compact = isinstance(m, ar.Blob)
+		if compact:						# Request in compact encoding.
+			m = compact_request(m.block)
+			if isinstance(m, ar.Faulted):
+				c.send(m)
+				await c.drain()
+				continue
+
+		if isinstance(m, CodecOffer):	# Client prefers another encoding.
+			c.send(select_codec(m))
+		elif isinstance(m, HelloBatch):
+			batch = WelcomeBatch(welcomes=[cache.welcome(h) for h in m.hellos])
+			c.send(HELLO_CODEC.blob(batch) if compact else batch)
+		elif isinstance(m, Hello):
+			c.send(cache.blob(m) if compact else cache.welcome(m))
+		else:
+			continue
+		await c.drain()
+	c.close()
+	if isinstance(c.closed, ar.Faulted):
+		self.warning(f'Dropped {c.opened_ipp} ({c.closed})')	# Broken framing.
+	elif console_log:
+		self.console(f'Closed/Abandoned {c.opened_ipp}')	# Lost a client.
+
+async def accept_and_serve(self, settings):
+	ipp = ar.HostPort(settings.host, settings.port)
+	listener = await listen(ipp)
+	if isinstance(listener, ar.NotListening):
+		return listener
+
+	cache = WelcomeCache(settings.server_name, settings.welcome_cache)
+	serving = set()
+
+	async def accepting():
+		async for c in listener:
+			t = asyncio.ensure_future(serve(self, c, cache, settings.console_log))
+			serving.add(t)
+			t.add_done_callback(serving.discard)
+
+	# Serve until user intervention.
+	a = asyncio.ensure_future(accepting())
+	await stopped(self)
+	listener.close()
+	a.cancel()
+	for t in list(serving):
+		t.cancel()
+	await asyncio.gather(a, *serving, return_exceptions=True)
+	return ar.Aborted()
+
+# The server object.
+def listen_at_address(self, settings):
+	return asyncio.run(accept_and_serve(self, settings))
+
+ar.bind(listen_at_address)
+
+# Configuration for this executable.
+class Settings(object):
+	def __init__(self, server_name=None, host=None, port=None, console_log=False, welcome_cache=0):
+		self.server_name = server_name
+		self.host = host
+		self.port = port
+		self.console_log = console_log
+		self.welcome_cache = welcome_cache
+
+SETTINGS_SCHEMA = {
+	'server_name': ar.Unicode(),
+	'host': ar.Unicode(),
+	'port': ar.Integer8(),
+	'console_log': ar.Boolean(),		# Log every connection.
+	'welcome_cache': ar.Integer8(),		# Client names to remember, or zero.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(server_name='Buster', host='127.0.0.1', port=32011,
+	console_log=False, welcome_cache=0)
+
+if __name__ == '__main__':
+	ar.create_object(listen_at_address, factory_settings=factory_settings)
@@ -25,15 +25,82 @@
 Listen for inbound connections at a configured address. Established
 clients are expected to send a Hello, wait for a Welcome and then close
 the connection. Termination is by user intervention, i.e. control-c.
+
+Optionally, responses are drawn from a WelcomeCache. Where there is
+real work to be done for each request (simulated by work_rounds), it
+can be offloaded to a pool of threads or processes, keeping the loop
+free for other connections.
+
+Inbound connections are subject to admission control. Connections
+beyond the configured limits are sent a Rejected and closed.
+
+A Hello sampled for tracing by the client is recorded in the trace
+file, if configured. Events are written at termination.
+
+Clients may also stream large payloads, e.g. stream-to-address. These
+are written to the stream directory or, where not configured, counted
+and discarded.
+
+Where a drain period is configured, the first control-c stops the listen
+and the existing connections are closed gradually, over that period.
+A second control-c terminates immediately. Without a drain period,
+control-c terminates at once. For a restart without a gap in accepting,
+run the current server with a drain period and the replacement with the
+same port sharing and the process id of the current server, i.e.
+--drain-seconds, --reuse-port and --replace-pid.
+
+With a record file configured, all traffic is appended to that file,
+e.g. for replay-to-address.
+
+With broadcast_enabled, any client may send a Broadcast of a Notice,
+e.g. broadcast-to-address. The Notice is encoded once and sent to
+every other connected client. Clients with more than
+broadcast_outbound_bytes waiting are skipped or dropped, as per
+broadcast_slow.
 '''
+import os
+import time
+import signal
 import ansar.connect as ar
 from hello_welcome import *
+from server_metrics import *
+from admission import *
+from compact_codec import *
+from welcome_cache import *
+from offload import *
+from tracing import *
+from streaming import *
+from block_framing import *
+from reuse_port import *
+from drain import *
+from local_socket import *
+from recording import *
+from many_connections import *
+from broadcast import *
 
 # The server object.
 def listen_at_address(self, settings):
 	server_name = settings.server_name
 
-	# Establish the listen.
+	# Check the settings before listening. A replacement that
+	# cannot run must not drain the instance it replaces.
+	if settings.offload and settings.offload not in POOL:
+		return ar.Faulted(f'unknown offload "{settings.offload}"', f'expecting one of {", ".join(POOL.keys())}')
+	if settings.broadcast_slow not in SLOW_POLICIES:
+		return ar.Faulted(f'unknown broadcast_slow "{settings.broadcast_slow}"', f'expecting one of {", ".join(SLOW_POLICIES)}')
+	if settings.drain_seconds < 0.0:
+		return ar.Faulted('negative drain_seconds', f'{settings.drain_seconds}')
+
+	# Establish the listen. Optionally sharing the port
+	# with another instance, e.g. during a restart. A path
+	# as the host is a local socket.
+	enable_block_framing()
+	enable_local_sockets()
+	enable_many_connections()
+	if settings.record_file:
+		enable_recording(settings.record_file)
+	if settings.reuse_port and not enable_reuse_port():
+		return ar.Faulted('cannot share the listening port', 'SO_REUSEPORT not available')
 	ipp = ar.HostPort(settings.host, settings.port)
 	ar.listen(self, ipp)
 
@@ -46,51 +113,260 @@ def listen_at_address(self, settings):
 		return m
 	elif isinstance(m, ar.Stop):
 		return ar.Aborted()
+	listening = m
+
+	# Accepting alongside the previous instance. Tell it to drain.
+	if settings.replace_pid:
+		try:
+			os.kill(settings.replace_pid, signal.SIGINT)
+		except OSError as e:
+			self.warning(f'Cannot replace process {settings.replace_pid} ({e})')
 
 	# At this point can expect;
 	# 1. Inbound connections,
 	# 2. Requests from existing clients,
-	# 3. Loss of connections,
-	# 4. User intervention.
+	# 3. Requests for metrics,
+	# 4. Loss of connections,
+	# 5. User intervention,
+	# 6. Progress of a drain.
+	metrics = ServerMetrics()
+	broadcaster = Broadcaster(settings.broadcast_outbound_bytes, settings.broadcast_slow)
+	admission = AdmissionControl(max_connections=settings.max_connections,
+		accept_rate=settings.accept_rate, accept_burst=settings.accept_burst,
+		per_ip=settings.per_ip)
+	cache = WelcomeCache(server_name, settings.welcome_cache)
+	tracer = Tracer(settings.trace_file)
+	streams = StreamReceiver(settings.stream_directory)
+	work_rounds = settings.work_rounds
+	offload = None
+	if settings.offload:
+		offload = Offload(settings.offload, settings.pool_size, settings.max_pending, server_name, work_rounds)
+	console_log = settings.console_log
+	drain = None
+
+	# Clear the records of a connection, whether
+	# lost or dropped by the server. Return true if
+	# it was still admitted.
+	def forget(remote_address):
+		streams.lost(remote_address)
+		if drain:
+			drain.lost(remote_address)
+		if not admission.release(remote_address):
+			return False
+		metrics.close(remote_address)
+		return True
+
 	while True:
-		m = self.select(ar.Accepted, Hello, ar.Closed, ar.Abandoned, ar.Stop)
+		m = self.select(ar.Accepted, Hello, HelloBatch, ar.Blob, CodecOffer, GetMetrics, Broadcast, ar.Completed,
+			StreamOpen, StreamEnd, ar.Closed, ar.Abandoned, ar.NotListening, ar.T2, ar.Stop)
+		received = time.monotonic()
+		if drain:
+			drain.touch(self.return_address)
+		compact = isinstance(m, ar.Blob)
+		if compact:
+			if streams.receiving(self.return_address):	# Chunk of a stream.
+				r = streams.chunk(self.return_address, m.block)
+				if r:
+					self.reply(r)
+				continue
+			m = compact_request(m.block)		# Request in compact encoding.
+			if isinstance(m, ar.Faulted):			# Malformed. Leave the connection.
+				self.reply(m)
+				continue
+
 		if isinstance(m, ar.Accepted):
-			self.console(f'Accepted {m.accepted_ipp}')			# Acquired a client.
+			rejected = admission.admit(m.remote_address, m.accepted_ipp)
+			if rejected:							# Shed the connection.
+				self.send(rejected, m.remote_address)
+				self.send(ar.Close(), m.remote_address)
+				metrics.reject()
+				if console_log:
+					self.console(f'Rejected {m.accepted_ipp} ({rejected.reason})')
+				continue
+			metrics.accept(m.remote_address, m.accepted_ipp)
+			broadcaster.add(m)
+			if drain:
+				drain.add(m.remote_address)
+			if console_log:
+				self.console(f'Accepted {m.accepted_ipp}')			# Acquired a client.
 			continue
 		elif isinstance(m, (ar.Closed, ar.Abandoned)):
-			self.console(f'Closed/Abandoned {m.opened_ipp}')	# Lost a client.
+			if not forget(self.return_address):
+				continue							# Shed earlier.
+			broadcaster.lost(self.return_address)
+			if console_log:
+				self.console(f'Closed/Abandoned {m.opened_ipp}')	# Lost a client.
+			continue
+		elif isinstance(m, ar.Stop) and not drain and settings.drain_seconds:
+			# Control-c. No more connections and
+			# gradual close of the existing.
+			ar.stop_listen(self, listening.listening_ipp)
+			drain = Drain(metrics.connection.keys(), settings.drain_seconds)
+			self.start(ar.T2, DRAIN_TICK, repeating=True)
+			self.console(f'Draining {drain.total} connections over {settings.drain_seconds:.1f}s')
+			continue
+		elif isinstance(m, ar.T2):
+			for a in drain.due():
+				self.send(ar.Close(), a)
+			idle = offload is None or offload.in_flight == 0
+			if not (drain.done() and idle) and not drain.expired():
+				continue
+			if offload:
+				offload.shutdown()
+			tracer.store()
+			return ar.Aborted()
+		elif isinstance(m, ar.NotListening):	# Confirmation of the drain.
 			continue
 		elif isinstance(m, ar.Stop):	# Control-c.
+			if offload:
+				offload.shutdown()
+			tracer.store()
 			return ar.Aborted()			# Terminate this process.
+		elif isinstance(m, StreamOpen):		# Start of a large payload.
+			self.reply(streams.open(m, self.return_address))
+			continue
+		elif isinstance(m, StreamEnd):
+			r = streams.end(m, self.return_address)
+			self.reply(r)
+			if console_log:
+				self.console(f'Stream - {r}')
+			continue
+		elif isinstance(m, CodecOffer):	# Client prefers another encoding.
+			self.reply(select_codec(m))
+			continue
+		elif isinstance(m, GetMetrics):
+			self.reply(metrics.snapshot(queue_depth(self), m.connections, cache))
+			continue
+		elif isinstance(m, Broadcast):	# Pass to everyone else.
+			if not settings.broadcast_enabled:
+				self.reply(ar.Faulted('cannot broadcast', 'not enabled on this server'))
+				continue
+			proxy = self.return_address[-1]		# Connection of the sender.
+			try:
+				r = broadcaster.send(self, m.value, select=None if m.include_sender else lambda a, ipp: a[-1] != proxy,
+					dropped=forget)
+			except ValueError as e:
+				r = ar.Faulted('cannot broadcast', str(e))
+			self.reply(r)
+			if console_log:
+				self.console(f'Broadcast - {r}')
+			continue
+		elif offload and isinstance(m, (Hello, HelloBatch)):
+			# Pass to the pool, remembering where
+			# the response should go.
+			busy = offload.submit(self, m, (self.return_address, compact, received))
+			if busy:
+				self.reply(busy)
+			continue
+		elif isinstance(m, ar.Completed):	# Offloaded response.
+			if offload is None:
+				self.warning(f'Unexpected completion - {m.value}')
+				continue
+			return_address, compact, received = offload.completed(self)
+			r = m.value
+			if isinstance(r, (Welcome, WelcomeBatch)):
+				self.send(HELLO_CODEC.blob(r) if compact else r, return_address)
+				count = len(r.welcomes) if isinstance(r, WelcomeBatch) else 1
+				metrics.hello(return_address, queue_depth(self), time.monotonic() - received, count)
+			else:							# Failed or aborted. Tell the client.
+				self.send(r, return_address)
+				self.warning(f'Offloaded request - {r}')
+			continue
+		elif work_rounds:
+			r = welcome_work(server_name, m, work_rounds)	# Work inline.
+			self.reply(HELLO_CODEC.blob(r) if compact else r)
+			count = len(r.welcomes) if isinstance(r, WelcomeBatch) else 1
+			metrics.hello(self.return_address, queue_depth(self), time.monotonic() - received, count)
+			continue
+		elif isinstance(m, HelloBatch):	# Many greetings, one response.
+			welcomes = [cache.welcome(h) for h in m.hellos]
+			batch = WelcomeBatch(welcomes=welcomes)
+			self.reply(HELLO_CODEC.blob(batch) if compact else batch)
+			metrics.hello(self.return_address, queue_depth(self), time.monotonic() - received, len(welcomes))
+			continue
+		elif not isinstance(m, Hello):
+			continue
 
 		# Must have been the initial greeting.
 		hello = m
 
 		# Provide the expected response.
-		welcome = Welcome(your_name=hello.my_name, my_name=server_name)
-		self.reply(welcome)
+		self.reply(cache.blob(hello) if compact else cache.encoded(hello))
+		depth = queue_depth(self)
+		metrics.hello(self.return_address, depth, time.monotonic() - received)
+		if hello.trace_id:
+			tracer.flow(hello.trace_id, received, False)
+			tracer.span('dispatch', hello.trace_id, received, queued=depth)
 
-		self.console(f'At server - {welcome}')
+		if console_log:
+			self.console(f'At server - Hello "{hello.my_name}", my name is "{server_name}"')
 
 ar.bind(listen_at_address)
 
 # Configuration for this executable.
 class Settings(object):
-	def __init__(self, server_name=None, host=None, port=None):
+	def __init__(self, server_name=None, host=None, port=None, console_log=True,
+			max_connections=0, accept_rate=0.0, accept_burst=0, per_ip=0, welcome_cache=0,
+			work_rounds=0, offload='', pool_size=0, max_pending=0, trace_file='', stream_directory='',
+			reuse_port=False, drain_seconds=0.0, replace_pid=0, record_file='',
+			broadcast_enabled=False, broadcast_outbound_bytes=0, broadcast_slow=''):
 		self.server_name = server_name
 		self.host = host
 		self.port = port
+		self.console_log = console_log
+		self.max_connections = max_connections
+		self.accept_rate = accept_rate
+		self.accept_burst = accept_burst
+		self.per_ip = per_ip
+		self.welcome_cache = welcome_cache
+		self.work_rounds = work_rounds
+		self.offload = offload
+		self.pool_size = pool_size
+		self.max_pending = max_pending
+		self.trace_file = trace_file
+		self.stream_directory = stream_directory
+		self.reuse_port = reuse_port
+		self.drain_seconds = drain_seconds
+		self.replace_pid = replace_pid
+		self.record_file = record_file
+		self.broadcast_enabled = broadcast_enabled
+		self.broadcast_outbound_bytes = broadcast_outbound_bytes
+		self.broadcast_slow = broadcast_slow
 
 SETTINGS_SCHEMA = {
 	'server_name': ar.Unicode(),
 	'host': ar.Unicode(),
 	'port': ar.Integer8(),
+	'console_log': ar.Boolean(),	# Log every connection and message.
+	'max_connections': ar.Integer8(),	# Concurrent connections, or zero.
+	'accept_rate': ar.Float8(),			# Connections per second, or zero.
+	'accept_burst': ar.Integer8(),		# Size of the token bucket, or zero for one second of rate.
+	'per_ip': ar.Integer8(),			# Concurrent connections from one IP, or zero.
+	'welcome_cache': ar.Integer8(),		# Client names to remember, or zero.
+	'work_rounds': ar.Integer8(),		# Simulated work per Hello, in hashes.
+	'offload': ar.Unicode(),			# Empty, thread or process.
+	'pool_size': ar.Integer8(),			# Requests in progress.
+	'max_pending': ar.Integer8(),		# Requests waiting, before Busy.
+	'trace_file': ar.Unicode(),			# Chrome trace output, or empty.
+	'stream_directory': ar.Unicode(),	# Where to put streamed payloads, or empty.
+	'reuse_port': ar.Boolean(),			# Share the port, e.g. during a restart.
+	'drain_seconds': ar.Float8(),		# Gradual close on control-c, or zero.
+	'replace_pid': ar.Integer8(),		# Process to drain once listening, or zero.
+	'record_file': ar.Unicode(),		# Traffic capture, or empty.
+	'broadcast_enabled': ar.Boolean(),	# Clients may send a Broadcast.
+	'broadcast_outbound_bytes': ar.Integer8(),	# Backlog of a slow receiver, or zero.
+	'broadcast_slow': ar.Unicode(),		# Slow receivers are skipped or dropped.
 }
 
 ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
 
 # Initial values.
-factory_settings = Settings(server_name='Buster', host='127.0.0.1', port=32011)
+factory_settings = Settings(server_name='Buster', host='127.0.0.1', port=32011, console_log=True,
+	max_connections=0, accept_rate=0.0, accept_burst=0, per_ip=0, welcome_cache=0,
+	work_rounds=0, offload='', pool_size=os.cpu_count() or 1, max_pending=1024,
+	trace_file='', stream_directory='',
+	reuse_port=False, drain_seconds=0.0, replace_pid=0, record_file='',
+	broadcast_enabled=False, broadcast_outbound_bytes=262144, broadcast_slow=SKIP_SLOW)
 
 if __name__ == '__main__':
 	ar.create_object(listen_at_address, factory_settings=factory_settings)
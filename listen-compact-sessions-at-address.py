@@ -0,0 +1,231 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A session-based async, network service for many idle connections.
+
+A variant of listen-sessions-at-address with sessions implemented as
+machines, rather than functions with a thread each. A plug-in
+replacement for listen-at-address or listen-fsm-at-address.
+
+Sessions are closed by the server if the first Hello does not arrive
+within read_seconds, or if a client is silent for idle_seconds. A client
+that is not reading its Welcomes, i.e. the outbound backlog exceeds
+max_outbound_bytes, is also dropped. Idle clients do not accumulate.
+
+Sessions share a single thread and one WelcomeCache, so that a large
+number of idle clients can be held by the one process, e.g.
+benchmark-connections. The process also lifts the limits of the
+library on the number of connections.
+
+With multiplex enabled, each connection carries many sessions, e.g.
+from connect-multiplexed-to-address, and each stream has a session of
+its own.
+'''
+import time
+import ansar.connect as ar
+from hello_welcome import *
+from reuse_port import *
+from outbound import *
+from compact_codec import *
+from welcome_cache import *
+from multiplex import *
+from local_socket import *
+from many_connections import *
+from compiled_dispatch import *
+
+# Check the outbound backlog after this many replies.
+CHECK_OUTBOUND = 16
+
+class INITIAL: pass
+class SERVING: pass
+
+# Session object. Sessions are machines sharing a single thread,
+# i.e. an idle connection costs an object and a timer rather than
+# a thread of its own. The WelcomeCache is shared by every session.
+class AcceptedAtAddress(ar.Point, CompiledStateMachine):
+	def __init__(self, cache, read_seconds, idle_seconds, max_outbound_bytes, remote_address=None, **kv):
+		ar.Point.__init__(self)
+		CompiledStateMachine.__init__(self, INITIAL)
+		self.cache = cache
+		self.idle_seconds = idle_seconds
+		self.max_outbound_bytes = max_outbound_bytes
+		self.remote_address = remote_address
+		self.seconds = read_seconds		# Until the first request.
+		self.active = time.monotonic()
+		self.timing = False
+		self.replies = 0
+
+	# The timer is not restarted on every request. Expiry
+	# checks the time of the latest activity instead.
+	def timed(self):
+		if self.seconds and not self.timing:
+			self.start(ar.T1, max(0.25, self.seconds))
+			self.timing = True
+
+	def served(self, replies):
+		self.active = time.monotonic()
+		self.seconds = self.idle_seconds
+		self.timed()
+
+		# Slow consumer.
+		self.replies += replies
+		if self.max_outbound_bytes and self.replies >= CHECK_OUTBOUND:
+			self.replies = 0
+			n = outbound_bytes(self.remote_address)
+			if n is not None and n > self.max_outbound_bytes:
+				self.warning(f'Session dropped with {n} bytes outbound')
+				self.complete(ar.Faulted('slow consumer', f'{n} bytes outbound exceeds limit of {self.max_outbound_bytes}'))
+		return SERVING
+
+def AcceptedAtAddress_INITIAL_Start(self, message):
+	self.timed()
+	return SERVING
+
+def AcceptedAtAddress_SERVING_Hello(self, message, compact=False):
+	self.reply(self.cache.blob(message) if compact else self.cache.encoded(message))
+	return self.served(1)
+
+def AcceptedAtAddress_SERVING_HelloBatch(self, message, compact=False):
+	welcomes = [self.cache.welcome(h) for h in message.hellos]
+	batch = WelcomeBatch(welcomes=welcomes)
+	self.reply(HELLO_CODEC.blob(batch) if compact else batch)
+	return self.served(CHECK_OUTBOUND)
+
+def AcceptedAtAddress_SERVING_Blob(self, message):
+	m = compact_request(message.block)
+	if isinstance(m, ar.Faulted):
+		self.reply(m)
+		return self.served(0)
+	elif isinstance(m, HelloBatch):
+		return AcceptedAtAddress_SERVING_HelloBatch(self, m, compact=True)
+	return AcceptedAtAddress_SERVING_Hello(self, m, compact=True)
+
+def AcceptedAtAddress_SERVING_CodecOffer(self, message):
+	self.reply(select_codec(message))
+	return self.served(0)
+
+def AcceptedAtAddress_SERVING_T1(self, message):		# Idle or half-open.
+	self.timing = False
+	if not self.seconds:
+		return SERVING
+	remaining = self.active + self.seconds - time.monotonic()
+	if remaining > 0.0:
+		self.start(ar.T1, max(0.25, remaining))
+		self.timing = True
+		return SERVING
+	self.warning(f'Session timed out after {self.seconds} seconds')
+	self.complete(ar.TimedOut(message))
+
+def AcceptedAtAddress_SERVING_Stop(self, message):
+	self.complete(ar.Aborted())
+
+ACCEPTED_AT_ADDRESS_DISPATCH = {
+	INITIAL: (
+		(ar.Start,), ()
+	),
+	SERVING: (
+		(Hello, HelloBatch, ar.Blob, CodecOffer, ar.T1, ar.Stop), ()
+	),
+}
+
+ar.bind(AcceptedAtAddress, ACCEPTED_AT_ADDRESS_DISPATCH, thread='accepted-sessions')
+compile_dispatch(AcceptedAtAddress)
+
+# Server object.
+def listen_at_address(self, settings):
+	server_name = settings.server_name
+
+	# Establish the listen. Optionally sharing the port
+	# with other instances, e.g. listen-workers-at-address.
+	if settings.reuse_port and not enable_reuse_port():
+		return ar.Faulted('cannot share the listening port', 'SO_REUSEPORT not available')
+	enable_local_sockets()		# A path as host.
+	enable_many_connections()	# Beyond 1024 connections.
+
+	ipp = ar.HostPort(settings.host, settings.port)
+	cache = WelcomeCache(server_name, settings.welcome_cache)
+	session = ar.CreateFrame(AcceptedAtAddress, cache,
+		settings.read_seconds, settings.idle_seconds, settings.max_outbound_bytes)
+	if settings.multiplex:
+		session = ar.CreateFrame(mux_session, session)
+	ar.listen(self, ipp, session=session)
+	m = self.select(ar.Listening, ar.NotListening, ar.Stop)
+	if isinstance(m, ar.NotListening):
+		return m
+	elif isinstance(m, ar.Stop):
+		return ar.Aborted()
+
+	# Ready for inbound connections.
+	while True:
+		m = self.select(ar.Accepted, ar.Abandoned, ar.Stop)
+		if isinstance(m, ar.Accepted):
+			if settings.console_log:
+				self.console(f'Accepted at {m.accepted_ipp}')
+			continue
+		elif isinstance(m, ar.Abandoned):
+			if settings.console_log:
+				self.console(f'Abandoned')
+			continue
+		elif isinstance(m, ar.Stop):	# Control-c.
+			return ar.Aborted()
+
+ar.bind(listen_at_address)
+
+# Configuration for this executable.
+class Settings(object):
+	def __init__(self, server_name=None, host=None, port=None, console_log=True, reuse_port=False,
+			read_seconds=None, idle_seconds=None, max_outbound_bytes=None, welcome_cache=None,
+			multiplex=False):
+		self.server_name = server_name
+		self.host = host
+		self.port = port
+		self.console_log = console_log
+		self.reuse_port = reuse_port
+		self.read_seconds = read_seconds
+		self.idle_seconds = idle_seconds
+		self.max_outbound_bytes = max_outbound_bytes
+		self.welcome_cache = welcome_cache
+		self.multiplex = multiplex
+
+SETTINGS_SCHEMA = {
+	'server_name': str,
+	'host': str,
+	'port': int,
+	'console_log': bool,			# Log every connection.
+	'reuse_port': bool,
+	'read_seconds': float,			# Wait for first request, or zero.
+	'idle_seconds': float,			# Wait between requests, or zero.
+	'max_outbound_bytes': int,		# Backlog to a slow consumer, or zero.
+	'welcome_cache': int,			# Client names to remember, shared by sessions, or zero.
+	'multiplex': bool,				# Many sessions per connection.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(server_name='Buster', host='127.0.0.1', port=32011, console_log=True, reuse_port=False,
+	read_seconds=10.0, idle_seconds=60.0, max_outbound_bytes=262144, welcome_cache=0,
+	multiplex=False)
+
+# Entry point.
+if __name__ == '__main__':
+	ar.create_object(listen_at_address, factory_settings=factory_settings)
@@ -24,32 +24,70 @@
 
 A finite-state-machine implementation of the Enquiry-Ack sessions. A plug-in
 replacement for listen-at-address or listen-session-at-address.
+
+A Hello sampled for tracing by the client is recorded in the trace
+file, if configured.
+
+Stop can start a drain and a replacement process can take over the
+listening port, as for listen-at-address.
 '''
+import os
+import time
+import signal
 import ansar.connect as ar
 from hello_welcome import *
+from server_metrics import *
+from compact_codec import *
+from welcome_cache import *
+from tracing import *
+from compiled_dispatch import *
+from reuse_port import *
+from drain import *
+from local_socket import *
+from many_connections import *
 
 
 # Server FSM object.
 class INITIAL: pass
 class PENDING: pass
 class LISTENING: pass
+class DRAINING: pass
 
-class ListenAtAddress(ar.Point, ar.StateMachine):
+class ListenAtAddress(ar.Point, CompiledStateMachine):
 	def __init__(self, settings):
 		ar.Point.__init__(self)
-		ar.StateMachine.__init__(self, INITIAL)
+		CompiledStateMachine.__init__(self, INITIAL)
 		self.settings = settings
 		self.server_name = settings.server_name
+		self.console_log = settings.console_log
 		self.ipp = None
 		self.listening = None
+		self.metrics = ServerMetrics()
+		self.cache = WelcomeCache(settings.server_name, settings.welcome_cache)
+		self.tracer = Tracer(settings.trace_file)
+		self.drain = None
 
 def ListenAtAddress_INITIAL_Start(self, message):
+	# Check the settings before listening. A replacement that
+	# cannot run must not drain the instance it replaces.
+	if self.settings.drain_seconds < 0.0:
+		self.complete(ar.Faulted('negative drain_seconds', f'{self.settings.drain_seconds}'))
+	if self.settings.reuse_port and not enable_reuse_port():
+		self.complete(ar.Faulted('cannot share the listening port', 'SO_REUSEPORT not available'))
+	enable_local_sockets()		# A path as host.
+	enable_many_connections()	# Beyond 1024 connections.
 	self.ipp = ar.HostPort(self.settings.host, self.settings.port)
 	ar.listen(self, self.ipp)
 	return PENDING
 
 def ListenAtAddress_PENDING_Listening(self, message):
 	self.listening = message
+	replace_pid = self.settings.replace_pid
+	if replace_pid:		# Tell the previous instance to drain.
+		try:
+			os.kill(replace_pid, signal.SIGINT)
+		except OSError as e:
+			self.warning(f'Cannot replace process {replace_pid} ({e})')
 	return LISTENING
 
 def ListenAtAddress_PENDING_NotListening(self, message):
@@ -59,19 +97,116 @@ def ListenAtAddress_PENDING_Stop(self, message):
 	self.complete(ar.Aborted())
 
 def ListenAtAddress_LISTENING_Accepted(self, message):
-	self.console(f'Accepted at {message.accepted_ipp}')
+	self.metrics.accept(message.remote_address, message.accepted_ipp)
+	if self.console_log:
+		self.console(f'Accepted at {message.accepted_ipp}')
+	return LISTENING
+
+def ListenAtAddress_LISTENING_Hello(self, message, compact=False):
+	received = time.monotonic()
+	self.reply(self.cache.blob(message) if compact else self.cache.encoded(message))
+	depth = queue_depth(self)
+	self.metrics.hello(self.return_address, depth, time.monotonic() - received)
+	if message.trace_id:
+		self.tracer.flow(message.trace_id, received, False)
+		self.tracer.span('dispatch', message.trace_id, received, queued=depth)
 	return LISTENING
 
-def ListenAtAddress_LISTENING_Hello(self, message):
-	welcome = Welcome(your_name=message.my_name, my_name=self.server_name)
-	self.reply(welcome)
+def ListenAtAddress_LISTENING_HelloBatch(self, message, compact=False):
+	received = time.monotonic()
+	welcomes = [self.cache.welcome(h) for h in message.hellos]
+	batch = WelcomeBatch(welcomes=welcomes)
+	self.reply(HELLO_CODEC.blob(batch) if compact else batch)
+	self.metrics.hello(self.return_address, queue_depth(self), time.monotonic() - received, len(welcomes))
+	return LISTENING
+
+def ListenAtAddress_LISTENING_Blob(self, message):
+	# Request in compact encoding, answered in kind.
+	m = compact_request(message.block)
+	if isinstance(m, ar.Faulted):
+		self.reply(m)
+		return LISTENING
+	elif isinstance(m, HelloBatch):
+		return ListenAtAddress_LISTENING_HelloBatch(self, m, compact=True)
+	return ListenAtAddress_LISTENING_Hello(self, m, compact=True)
+
+def ListenAtAddress_LISTENING_CodecOffer(self, message):
+	self.reply(select_codec(message))
+	return LISTENING
+
+def ListenAtAddress_LISTENING_GetMetrics(self, message):
+	self.reply(self.metrics.snapshot(queue_depth(self), message.connections, self.cache))
 	return LISTENING
 
 def ListenAtAddress_LISTENING_Abandoned(self, message):
-	self.console(f'Abandoned')
+	self.metrics.close(self.return_address)
+	if self.console_log:
+		self.console(f'Abandoned')
 	return LISTENING
 
 def ListenAtAddress_LISTENING_Stop(self, message):
+	drain_seconds = self.settings.drain_seconds
+	if drain_seconds:
+		ar.stop_listen(self, self.listening.listening_ipp)
+		self.drain = Drain(self.metrics.connection.keys(), drain_seconds)
+		self.start(ar.T2, DRAIN_TICK, repeating=True)
+		self.console(f'Draining {self.drain.total} connections over {drain_seconds:.1f}s')
+		return DRAINING
+	self.tracer.store()
+	self.complete(ar.Aborted())
+
+# Existing connections continue until closed.
+def ListenAtAddress_DRAINING_Accepted(self, message):
+	ListenAtAddress_LISTENING_Accepted(self, message)
+	self.drain.add(message.remote_address)
+	return DRAINING
+
+def ListenAtAddress_DRAINING_Hello(self, message):
+	self.drain.touch(self.return_address)
+	ListenAtAddress_LISTENING_Hello(self, message)
+	return DRAINING
+
+def ListenAtAddress_DRAINING_HelloBatch(self, message):
+	self.drain.touch(self.return_address)
+	ListenAtAddress_LISTENING_HelloBatch(self, message)
+	return DRAINING
+
+def ListenAtAddress_DRAINING_Blob(self, message):
+	self.drain.touch(self.return_address)
+	ListenAtAddress_LISTENING_Blob(self, message)
+	return DRAINING
+
+def ListenAtAddress_DRAINING_CodecOffer(self, message):
+	ListenAtAddress_LISTENING_CodecOffer(self, message)
+	return DRAINING
+
+def ListenAtAddress_DRAINING_GetMetrics(self, message):
+	ListenAtAddress_LISTENING_GetMetrics(self, message)
+	return DRAINING
+
+def ListenAtAddress_DRAINING_Closed(self, message):
+	self.metrics.close(self.return_address)
+	self.drain.lost(self.return_address)
+	return DRAINING
+
+def ListenAtAddress_DRAINING_Abandoned(self, message):
+	self.metrics.close(self.return_address)
+	self.drain.lost(self.return_address)
+	return DRAINING
+
+def ListenAtAddress_DRAINING_NotListening(self, message):
+	return DRAINING
+
+def ListenAtAddress_DRAINING_T2(self, message):
+	for a in self.drain.due():
+		self.send(ar.Close(), a)
+	if self.drain.done() or self.drain.expired():
+		self.tracer.store()
+		self.complete(ar.Aborted())
+	return DRAINING
+
+def ListenAtAddress_DRAINING_Stop(self, message):
+	self.tracer.store()
 	self.complete(ar.Aborted())
 
 LISTEN_AT_ADDRESS_DISPATCH = {
@@ -82,29 +217,48 @@ LISTEN_AT_ADDRESS_DISPATCH = {
 		(ar.Listening, ar.NotListening, ar.Stop), ()
 	),
 	LISTENING: (
-		(ar.Accepted, Hello, ar.Abandoned, ar.Stop,), ()
+		(ar.Accepted, Hello, HelloBatch, ar.Blob, CodecOffer, GetMetrics, ar.Abandoned, ar.Stop,), ()
+	),
+	DRAINING: (
+		(ar.Accepted, Hello, HelloBatch, ar.Blob, CodecOffer, GetMetrics, ar.Closed, ar.Abandoned,
+			ar.NotListening, ar.T2, ar.Stop,), ()
 	),
 }
 
 ar.bind(ListenAtAddress, LISTEN_AT_ADDRESS_DISPATCH)
+compile_dispatch(ListenAtAddress)
 
 # Configuration for this executable.
 class Settings(object):
-	def __init__(self, server_name=None, host=None, port=None):
+	def __init__(self, server_name=None, host=None, port=None, console_log=True, welcome_cache=0, trace_file='',
+			reuse_port=False, drain_seconds=0.0, replace_pid=0):
 		self.server_name = server_name
 		self.host = host
 		self.port = port
+		self.console_log = console_log
+		self.welcome_cache = welcome_cache
+		self.trace_file = trace_file
+		self.reuse_port = reuse_port
+		self.drain_seconds = drain_seconds
+		self.replace_pid = replace_pid
 
 SETTINGS_SCHEMA = {
 	'server_name': ar.Unicode(),
 	'host': ar.Unicode(),
 	'port': ar.Integer8(),
+	'console_log': ar.Boolean(),	# Log every connection.
+	'welcome_cache': ar.Integer8(),	# Client names to remember, or zero.
+	'trace_file': ar.Unicode(),		# Chrome trace output, or empty.
+	'reuse_port': ar.Boolean(),		# Share the port, e.g. during a restart.
+	'drain_seconds': ar.Float8(),	# Gradual close on Stop, or zero.
+	'replace_pid': ar.Integer8(),	# Process to drain once listening, or zero.
 }
 
 ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
 
 # Initial values.
-factory_settings = Settings(server_name='Buster', host='127.0.0.1', port=32011)
+factory_settings = Settings(server_name='Buster', host='127.0.0.1', port=32011, console_log=True, welcome_cache=0,
+	trace_file='', reuse_port=False, drain_seconds=0.0, replace_pid=0)
 
 # Entry point.
 if __name__ == '__main__':
@@ -24,19 +24,66 @@
 
 A session-based implementation of the Enquiry-Ack sessions. A plug-in
 replacement for listen-at-address or listen-fsm-at-address.
+
+Sessions are closed by the server if the first Hello does not arrive
+within read_seconds, or if a client is silent for idle_seconds. A client
+that is not reading its Welcomes, i.e. the outbound backlog exceeds
+max_outbound_bytes, is also dropped. Idle clients do not accumulate.
+
+With multiplex enabled, each connection carries many sessions, e.g.
+from connect-multiplexed-to-address, and each stream has a session of
+its own.
 '''
 import ansar.connect as ar
 from hello_welcome import *
+from reuse_port import *
+from outbound import *
+from compact_codec import *
+from welcome_cache import *
+from multiplex import *
+from local_socket import *
+
+# Check the outbound backlog after this many replies.
+CHECK_OUTBOUND = 16
 
 # Session object.
-def accepted_at_address(self, server_name, **kv):
+def accepted_at_address(self, server_name, read_seconds, idle_seconds, max_outbound_bytes, welcome_cache, remote_address=None, **kv):
+	cache = WelcomeCache(server_name, welcome_cache)
+	seconds = read_seconds or None		# Until the first request.
+	replies = 0
 	while True:
-		m = self.select(Hello, ar.Stop)
+		m = self.select(Hello, HelloBatch, ar.Blob, CodecOffer, ar.Stop, seconds=seconds)
+		compact = isinstance(m, ar.Blob)
+		if compact:
+			m = compact_request(m.block)
+			if isinstance(m, ar.Faulted):		# Malformed. Leave the connection.
+				self.reply(m)
+				continue
+
 		if isinstance(m, Hello):
-			welcome = Welcome(your_name=m.my_name, my_name=server_name)
-			self.reply(welcome)
+			self.reply(cache.blob(m) if compact else cache.encoded(m))
+			replies += 1
+		elif isinstance(m, HelloBatch):
+			welcomes = [cache.welcome(h) for h in m.hellos]
+			batch = WelcomeBatch(welcomes=welcomes)
+			self.reply(HELLO_CODEC.blob(batch) if compact else batch)
+			replies += CHECK_OUTBOUND
+		elif isinstance(m, CodecOffer):
+			self.reply(select_codec(m))
 		elif isinstance(m, ar.Stop):
 			return ar.Aborted()
+		elif isinstance(m, ar.SelectTimer):		# Idle or half-open.
+			self.warning(f'Session timed out after {seconds} seconds')
+			return ar.TimedOut(m)
+		seconds = idle_seconds or None
+
+		# Slow consumer.
+		if max_outbound_bytes and replies >= CHECK_OUTBOUND:
+			replies = 0
+			n = outbound_bytes(remote_address)
+			if n is not None and n > max_outbound_bytes:
+				self.warning(f'Session dropped with {n} bytes outbound')
+				return ar.Faulted('slow consumer', f'{n} bytes outbound exceeds limit of {max_outbound_bytes}')
 
 ar.bind(accepted_at_address)
 
@@ -44,9 +91,17 @@ ar.bind(accepted_at_address)
 def listen_at_address(self, settings):
 	server_name = settings.server_name
 
-	# Establish the listen.
+	# Establish the listen. Optionally sharing the port
+	# with other instances, e.g. listen-workers-at-address.
+	if settings.reuse_port and not enable_reuse_port():
+		return ar.Faulted('cannot share the listening port', 'SO_REUSEPORT not available')
+	enable_local_sockets()		# A path as host.
+
 	ipp = ar.HostPort(settings.host, settings.port)
-	session = ar.CreateFrame(accepted_at_address, server_name)
+	session = ar.CreateFrame(accepted_at_address, server_name,
+		settings.read_seconds, settings.idle_seconds, settings.max_outbound_bytes, settings.welcome_cache)
+	if settings.multiplex:
+		session = ar.CreateFrame(mux_session, session)
 	ar.listen(self, ipp, session=session)
 	m = self.select(ar.Listening, ar.NotListening, ar.Stop)
 	if isinstance(m, ar.NotListening):
@@ -58,10 +113,12 @@ def listen_at_address(self, settings):
 	while True:
 		m = self.select(ar.Accepted, ar.Abandoned, ar.Stop)
 		if isinstance(m, ar.Accepted):
-			self.console(f'Accepted at {m.accepted_ipp}')
+			if settings.console_log:
+				self.console(f'Accepted at {m.accepted_ipp}')
 			continue
 		elif isinstance(m, ar.Abandoned):
-			self.console(f'Abandoned')
+			if settings.console_log:
+				self.console(f'Abandoned')
 			continue
 		elif isinstance(m, ar.Stop):	# Control-c.
 			return ar.Aborted()
@@ -70,21 +127,39 @@ ar.bind(listen_at_address)
 
 # Configuration for this executable.
 class Settings(object):
-	def __init__(self, server_name=None, host=None, port=None):
+	def __init__(self, server_name=None, host=None, port=None, console_log=True, reuse_port=False,
+			read_seconds=None, idle_seconds=None, max_outbound_bytes=None, welcome_cache=None,
+			multiplex=False):
 		self.server_name = server_name
 		self.host = host
 		self.port = port
+		self.console_log = console_log
+		self.reuse_port = reuse_port
+		self.read_seconds = read_seconds
+		self.idle_seconds = idle_seconds
+		self.max_outbound_bytes = max_outbound_bytes
+		self.welcome_cache = welcome_cache
+		self.multiplex = multiplex
 
 SETTINGS_SCHEMA = {
 	'server_name': str,
 	'host': str,
 	'port': int,
+	'console_log': bool,			# Log every connection.
+	'reuse_port': bool,
+	'read_seconds': float,			# Wait for first request, or zero.
+	'idle_seconds': float,			# Wait between requests, or zero.
+	'max_outbound_bytes': int,		# Backlog to a slow consumer, or zero.
+	'welcome_cache': int,			# Client names to remember per session, or zero.
+	'multiplex': bool,				# Many sessions per connection.
 }
 
 ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
 
 # Initial values.
-factory_settings = Settings(server_name='Buster', host='127.0.0.1', port=32011)
+factory_settings = Settings(server_name='Buster', host='127.0.0.1', port=32011, console_log=True, reuse_port=False,
+	read_seconds=10.0, idle_seconds=60.0, max_outbound_bytes=262144, welcome_cache=0,
+	multiplex=False)
 
 # Entry point.
 if __name__ == '__main__':
@@ -0,0 +1,220 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A multi-process network service.
+
+Starts a number of listen-sessions-at-address processes, all listening
+at the same address with port reuse enabled. The kernel balances the
+inbound connections across the workers, spreading the Hello-Welcome
+load over multiple cores. A worker that terminates while the service
+is running is restarted, after a backoff delay that grows while the
+worker keeps failing. More than max_restarts within the restart window
+brings the service down. Termination is by user intervention, at which
+point every worker is stopped and the results are summarized.
+'''
+import os
+import sys
+import time
+import signal
+import subprocess
+from collections import deque
+import ansar.connect as ar
+from reconnect_backoff import decorrelated_jitter
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'listen-sessions-at-address.py')
+
+# Wait for termination of a worker process. Runs
+# in a thread of its own.
+def wait_for_worker(self, p):
+	out, err = p.communicate()
+	return p.returncode, out
+
+ar.bind(wait_for_worker)
+
+# Hold the restart of a worker.
+def restart_delay(self, seconds):
+	m = self.select(ar.Stop, seconds=seconds)
+	if isinstance(m, ar.Stop):
+		return ar.Aborted()
+	return None
+
+ar.bind(restart_delay)
+
+def worker_output(out):
+	'''Recover the value returned by a worker, or None.'''
+	if not out:
+		return None
+	try:
+		value, v = ar.CodecJson().decode(out, ar.Any())
+	except ar.CodecFailed:
+		return None
+	return value
+
+# Aggregated results.
+class WorkerSummary(object):
+	def __init__(self, workers=0, restarts=0, aborted=0, faulted=0, exit_codes=None):
+		self.workers = workers
+		self.restarts = restarts
+		self.aborted = aborted
+		self.faulted = faulted
+		self.exit_codes = exit_codes or []
+
+	def __str__(self):
+		return (f'{self.workers} workers, {self.restarts} restarts, '
+			f'{self.aborted} aborted, {self.faulted} faulted')
+
+SUMMARY_SCHEMA = {
+	'workers': int,
+	'restarts': int,
+	'aborted': int,
+	'faulted': int,
+	'exit_codes': ar.VectorOf(ar.Integer8()),
+}
+
+ar.bind(WorkerSummary, object_schema=SUMMARY_SCHEMA)
+
+# Server object.
+def listen_at_address(self, settings):
+	workers = max(1, settings.workers)
+
+	command = [sys.executable, WORKER,
+		'--pure-object', '--call-signature=o',
+		f'--server-name={settings.server_name}',
+		f'--host={settings.host}',
+		f'--port={settings.port}',
+		'--reuse-port=true',
+	]
+
+	started = {}		# Worker number to moment of start.
+	backoff = {}		# Worker number to its restart delays.
+
+	def start_worker(number):
+		p = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, encoding='utf-8')
+		a = self.create(wait_for_worker, p)
+		self.assign(a, (number, p))
+		started[number] = time.monotonic()
+		self.console(f'Started worker [{number}] ({p.pid})')
+
+	def stop_workers():
+		for w, a in self.running():
+			if w[1] is None:		# Waiting to restart.
+				self.send(ar.Stop(), a)
+				continue
+			w[1].send_signal(signal.SIGINT)
+
+	for i in range(workers):
+		start_worker(i)
+
+	# Ready for the loss of workers.
+	summary = WorkerSummary(workers=workers)
+	restarted = deque()		# Moments of recent restarts.
+	stopping = None
+	while self.working():
+		m = self.select(ar.Completed, ar.Stop)
+		if isinstance(m, ar.Stop):		# Control-c.
+			stopping = stopping or ar.Aborted()
+			stop_workers()
+			continue
+
+		number, p = self.debrief()
+		if p is None:				# End of a delay.
+			if not stopping:
+				start_worker(number)
+			continue
+		code, out = m.value
+		value = worker_output(out)
+		summary.exit_codes.append(code)
+		if isinstance(value, ar.Aborted):
+			summary.aborted += 1
+		else:
+			summary.faulted += 1
+
+		if stopping:
+			continue
+		self.console(f'Worker [{number}] ({p.pid}) ended with {code} ({value})')
+
+		# Forget restarts older than the window. A worker
+		# that ran for a whole window starts its backoff over.
+		now = time.monotonic()
+		while restarted and restarted[0] < now - settings.restart_window:
+			restarted.popleft()
+		if number not in backoff or now - started[number] >= settings.restart_window:
+			backoff[number] = decorrelated_jitter(settings.restart_base, settings.restart_cap)
+
+		# Cannot listen at all, or too many restarts.
+		# Bring everything down.
+		if isinstance(value, ar.NotListening):
+			stopping = value
+		elif len(restarted) >= settings.max_restarts:
+			stopping = ar.Faulted('too many restarts', f'{len(restarted)} within {settings.restart_window:.0f}s, worker [{number}] ended with {code}')
+		else:
+			delay = next(backoff[number])
+			a = self.create(restart_delay, delay)
+			self.assign(a, (number, None))
+			restarted.append(now)
+			summary.restarts += 1
+			self.console(f'Restart of worker [{number}] in {delay:.2f}s')
+			continue
+
+		stop_workers()
+
+	self.console(f'Workers - {summary}')
+	if not isinstance(stopping, ar.Aborted):
+		return stopping
+	return summary
+
+ar.bind(listen_at_address)
+
+# Configuration for this executable.
+class Settings(object):
+	def __init__(self, server_name=None, host=None, port=None, workers=None, max_restarts=None,
+			restart_window=None, restart_base=None, restart_cap=None):
+		self.server_name = server_name
+		self.host = host
+		self.port = port
+		self.workers = workers
+		self.max_restarts = max_restarts
+		self.restart_window = restart_window
+		self.restart_base = restart_base
+		self.restart_cap = restart_cap
+
+SETTINGS_SCHEMA = {
+	'server_name': str,
+	'host': str,
+	'port': int,
+	'workers': int,			# Number of listening processes.
+	'max_restarts': int,		# Within the window, before giving up on the service.
+	'restart_window': float,	# Period over which restarts are counted.
+	'restart_base': float,		# First delay before a restart.
+	'restart_cap': float,		# Longest delay before a restart.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(server_name='Buster', host='127.0.0.1', port=32011,
+	workers=os.cpu_count() or 1, max_restarts=16,
+	restart_window=600.0, restart_base=0.5, restart_cap=30.0)
+
+# Entry point.
+if __name__ == '__main__':
+	ar.create_object(listen_at_address, factory_settings=factory_settings)
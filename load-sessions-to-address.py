@@ -0,0 +1,148 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A session-based load generator.
+
+The load-generating version of connect-session-to-address. Creates many
+sessions against a single server, with a limit on the number of sessions
+in progress and a limit on the rate at which new sessions are started.
+Each session sends a series of Hellos and records the Hello-Welcome round
+trips. The merged results are returned as a LatencyReport.
+
+A session shed by the server, i.e. Rejected, is counted as failed.
+'''
+import time
+import ansar.connect as ar
+from hello_welcome import *
+from latency import *
+from admission import Rejected
+
+# Session object.
+def loaded_to_address(self, client_name, hello_count, remote_address=None, **kv):
+	latency = Latency()
+	for i in range(hello_count):
+		hello = Hello(my_name=client_name)
+		sent = time.perf_counter()
+		self.send(hello, remote_address)
+
+		m = self.select(Welcome, Rejected, ar.Stop)
+		if isinstance(m, Rejected):
+			return m
+		elif isinstance(m, ar.Stop):
+			return ar.Aborted()
+		latency.sample(time.perf_counter() - sent)
+	return latency
+
+ar.bind(loaded_to_address)
+
+# Client object.
+def connect_to_address(self, settings):
+	client_name = settings.client_name
+	sessions = settings.sessions
+	concurrency = max(1, settings.concurrency)
+	hello_count = settings.hello_count
+
+	if sessions < 1:		# Nothing to wait for.
+		return Latency().report(0.0)
+
+	ipp = ar.HostPort(settings.host, settings.port)					# Where to expect the service.
+	session = ar.CreateFrame(loaded_to_address, client_name, hello_count)	# Description of a session.
+
+	# Sessions are started whenever there is room within the
+	# concurrency limit, at no more than the ramp-up rate. The
+	# allowance is renewed on a quarter-second tick, i.e. the
+	# resolution of the timer service.
+	TICK = 0.25
+	per_tick = max(1, int(settings.ramp_up * TICK))
+	self.start(ar.T1, TICK, repeating=True)
+
+	latency = Latency()
+	allowance = per_tick
+	started = 0
+	ended = 0
+	failed = 0
+	first = time.perf_counter()
+	while True:
+		n = min(allowance, sessions - started, concurrency - (started - ended))
+		for i in range(n):
+			ar.connect(self, ipp, session=session)
+		if n > 0:
+			allowance -= n
+			started += n
+
+		m = self.select(ar.T1, ar.Connected, ar.NotConnected, ar.Closed, ar.Abandoned, ar.Stop)
+		if isinstance(m, ar.T1):
+			allowance = per_tick
+			continue
+		elif isinstance(m, ar.Connected):
+			continue
+		elif isinstance(m, ar.Closed):				# Session completed.
+			if isinstance(m.value, Latency):
+				latency.merge(m.value)
+			else:
+				failed += 1
+		elif isinstance(m, (ar.NotConnected, ar.Abandoned)):
+			failed += 1
+		elif isinstance(m, ar.Stop):
+			return ar.Aborted()
+
+		ended += 1
+		if ended >= sessions:
+			break
+
+	self.cancel(ar.T1)
+	report = latency.report(time.perf_counter() - first, sessions=sessions, failed=failed)
+	self.console(f'Load - {report}')
+	return report
+
+ar.bind(connect_to_address)
+
+#
+#
+class Settings(object):
+	def __init__(self, client_name=None, host=None, port=None,
+			sessions=None, concurrency=None, ramp_up=None, hello_count=None):
+		self.client_name = client_name
+		self.host = host
+		self.port = port
+		self.sessions = sessions
+		self.concurrency = concurrency
+		self.ramp_up = ramp_up
+		self.hello_count = hello_count
+
+SETTINGS_SCHEMA = {
+	'client_name': str,
+	'host': str,
+	'port': int,
+	'sessions': int,		# Total number of sessions.
+	'concurrency': int,		# Maximum sessions in progress.
+	'ramp_up': float,		# New sessions per second.
+	'hello_count': int,		# Hellos per session.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+factory_settings = Settings(client_name='Gladys', host='127.0.0.1', port=32011,
+	sessions=1000, concurrency=100, ramp_up=500.0, hello_count=10)
+
+if __name__ == '__main__':
+	ar.create_object(connect_to_address, factory_settings=factory_settings)
@@ -0,0 +1,136 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Client-side load balancing across a group of servers.
+
+A Balancer tracks the servers of a GroupTable that are currently
+connected, the requests outstanding at each and the observed response
+times. Each request goes to the server chosen by the policy;
+
+* round-robin, each connected server in turn,
+* least-outstanding, the server with the fewest requests in progress,
+* power-of-two, the cheaper of two servers chosen at random.
+
+Response time is a peak-sensitive moving average, i.e. a slow response
+takes effect immediately and a fast one decays in over decay_seconds.
+The cost of a server is that average, or the age of its oldest request
+if that is greater, multiplied by the requests in progress. A server
+that stalls becomes expensive at once, without waiting for a response.
+
+When a server is lost its outstanding requests are returned to the
+caller, for sending elsewhere.
+'''
+import math
+import random
+
+__all__ = [
+	'ROUND_ROBIN',
+	'LEAST_OUTSTANDING',
+	'POWER_OF_TWO',
+	'BALANCING_POLICIES',
+	'Balancer',
+]
+
+ROUND_ROBIN = 'round-robin'
+LEAST_OUTSTANDING = 'least-outstanding'
+POWER_OF_TWO = 'power-of-two'
+
+BALANCING_POLICIES = (ROUND_ROBIN, LEAST_OUTSTANDING, POWER_OF_TWO)
+
+# Runtime image of one server.
+class BalancedMember(object):
+	def __init__(self, key, address):
+		self.key = key
+		self.address = address
+		self.outstanding = {}		# Request id to moment of sending, oldest first.
+		self.average = 0.0
+		self.updated = None
+		self.completed = 0
+
+	def sample(self, seconds, now, decay_seconds):
+		if self.updated is None or seconds > self.average:
+			self.average = seconds
+		else:
+			w = math.exp(-(now - self.updated) / decay_seconds)
+			self.average = self.average * w + seconds * (1.0 - w)
+		self.updated = now
+		self.completed += 1
+
+	def cost(self, now):
+		latency = self.average
+		if self.outstanding:
+			latency = max(latency, now - next(iter(self.outstanding.values())))
+		return latency * (len(self.outstanding) + 1)
+
+class Balancer(object):
+	def __init__(self, policy=POWER_OF_TWO, decay_seconds=1.0):
+		if policy not in BALANCING_POLICIES:
+			raise ValueError(f'unknown balancing policy "{policy}"')
+		self.policy = policy
+		self.decay_seconds = decay_seconds
+		self.member = {}			# Key to member, connected servers only.
+		self.request = {}			# Request id to member.
+		self.turn = 0
+
+	def update(self, key, address):
+		'''Server connected or lost, e.g. from a GroupUpdate. Return the ids of requests orphaned by a loss.'''
+		lost = self.member.pop(key, None)
+		if address is not None:
+			self.member[key] = BalancedMember(key, address)
+		if lost is None:
+			return []
+		for i in lost.outstanding.keys():
+			self.request.pop(i, None)
+		return list(lost.outstanding.keys())
+
+	def up(self):
+		'''Return true if there is at least one server to choose from.'''
+		return len(self.member) > 0
+
+	def pick(self, now):
+		'''Choose a server according to the policy. Return the member or None.'''
+		members = list(self.member.values())
+		if not members:
+			return None
+		if self.policy == ROUND_ROBIN:
+			self.turn = (self.turn + 1) % len(members)
+			return members[self.turn]
+		elif self.policy == LEAST_OUTSTANDING:
+			return min(members, key=lambda m: (len(m.outstanding), m.average))
+		if len(members) == 1:
+			return members[0]
+		a, b = random.sample(members, 2)
+		return a if a.cost(now) <= b.cost(now) else b
+
+	def sent(self, member, request_id, now):
+		'''Request sent to the chosen server.'''
+		member.outstanding[request_id] = now
+		self.request[request_id] = member
+
+	def received(self, request_id, now):
+		'''Response arrived. Return the member and round-trip, or None for an unknown request.'''
+		m = self.request.pop(request_id, None)
+		if m is None:
+			return None
+		seconds = now - m.outstanding.pop(request_id)
+		m.sample(seconds, now, self.decay_seconds)
+		return m, seconds
@@ -0,0 +1,148 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Unix domain sockets for co-located clients and servers.
+
+The ar.listen and ar.connect functions always create TCP sockets. After
+a call to enable_local_sockets(), a host that is a filesystem path, e.g.
+--host=/run/buster.sock, is taken to be a Unix domain socket. Loopback
+TCP is bypassed, along with its checksums, congestion control and timers.
+Everything above the socket is unchanged, i.e. sessions and the Accepted,
+Connected and Closed messages behave as they do over TCP, so a client and
+server need nothing more than a change of settings.
+
+The port is ignored for a local address. The path is created by the
+listen, replacing any stale socket left by a previous process, and is
+removed when the listen stops.
+'''
+import os
+import stat
+import errno
+import socket
+import types
+import ansar.connect.socketry as socketry
+
+__all__ = [
+	'local_path',
+	'enable_local_sockets',
+]
+
+def local_path(address):
+	'''Return the path of a local address, or None for a network address.'''
+	if isinstance(address, tuple) and address and isinstance(address[0], str) and address[0].startswith('/'):
+		return address[0]
+	return None
+
+def remove_stale(path):
+	'''Remove a socket file that no process is listening on.'''
+	try:
+		if not stat.S_ISSOCK(os.stat(path).st_mode):
+			return
+	except OSError:
+		return
+	probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		probe.connect(path)
+	except ConnectionRefusedError:
+		os.unlink(path)
+	except OSError:
+		pass
+	finally:
+		probe.close()
+
+class LocalSocket(socket.socket):
+	'''A socket that becomes a Unix domain socket when given a local address.'''
+	local_path = None
+	listening_path = None
+
+	def become_local(self, path):
+		if self.family != socket.AF_UNIX:
+			blocking = self.getblocking()
+			os.close(self.detach())
+			socket.socket.__init__(self, socket.AF_UNIX, socket.SOCK_STREAM)
+			self.setblocking(blocking)
+		self.local_path = path
+
+	def bind(self, address):
+		path = local_path(address)
+		if path is None:
+			return socket.socket.bind(self, address)
+		self.become_local(path)
+		remove_stale(path)
+		socket.socket.bind(self, path)
+		self.listening_path = path
+
+	def connect_ex(self, address):
+		path = local_path(address)
+		if path is None:
+			return socket.socket.connect_ex(self, address)
+		self.become_local(path)
+		e = socket.socket.connect_ex(self, path)
+		if e == errno.EAGAIN:		# Backlog full, as close to EINPROGRESS as it gets.
+			return errno.ECONNREFUSED
+		return e
+
+	def connect(self, address):
+		path = local_path(address)
+		if path is None:
+			return socket.socket.connect(self, address)
+		self.become_local(path)
+		socket.socket.connect(self, path)
+
+	# Present local addresses in the (host, port) form
+	# expected above the socket.
+	def getsockname(self):
+		if self.local_path is None:
+			return socket.socket.getsockname(self)
+		return (self.local_path, 0)
+
+	def accept(self):
+		s, address = socket.socket.accept(self)
+		if self.local_path is None:
+			return s, address
+		return s, (self.local_path, 0)
+
+	def close(self):
+		path, self.listening_path = self.listening_path, None
+		socket.socket.close(self)
+		if path is not None:
+			try:
+				os.unlink(path)
+			except OSError:
+				pass
+
+def enable_local_sockets():
+	'''Listening and connecting sockets created from here on, accept local addresses. Return success.'''
+	if not hasattr(socket, 'AF_UNIX'):
+		return False
+	current = getattr(socketry.socket, 'socket', socket.socket)
+	if issubclass(current, LocalSocket):
+		return True
+	if current is socket.socket:
+		local = LocalSocket
+	else:							# Already adapted, e.g. port sharing.
+		local = type('LocalSocket', (LocalSocket, current), {})
+	adapted = types.ModuleType('socket')
+	adapted.__dict__.update(socketry.socket.__dict__)
+	adapted.socket = local
+	socketry.socket = adapted
+	return True
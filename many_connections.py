@@ -0,0 +1,171 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Networking beyond 1024 connections.
+
+The networking thread waits on its sockets with select.select(), which
+cannot accept a file descriptor above FD_SETSIZE, i.e. 1023. A process
+therefore cannot hold more than about a thousand connections. Calling
+enable_poll_select() replaces that call, in this process, with an epoll()
+object (poll() where epoll is not available) that has no such limit.
+
+Registrations persist between calls. The socket lists are compared with
+their previous contents and only the sockets that were added or removed
+are registered again. With epoll the kernel also reports only the ready
+sockets, so the cost of a wakeup does not grow with idle connections,
+e.g. while sends to many connections wake the thread one at a time.
+
+Listening sockets are also created with a backlog of 5, after which the
+kernel drops connection requests and the client retries a second or more
+later. Calling enable_listen_backlog() raises that to the system limit.
+Both are arranged by enable_many_connections().
+'''
+import types
+import socket
+import select
+import threading
+import ansar.connect.socketry as socketry
+
+__all__ = [
+	'PollSelect',
+	'enable_poll_select',
+	'enable_listen_backlog',
+	'enable_many_connections',
+]
+
+READ = select.POLLIN
+WRITE = select.POLLOUT
+EXCEPTIONAL = select.POLLPRI
+FAILED = select.POLLERR | select.POLLHUP | select.POLLNVAL
+
+class PollSelect(object):
+	'''Stand-in for select.select(), keeping registrations between calls.'''
+	def __init__(self):
+		self.epoll = hasattr(select, 'epoll')
+		self.poll = select.epoll() if self.epoll else select.poll()
+		self.previous = ([], [], [])		# Lists as last seen.
+		self.watched = (set(), set(), set())
+		self.fd = {}			# Socket to registered descriptor.
+		self.socket = {}		# Descriptor to socket.
+
+	def update(self, s):
+		r, w, x = self.watched
+		mask = (READ if s in r else 0) | (WRITE if s in w else 0) | (EXCEPTIONAL if s in x else 0)
+		fd = self.fd.pop(s, None)
+		if fd is not None and self.socket.get(fd) is s:
+			del self.socket[fd]
+			self.unregister(fd)
+		fd = s.fileno()
+		if not mask or fd < 0:
+			return
+		stale = self.socket.pop(fd, None)		# Descriptor reused after a close.
+		if stale is not None:
+			self.fd.pop(stale, None)
+			self.unregister(fd)
+		self.poll.register(fd, mask)
+		self.fd[s] = fd
+		self.socket[fd] = s
+
+	def unregister(self, fd):
+		try:
+			self.poll.unregister(fd)
+		except (OSError, KeyError):		# Closed, and removed by epoll.
+			pass
+
+	def select(self, receiving, sending, faulting, timeout=None):
+		touched = set()
+		for i, sockets in enumerate((receiving, sending, faulting)):
+			if sockets == self.previous[i]:
+				continue
+			now = set(sockets)
+			touched |= now.symmetric_difference(self.watched[i])
+			self.watched[i].clear()
+			self.watched[i].update(now)
+			self.previous[i][:] = sockets
+		for s in touched:
+			self.update(s)
+
+		if self.epoll:
+			wait = -1 if timeout is None else max(0.0, timeout)
+		else:
+			wait = None if timeout is None else max(0, int(timeout * 1000))
+		r, w, x = self.watched
+		R, S, F = [], [], []
+		for fd, events in self.poll.poll(wait):
+			s = self.socket.get(fd, None)
+			if s is None:
+				continue
+			reported = False
+			if events & (READ | FAILED) and s in r:
+				R.append(s)
+				reported = True
+			if events & (WRITE | FAILED) and s in w:
+				S.append(s)
+				reported = True
+			if (events & EXCEPTIONAL or (events & FAILED and not reported)) and s in x:
+				F.append(s)
+		return R, S, F
+
+def enable_poll_select():
+	'''Sockets are waited on with poll() from here on. Return success.'''
+	if not hasattr(select, 'poll'):
+		return False
+	if isinstance(getattr(socketry.select, 'per_thread', None), threading.local):
+		return True
+	per_thread = threading.local()
+
+	def poll_select(receiving, sending, faulting, timeout=None):
+		p = getattr(per_thread, 'poll_select', None)
+		if p is None:
+			p = PollSelect()
+			per_thread.poll_select = p
+		return p.select(receiving, sending, faulting, timeout)
+
+	polling = types.ModuleType('select')
+	polling.__dict__.update(select.__dict__)
+	polling.select = poll_select
+	polling.per_thread = per_thread
+	socketry.select = polling
+	return True
+
+class BacklogSocket(socket.socket):
+	def listen(self, backlog=None):
+		socket.socket.listen(self, max(backlog or 0, socket.SOMAXCONN))
+
+def enable_listen_backlog():
+	'''Listening sockets created from here on, queue as many connections as the system allows. Return success.'''
+	current = getattr(socketry.socket, 'socket', socket.socket)
+	if issubclass(current, BacklogSocket):
+		return True
+	if current is socket.socket:
+		backlog_socket = BacklogSocket
+	else:							# Already adapted, e.g. local sockets.
+		backlog_socket = type('BacklogSocket', (BacklogSocket, current), {})
+	queueing = types.ModuleType('socket')
+	queueing.__dict__.update(socketry.socket.__dict__)
+	queueing.socket = backlog_socket
+	socketry.socket = queueing
+	return True
+
+def enable_many_connections():
+	'''Lift the limits on connections to this process. Return success.'''
+	return enable_poll_select() and enable_listen_backlog()
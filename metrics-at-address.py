@@ -0,0 +1,81 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Fetch the runtime metrics of a server.
+
+Connects to listen-at-address or listen-fsm-at-address, sends a
+GetMetrics and returns the MetricsSnapshot.
+'''
+import ansar.connect as ar
+from server_metrics import *
+
+# The client object.
+def metrics_at_address(self, settings):
+	ipp = ar.HostPort(settings.host, settings.port)		# Where to expect the service.
+	ar.connect(self, ipp)
+
+	m = self.select(ar.Connected, ar.NotConnected, ar.Stop)
+	if isinstance(m, ar.NotConnected):
+		return m
+	elif isinstance(m, ar.Stop):
+		return ar.Aborted()
+	server_address = self.return_address
+
+	self.send(GetMetrics(connections=settings.connections), server_address)
+
+	m = self.select(MetricsSnapshot, ar.Closed, ar.Abandoned, ar.Stop, seconds=3.0)
+	if isinstance(m, MetricsSnapshot):
+		pass
+	elif isinstance(m, (ar.Closed, ar.Abandoned)):
+		return m
+	elif isinstance(m, ar.Stop):
+		return ar.Aborted()
+	elif isinstance(m, ar.SelectTimer):
+		return ar.TimedOut(m)
+
+	self.send(ar.Close(), server_address)
+	self.select(ar.Closed, ar.Abandoned, ar.Stop)
+	return m
+
+ar.bind(metrics_at_address)
+
+#
+#
+class Settings(object):
+	def __init__(self, host=None, port=None, connections=None):
+		self.host = host
+		self.port = port
+		self.connections = connections
+
+SETTINGS_SCHEMA = {
+	'host': str,
+	'port': int,
+	'connections': bool,	# Include per-connection details.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(host='127.0.0.1', port=32011, connections=True)
+
+if __name__ == '__main__':
+	ar.create_object(metrics_at_address, factory_settings=factory_settings)
@@ -0,0 +1,210 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Many logical sessions over a single network connection.
+
+Normally every session has a connection of its own. A multiplexer on
+the connecting side creates a number of sessions and carries all their
+traffic over the one connection. The mux_session on the listening side
+creates a matching session for each stream. Each pair of sessions talks
+as if they were alone on a connection, i.e. session objects do not need
+to change.
+
+Streams are numbered by the multiplexer. A stream is opened with MuxOpen
+and the reply, MuxOpened, comes from the new session on the listening
+side. Thereafter messages pass directly to that session and its replies
+come back to the multiplexer. Flow control is a window of messages per
+stream, i.e. no more than window messages are in flight before the
+multiplexer holds further messages for that stream. A stream closes
+when either session completes, with the value carried back in MuxClosed.
+
+Any other message reaching the mux_session, e.g. from a plain client,
+is answered with a Faulted and the connection is closed.
+'''
+from collections import deque
+import ansar.connect as ar
+
+__all__ = [
+	'MuxOpen',
+	'MuxOpened',
+	'MuxClose',
+	'MuxClosed',
+	'mux_session',
+	'multiplexer',
+]
+
+class MuxOpen(object):
+	def __init__(self, stream_id=0, window=0):
+		self.stream_id = stream_id
+		self.window = window
+
+class MuxOpened(object):
+	def __init__(self, stream_id=0):
+		self.stream_id = stream_id
+
+class MuxClose(object):
+	def __init__(self, stream_id=0):
+		self.stream_id = stream_id
+
+class MuxClosed(object):
+	def __init__(self, stream_id=0, value=None):
+		self.stream_id = stream_id
+		self.value = value
+
+MUX_SCHEMA = {
+	'stream_id': int,
+	'window': int,
+	'value': ar.Any(),
+}
+
+ar.bind(MuxOpen, object_schema=MUX_SCHEMA)
+ar.bind(MuxOpened, object_schema=MUX_SCHEMA)
+ar.bind(MuxClose, object_schema=MUX_SCHEMA)
+ar.bind(MuxClosed, object_schema=MUX_SCHEMA)
+
+# Listening side. Passed to ar.listen as the session,
+# wrapping the description of the per-stream session.
+def mux_session(self, session, remote_address=None, controller_address=None, **kv):
+	stream = {}			# Stream id to session address.
+	value = ar.Aborted()
+
+	while True:
+		m = self.select(MuxOpen, MuxClose, ar.Completed, ar.Stop, ar.Other)
+		if isinstance(m, MuxOpen):
+			if m.stream_id in stream:
+				continue
+			a = self.create(session.object_type, *session.args,
+				remote_address=self.return_address, controller_address=controller_address,
+				**session.kw)
+			self.assign(a, (m.stream_id, self.return_address))
+			stream[m.stream_id] = a
+			self.forward(MuxOpened(stream_id=m.stream_id), self.return_address, a)
+
+		elif isinstance(m, MuxClose):
+			a = stream.get(m.stream_id, None)
+			if a is not None:
+				self.send(ar.Stop(), a)
+
+		elif isinstance(m, ar.Completed):
+			stream_id, client = self.debrief()
+			stream.pop(stream_id, None)
+			self.send(MuxClosed(stream_id=stream_id, value=m.value), client)
+
+		elif isinstance(m, ar.Stop):		# Connection lost or closing.
+			break
+
+		else:		# Not from a multiplexer, e.g. a plain client.
+			value = ar.Faulted('not multiplexed', f'unexpected {type(m.value).__name__}, expecting MuxOpen')
+			self.reply(value)
+			break
+
+	for a in stream.values():
+		self.send(ar.Stop(), a)
+	while self.working():
+		self.select(ar.Completed)
+		self.debrief()
+	return value
+
+ar.bind(mux_session)
+
+# Runtime image of one stream.
+class MuxStream(object):
+	def __init__(self, stream_id, session_address):
+		self.stream_id = stream_id
+		self.session_address = session_address
+		self.remote_address = None		# Session at the other end, once open.
+		self.in_flight = 0
+		self.held = deque()
+		self.value = None
+		self.closed = False
+
+# Connecting side. Passed to ar.connect as the session. Returns
+# the values of the per-stream sessions, in stream order.
+def multiplexer(self, session, streams, window, remote_address=None, **kv):
+	window = max(1, window)
+	by_id = []
+	local = {}			# Session address to stream.
+	remote = {}			# Remote session address to stream.
+
+	for i in range(streams):
+		a = self.create(session.object_type, *session.args, remote_address=self.address, **session.kw)
+		s = MuxStream(i, a)
+		by_id.append(s)
+		local[a] = s
+		self.send(MuxOpen(stream_id=i, window=window), remote_address)
+
+	def release(s):
+		while s.held and s.in_flight < window:
+			self.send(s.held.popleft(), s.remote_address)
+			s.in_flight += 1
+
+	opened = streams		# Not yet closed at the remote end.
+	while self.working() or opened:
+		m = self.select(MuxOpened, MuxClosed, ar.Completed, ar.Stop, ar.Other)
+		if isinstance(m, MuxOpened):
+			s = by_id[m.stream_id]
+			s.remote_address = self.return_address
+			remote[s.remote_address] = s
+			release(s)
+
+		elif isinstance(m, MuxClosed):
+			s = by_id[m.stream_id]
+			s.closed = True
+			opened -= 1
+			remote.pop(s.remote_address, None)
+			if s.session_address in local:		# Ended at the remote end.
+				s.value = m.value
+				self.send(ar.Stop(), s.session_address)
+
+		elif isinstance(m, ar.Completed):
+			s = local.pop(self.return_address, None)
+			if s is None:
+				continue
+			if not isinstance(m.value, ar.Aborted) or s.value is None:
+				s.value = m.value
+			if not s.closed:
+				self.send(MuxClose(stream_id=s.stream_id), remote_address)
+
+		elif isinstance(m, ar.Stop):		# Connection lost or closing.
+			for a in local.keys():
+				self.send(ar.Stop(), a)
+			opened = 0
+
+		else:
+			m = m.value
+			s = local.get(self.return_address, None)
+			if s is not None:				# Outbound on a stream.
+				s.held.append(m)
+				if s.remote_address is not None:
+					release(s)
+				continue
+			s = remote.get(self.return_address, None)
+			if s is not None:				# Inbound on a stream.
+				if s.in_flight > 0:
+					s.in_flight -= 1
+				release(s)
+				if s.session_address in local:
+					self.send(m, s.session_address)
+
+	return [s.value for s in by_id]
+
+ar.bind(multiplexer)
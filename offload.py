@@ -0,0 +1,145 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Offload of request handling to a pool of threads or processes.
+
+The select loop of a server is the one place where connections are
+accepted and closed, and where every request arrives. Any real work
+done inline stalls all of it. An Offload passes each request to a
+concurrent.futures executor and a small waiting object is created
+for the resulting future. The response is delivered in a Completed
+message, along with the return address saved at the time of the
+request, so the reply still reaches the original client. Where the
+work fails, that reply is a Faulted.
+
+At most size requests are in the executor. A further max_pending are
+held in order. Beyond that the request is answered with a Busy, i.e.
+the client is told to back off rather than the server queueing
+without limit.
+'''
+import hashlib
+import multiprocessing
+from collections import deque
+import concurrent.futures as cf
+import ansar.connect as ar
+from hello_welcome import *
+
+__all__ = [
+	'Busy',
+	'POOL',
+	'Offload',
+	'wait_for_future',
+	'welcome_work',
+]
+
+class Busy(object):
+	'''Notification to a client that requests were not accepted.'''
+	def __init__(self, request_ids=None, retry_after=0.0):
+		self.request_ids = request_ids or []
+		self.retry_after = retry_after
+
+BUSY_SCHEMA = {
+	'request_ids': ar.VectorOf(ar.Integer8()),
+	'retry_after': float,
+}
+
+ar.bind(Busy, object_schema=BUSY_SCHEMA)
+
+# Wait for completion of a future. Runs in
+# a thread of its own.
+def wait_for_future(self, f):
+	try:
+		return f.result()
+	except cf.CancelledError:
+		return ar.Aborted()
+	except Exception as e:
+		return ar.Faulted('offloaded request failed', str(e))
+
+ar.bind(wait_for_future)
+
+def welcome_work(server_name, request, rounds):
+	'''The per-request work. A module function so that it can run in another process.'''
+	def work(h):
+		d = (h.my_name or '').encode('utf-8')
+		for i in range(rounds):
+			d = hashlib.sha256(d).digest()
+		return Welcome(your_name=h.my_name, my_name=server_name, request_id=h.request_id)
+
+	if isinstance(request, HelloBatch):
+		return WelcomeBatch(welcomes=[work(h) for h in request.hellos])
+	return work(request)
+
+# Processes are spawned rather than forked, as the
+# server is already multi-threaded.
+def thread_pool(size):
+	return cf.ThreadPoolExecutor(max_workers=size)
+
+def process_pool(size):
+	return cf.ProcessPoolExecutor(max_workers=size, mp_context=multiprocessing.get_context('spawn'))
+
+POOL = {
+	'thread': thread_pool,
+	'process': process_pool,
+}
+
+class Offload(object):
+	def __init__(self, kind, size, max_pending, server_name, rounds):
+		self.executor = POOL[kind](size)
+		self.size = size
+		self.max_pending = max_pending
+		self.server_name = server_name
+		self.rounds = rounds
+		self.in_flight = 0
+		self.pending = deque()
+		self.busy = 0
+
+	def start(self, server, request, job):
+		f = self.executor.submit(welcome_work, self.server_name, request, self.rounds)
+		a = server.create(wait_for_future, f)
+		server.assign(a, job)
+		self.in_flight += 1
+
+	def submit(self, server, request, job):
+		'''Start the request, hold it or return a Busy.'''
+		if self.in_flight < self.size:
+			self.start(server, request, job)
+			return None
+		if len(self.pending) < self.max_pending:
+			self.pending.append((request, job))
+			return None
+		self.busy += 1
+		if isinstance(request, HelloBatch):
+			return Busy(request_ids=[h.request_id for h in request.hellos], retry_after=0.25)
+		return Busy(request_ids=[request.request_id], retry_after=0.25)
+
+	def completed(self, server):
+		'''A request has finished. Start the next and return its job.'''
+		job = server.debrief()
+		self.in_flight -= 1
+		if self.pending:
+			request, j = self.pending.popleft()
+			self.start(server, request, j)
+		return job
+
+	def shutdown(self):
+		self.pending.clear()
+		self.executor.shutdown(wait=False, cancel_futures=True)
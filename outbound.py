@@ -0,0 +1,65 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Outbound backlog of a network connection.
+
+Messages sent to a remote address are queued by the proxy and encoded
+into a buffer as the socket becomes writable. The proxy encodes no more
+than a few KB ahead of the socket, so a client that is not reading
+leaves the kernel send queue full and the bulk of the backlog as
+messages waiting to be encoded.
+
+The outbound_bytes function reports the encoded buffer, the kernel send
+queue and an estimate for the waiting messages, i.e. their number times
+an expected frame size. That allows a server to detect a slow consumer
+before the backlog grows without limit. Only sizes are read, never the
+content, so the lookup is safe from the thread of a session.
+'''
+import fcntl
+import struct
+import termios
+import ansar.connect as ar
+
+__all__ = [
+	'FRAME_BYTES',
+	'outbound_bytes',
+]
+
+INT = struct.Struct('i')
+
+# Expected size of a frame not yet encoded, e.g. a Welcome.
+FRAME_BYTES = 192
+
+def outbound_bytes(remote_address, frame_bytes=FRAME_BYTES):
+	'''Bytes waiting to be sent to the remote address, or None if the connection has gone.'''
+	proxy = ar.find_object(remote_address)
+	transport = getattr(proxy, 'transport', None)
+	if transport is None:
+		return None
+	waiting = len(transport.pending) + len(transport.messages_to_encode)
+	queued = len(transport.encoded_bytes) + waiting * frame_bytes
+	try:
+		b = fcntl.ioctl(proxy.s.fileno(), termios.TIOCOUTQ, INT.pack(0))
+		queued += INT.unpack(b)[0]
+	except (OSError, ValueError):		# Closed.
+		pass
+	return queued
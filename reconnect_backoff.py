@@ -0,0 +1,179 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Reconnection with backoff, jitter and a circuit breaker.
+
+BackoffConnectToAddress is a drop-in replacement for ar.ConnectToAddress,
+e.g. within a GroupTable. Where the library schedules retries from
+a fixed table of intervals, this object uses exponential backoff with
+decorrelated jitter. A large number of clients that lose a server at
+the same moment then spread their reconnects over time, rather than
+arriving at the server in lockstep.
+
+After a run of consecutive failures the breaker opens. Retries stop
+and the state is reported. With a non-zero breaker_seconds a single
+probe is made after that period (half-open), otherwise the object
+completes with Exhausted, as the library object does when retries
+run out.
+
+Progress is reported in ReconnectMetrics messages, sent to the
+metrics_address.
+'''
+import random
+import ansar.connect as ar
+import ansar.connect.networking as networking
+from latency import *
+from compiled_dispatch import *
+
+__all__ = [
+	'BackoffIntervals',
+	'ReconnectMetrics',
+	'decorrelated_jitter',
+	'BackoffConnectToAddress',
+]
+
+class BackoffIntervals(object):
+	def __init__(self, base=0.5, cap=30.0, breaker_failures=8, breaker_seconds=60.0):
+		self.base = base
+		self.cap = cap
+		self.breaker_failures = breaker_failures
+		self.breaker_seconds = breaker_seconds
+
+BACKOFF_SCHEMA = {
+	'base': float,				# First delay and lower bound.
+	'cap': float,				# Upper bound on any delay.
+	'breaker_failures': int,	# Consecutive failures that open the breaker, or zero.
+	'breaker_seconds': float,	# Open period before a probe, or zero to give up.
+}
+
+ar.bind(BackoffIntervals, object_schema=BACKOFF_SCHEMA)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+class ReconnectMetrics(object):
+	def __init__(self, requested_ipp=None, breaker=CLOSED, retries=0, failures=0, consecutive=0,
+			lost=0, breaker_trips=0, delay=None):
+		self.requested_ipp = requested_ipp or ar.HostPort()
+		self.breaker = breaker
+		self.retries = retries
+		self.failures = failures
+		self.consecutive = consecutive
+		self.lost = lost
+		self.breaker_trips = breaker_trips
+		self.delay = delay
+
+	def __str__(self):
+		return (f'{self.requested_ipp} breaker {self.breaker}, {self.retries} retries, {self.failures} failed '
+			f'({self.consecutive} consecutive), {self.lost} lost, {self.breaker_trips} trips, delay p50={self.delay.p50:.2f}s')
+
+METRICS_SCHEMA = {
+	'requested_ipp': ar.UserDefined(ar.HostPort),
+	'breaker': str,
+	'retries': int,				# Scheduled after a failure or loss.
+	'failures': int,			# NotConnected.
+	'consecutive': int,
+	'lost': int,				# Abandoned.
+	'breaker_trips': int,
+	'delay': ar.UserDefined(LatencyReport),		# Backoff periods.
+}
+
+ar.bind(ReconnectMetrics, object_schema=METRICS_SCHEMA)
+
+def decorrelated_jitter(base, cap):
+	'''Generate an endless sequence of delays, each a random choice between base and 3 times the previous.'''
+	delay = base
+	while True:
+		delay = min(cap, random.uniform(base, delay * 3.0))
+		yield delay
+
+# Same machine as the library object. Retries are scheduled
+# differently and a connection resets the breaker.
+class BackoffConnectToAddress(ar.ConnectToAddress, CompiledStateMachine):
+	def __init__(self, ipp, backoff=None, metrics_address=None, **kw):
+		ar.ConnectToAddress.__init__(self, ipp, **kw)
+		self.backoff = backoff or BackoffIntervals()
+		self.metrics_address = metrics_address
+
+		self.breaker = CLOSED
+		self.failures = 0
+		self.consecutive = 0
+		self.lost = 0
+		self.breaker_trips = 0
+		self.delay = Latency()
+
+	def report(self):
+		if self.metrics_address is None:
+			return
+		m = ReconnectMetrics(requested_ipp=self.ipp, breaker=self.breaker,
+			retries=self.delay.total(), failures=self.failures, consecutive=self.consecutive,
+			lost=self.lost, breaker_trips=self.breaker_trips,
+			delay=self.delay.report(0.0))
+		self.send(m, self.metrics_address)
+
+	def reschedule(self):
+		b = self.backoff
+		if self.attempts == 0:		# Lost an established connection.
+			self.lost += 1
+			self.consecutive = 0
+			self.breaker = CLOSED
+			self.retry = None
+		else:
+			self.failures += 1
+			self.consecutive += 1
+
+		if self.breaker == HALF_OPEN or (b.breaker_failures and self.consecutive >= b.breaker_failures):
+			if self.breaker == CLOSED:
+				self.breaker_trips += 1
+			self.breaker = OPEN
+			self.retry = None
+			self.warning(f'Breaker open for {self.ipp} after {self.consecutive} consecutive failures')
+			if not b.breaker_seconds:
+				self.report()
+				return False
+			self.breaker = HALF_OPEN		# After the period.
+			p = b.breaker_seconds
+		else:
+			if self.retry is None:
+				self.retry = decorrelated_jitter(b.base, b.cap)
+			p = next(self.retry)
+
+		self.delay.sample(p)
+		self.report()
+		self.start(networking.GlareTimer, p)
+		return True
+
+def BackoffConnectToAddress_PENDING_Connected(self, message):
+	self.consecutive = 0
+	self.breaker = CLOSED
+	self.report()
+	return networking.ConnectToAddress_PENDING_Connected(self, message)
+
+# Everything else is the library machine.
+for state, (matching, saving) in networking.CONNECT_TO_ADDRESS_DISPATCH.items():
+	for m in matching:
+		name = f'{state.__name__}_{m.__name__}'
+		globals().setdefault(f'BackoffConnectToAddress_{name}', getattr(networking, f'ConnectToAddress_{name}'))
+
+ar.bind(BackoffConnectToAddress, networking.CONNECT_TO_ADDRESS_DISPATCH, thread='networking-session')
+compile_dispatch(BackoffConnectToAddress)
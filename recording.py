@@ -0,0 +1,150 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Capture of network traffic, for replay.
+
+Calling enable_recording() arranges for every frame sent or received
+over a connection, in this process, to be appended to a recording file.
+Each record carries the time, a connection id and the direction, with
+the frame exactly as it appeared on the connection. The first record
+of each connection holds the remote address. Encrypted connections are
+not recorded.
+
+Recording happens on the networking thread, as the transport encodes
+and recovers frames. Writes are buffered and the file is closed at
+exit. Call enable_recording() after any other adaptation of the
+transport, e.g. enable_block_framing().
+
+A recording can be read back with read_recording(), e.g. by
+replay-to-address.
+'''
+import time
+import struct
+import atexit
+import ansar.connect.socketry as socketry
+
+__all__ = [
+	'RECORD_OPEN',
+	'RECORD_INBOUND',
+	'RECORD_OUTBOUND',
+	'Recorder',
+	'enable_recording',
+	'read_recording',
+	'frame_size',
+]
+
+RECORDING_MAGIC = b'ansar-recording 1\n'
+
+# Time, connection id, kind and length of the
+# bytes that follow.
+RECORD = struct.Struct('<dIBI')
+
+RECORD_OPEN = 0			# Remote address, as text.
+RECORD_INBOUND = 1		# Frame received.
+RECORD_OUTBOUND = 2		# Frame sent.
+
+class Recorder(object):
+	def __init__(self, recording_file):
+		self.file = open(recording_file, 'ab')
+		if self.file.tell() == 0:
+			self.file.write(RECORDING_MAGIC)
+		self.connections = 0
+		self.records = 0
+
+	def connection(self, transport):
+		'''Id of the connection, recording the remote address on first sight. Return None if not recorded.'''
+		c = getattr(transport, 'recording_id', None)
+		if c is not None:
+			return c
+		if transport.key_box is not None:
+			return None
+		self.connections += 1
+		c = self.connections
+		transport.recording_id = c
+		opened = transport.opened
+		ipp = getattr(opened, 'accepted_ipp', None) or getattr(opened, 'requested_ipp', None)
+		self.record(c, RECORD_OPEN, str(ipp).encode('utf-8'))
+		return c
+
+	def record(self, c, kind, b):
+		self.file.write(RECORD.pack(time.time(), c, kind, len(b)))
+		self.file.write(b)
+		self.records += 1
+
+	def close(self):
+		self.file.close()
+
+def enable_recording(recording_file):
+	'''Frames sent and received from here on, are appended to the file. Return the Recorder.'''
+	recorder = Recorder(recording_file)
+	atexit.register(recorder.close)
+
+	message_to_block = socketry.MessageStream.message_to_block
+	recover_frame = socketry.MessageStream.recover_frame
+
+	def recording_message_to_block(self, mtr):
+		encoded_bytes = self.transport.encoded_bytes
+		start = len(encoded_bytes)
+		message_to_block(self, mtr)
+		c = recorder.connection(self.transport)
+		if c is not None:
+			recorder.record(c, RECORD_OUTBOUND, bytes(encoded_bytes[start:]))
+
+	def recording_recover_frame(self, received):
+		for h, b, a in recover_frame(self, received):
+			c = recorder.connection(self.transport)
+			if c is not None:
+				n0, n1 = len(h), len(b)
+				f = b''.join((f'{n0},{n1},{n0 + n1 + len(a)}\n'.encode('ascii'), h, b, a, b'\n'))
+				recorder.record(c, RECORD_INBOUND, f)
+			yield h, b, a
+
+	socketry.MessageStream.message_to_block = recording_message_to_block
+	socketry.MessageStream.recover_frame = recording_recover_frame
+	return recorder
+
+def read_recording(recording_file):
+	'''Generate the (time, connection id, kind, bytes) records in a file.'''
+	with open(recording_file, 'rb') as f:
+		magic = f.read(len(RECORDING_MAGIC))
+		if magic != RECORDING_MAGIC:
+			raise ValueError(f'"{recording_file}" is not a recording')
+		while True:
+			r = f.read(RECORD.size)
+			if len(r) < RECORD.size:		# End, or a partial record from an interrupted writer.
+				return
+			at, c, kind, n = RECORD.unpack(r)
+			b = f.read(n)
+			if len(b) < n:
+				return
+			yield at, c, kind, b
+
+def frame_size(buffered):
+	'''Length of the complete frame at the start of the bytes, or zero.'''
+	eol = buffered.find(b'\n', 0, 64)
+	if eol < 0:
+		return 0
+	n = int(buffered[:eol].rsplit(b',', 1)[1])
+	size = eol + 1 + n + 1
+	if len(buffered) < size:
+		return 0
+	return size
@@ -0,0 +1,265 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Replay of recorded traffic against a server.
+
+Reads a recording made with enable_recording(), e.g. by listen-at-address
+--record-file, and sends the frames from each recorded client over a
+connection of its own. Frames are sent exactly as recorded, at the
+original pacing scaled by speed, or as fast as possible with a speed
+of zero. A recording made by a client, e.g. connect-to-address, is
+replayed with --direction=outbound.
+
+Frames coming back from the server are counted and paired with the
+frames sent, in order, i.e. the latency figures assume request-response
+traffic such as Hello-Welcome, and are measured from the moment each
+frame was due. Returns a ReplayReport, for comparison
+of server builds against identical traffic.
+'''
+import os
+import time
+import errno
+import socket
+import selectors
+import ansar.connect as ar
+from latency import *
+from recording import *
+from local_socket import local_path
+from server_metrics import queue_depth
+
+class ReplayReport(object):
+	def __init__(self, connections=0, frames=0, bytes_sent=0, responses=0, recorded_responses=0,
+			lag=0.0, latency=None):
+		self.connections = connections
+		self.frames = frames
+		self.bytes_sent = bytes_sent
+		self.responses = responses
+		self.recorded_responses = recorded_responses
+		self.lag = lag
+		self.latency = latency
+
+	def __str__(self):
+		return (f'{self.frames} frames ({self.bytes_sent} bytes) over {self.connections} connections, '
+			f'{self.responses} responses ({self.recorded_responses} recorded), lag {self.lag * 1000.0:.3f}ms')
+
+REPORT_SCHEMA = {
+	'connections': int,
+	'frames': int,
+	'bytes_sent': int,
+	'responses': int,
+	'recorded_responses': int,		# In the recording, for comparison.
+	'lag': float,					# Furthest behind the recorded pacing.
+	'latency': ar.UserDefined(LatencyReport),
+}
+
+ar.bind(ReplayReport, object_schema=REPORT_SCHEMA)
+
+# Runtime image of a replayed connection.
+class ReplayConnection(object):
+	def __init__(self, s):
+		self.s = s
+		self.connecting = True
+		self.pending = bytearray()		# Due but not yet accepted by the socket.
+		self.received = bytearray()
+		self.sent = []					# Moments frames were due, awaiting responses.
+		self.responded = 0
+
+	def events(self):
+		if self.connecting or self.pending:
+			return selectors.EVENT_READ | selectors.EVENT_WRITE
+		return selectors.EVENT_READ
+
+# Start a connection without waiting for it to complete, i.e. the
+# replay continues while connections are queued at the server.
+def open_connection(ipp):
+	path = local_path(ipp.inet())
+	if path is not None:
+		s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		s.setblocking(False)
+		e = s.connect_ex(path)
+	else:
+		s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		s.setblocking(False)
+		e = s.connect_ex(ipp.inet())
+	if e not in (0, errno.EINPROGRESS, errno.EAGAIN):
+		s.close()
+		raise OSError(e, os.strerror(e))
+	return s
+
+# The replay object.
+def replay_to_address(self, settings):
+	ipp = ar.HostPort(settings.host, settings.port)
+	if settings.direction == 'inbound':
+		sending, responding = RECORD_INBOUND, RECORD_OUTBOUND
+	elif settings.direction == 'outbound':
+		sending, responding = RECORD_OUTBOUND, RECORD_INBOUND
+	else:
+		return ar.Faulted(f'unknown direction "{settings.direction}"', 'expecting inbound or outbound')
+
+	# Load the frames to be sent.
+	try:
+		schedule = []
+		recorded_responses = 0
+		first = None
+		for at, c, kind, b in read_recording(settings.recording_file):
+			if first is None:
+				first = at
+			if kind == sending:
+				schedule.append((at - first, c, b))
+			elif kind == responding:
+				recorded_responses += 1
+	except (OSError, ValueError) as e:
+		return ar.Faulted(f'cannot read recording "{settings.recording_file}"', str(e))
+
+	speed = settings.speed
+	selector = selectors.DefaultSelector()
+	connection = {}			# Recorded id to connection.
+	latency = Latency()
+	report = ReplayReport(recorded_responses=recorded_responses)
+
+	def send(r):
+		if r.connecting:
+			e = r.s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+			if e:
+				raise OSError(e, os.strerror(e))
+			r.connecting = False
+		if r.pending:
+			try:
+				n = r.s.send(r.pending)
+				del r.pending[:n]
+			except BlockingIOError:
+				pass
+		selector.modify(r.s, r.events(), r)
+
+	def receive(r):
+		try:
+			b = r.s.recv(65536)
+		except BlockingIOError:
+			return
+		if not b:
+			raise ConnectionError('closed by server')
+		r.received += b
+		now = time.perf_counter()
+		while True:
+			n = frame_size(r.received)
+			if n == 0:
+				break
+			del r.received[:n]
+			report.responses += 1
+			if r.responded < len(r.sent):
+				latency.sample(now - r.sent[r.responded])
+				r.responded += 1
+
+	def outstanding():
+		return sum(len(r.sent) - r.responded for r in connection.values())
+
+	def stopped():
+		if queue_depth(self) == 0:
+			return False
+		m = self.select(ar.Stop, seconds=0.25)
+		return isinstance(m, ar.Stop)
+
+	started = time.perf_counter()
+	i, n = 0, len(schedule)
+	draining = None
+	try:
+		while i < n or (outstanding() and time.perf_counter() < draining):
+			now = time.perf_counter() - started
+			while i < n:
+				offset, c, b = schedule[i]
+				due = offset / speed if speed > 0.0 else 0.0
+				if due > now:
+					break
+				r = connection.get(c, None)
+				if r is None:
+					r = ReplayConnection(open_connection(ipp))
+					selector.register(r.s, r.events(), r)
+					connection[c] = r
+				elif not r.pending and not r.connecting:
+					selector.modify(r.s, r.events() | selectors.EVENT_WRITE, r)
+				r.pending += b
+				r.sent.append(time.perf_counter())
+				report.frames += 1
+				report.bytes_sent += len(b)
+				if speed > 0.0:
+					report.lag = max(report.lag, now - due)
+				i += 1
+				if speed <= 0.0 and i % 64 == 0:
+					break		# Collect responses.
+
+			if i < n:
+				wait = max(0.0, min(0.25, schedule[i][0] / speed - now)) if speed > 0.0 else 0.0
+			else:
+				if draining is None:
+					draining = time.perf_counter() + settings.drain_seconds
+				wait = 0.25
+			for k, events in selector.select(wait):
+				if events & selectors.EVENT_WRITE:
+					send(k.data)
+				if events & selectors.EVENT_READ:
+					receive(k.data)
+			if stopped():
+				return ar.Aborted()
+	except OSError as e:
+		return ar.Faulted(f'replay to "{ipp}" failed', str(e))
+	finally:
+		for r in connection.values():
+			r.s.close()
+		selector.close()
+
+	report.connections = len(connection)
+	report.latency = latency.report(time.perf_counter() - started, sessions=len(connection))
+	self.console(f'Replay - {report}')
+	self.console(f'Latency - {report.latency}')
+	return report
+
+ar.bind(replay_to_address)
+
+# Configuration for this executable.
+class Settings(object):
+	def __init__(self, host=None, port=None, recording_file=None, direction=None, speed=None, drain_seconds=None):
+		self.host = host
+		self.port = port
+		self.recording_file = recording_file
+		self.direction = direction
+		self.speed = speed
+		self.drain_seconds = drain_seconds
+
+SETTINGS_SCHEMA = {
+	'host': str,
+	'port': int,
+	'recording_file': str,
+	'direction': str,			# Frames to send, inbound or outbound at the recorder.
+	'speed': float,				# Multiple of the recorded pacing, or zero for as fast as possible.
+	'drain_seconds': float,		# Wait for responses at the end.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(host='127.0.0.1', port=32011, recording_file='recording.bin',
+	direction='inbound', speed=1.0, drain_seconds=3.0)
+
+# Entry point.
+if __name__ == '__main__':
+	ar.create_object(replay_to_address, factory_settings=factory_settings)
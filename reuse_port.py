@@ -0,0 +1,60 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Port sharing for multiple listening processes.
+
+The ar.listen function sets SO_REUSEADDR on its listening socket but
+provides no way to ask for SO_REUSEPORT. Calling enable_reuse_port()
+before ar.listen arranges for SO_REUSEPORT to be set alongside, in this
+process. Several processes can then listen at the same address and the
+kernel balances the inbound connections across them.
+'''
+import socket
+import types
+import ansar.connect.socketry as socketry
+
+__all__ = [
+	'enable_reuse_port',
+]
+
+class ReusePortSocket(socket.socket):
+	def setsockopt(self, level, option, value, *optlen):
+		socket.socket.setsockopt(self, level, option, value, *optlen)
+		if level == socket.SOL_SOCKET and option == socket.SO_REUSEADDR and value:
+			socket.socket.setsockopt(self, socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+def enable_reuse_port():
+	'''Listening sockets created from here on, share their port. Return success.'''
+	if not hasattr(socket, 'SO_REUSEPORT'):
+		return False
+	current = getattr(socketry.socket, 'socket', socket.socket)
+	if issubclass(current, ReusePortSocket):
+		return True
+	if current is socket.socket:
+		sharing_socket = ReusePortSocket
+	else:							# Already adapted, e.g. local sockets.
+		sharing_socket = type('ReusePortSocket', (ReusePortSocket, current), {})
+	sharing = types.ModuleType('socket')
+	sharing.__dict__.update(socketry.socket.__dict__)
+	sharing.socket = sharing_socket
+	socketry.socket = sharing
+	return True
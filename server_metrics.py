@@ -0,0 +1,225 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Runtime metrics for the listening servers.
+
+A ServerMetrics object is updated by a server as it processes Accepted,
+Hello and Closed/Abandoned. Every update happens on the thread of the
+owning server object, so the counters are plain integers with no locking.
+Service times go into a Latency histogram, i.e. fixed memory.
+
+Byte counts are read from the kernel (TCP_INFO) for the one connection
+that a Hello arrived on, and the difference from the previous reading
+is added to the totals. A snapshot costs nothing per connection and the
+totals include connections that have since closed.
+
+Any connected client can send a GetMetrics and receive a MetricsSnapshot
+in reply, e.g. metrics-at-address.
+'''
+import time
+import socket
+import struct
+import ansar.connect as ar
+from latency import *
+
+__all__ = [
+	'GetMetrics',
+	'ConnectionMetrics',
+	'MetricsSnapshot',
+	'ServerMetrics',
+	'queue_depth',
+]
+
+class GetMetrics(object):
+	'''Request for a MetricsSnapshot.'''
+	def __init__(self, connections=True):
+		self.connections = connections
+
+GET_SCHEMA = {
+	'connections': bool,
+}
+
+ar.bind(GetMetrics, object_schema=GET_SCHEMA)
+
+class ConnectionMetrics(object):
+	def __init__(self, accepted_ipp=None, hellos=0, peak_queue_depth=0, bytes_read=0, bytes_written=0):
+		self.accepted_ipp = accepted_ipp
+		self.hellos = hellos
+		self.peak_queue_depth = peak_queue_depth
+		self.bytes_read = bytes_read
+		self.bytes_written = bytes_written
+
+CONNECTION_SCHEMA = {
+	'accepted_ipp': str,
+	'hellos': int,
+	'peak_queue_depth': int,
+	'bytes_read': int,			# As of the latest Hello.
+	'bytes_written': int,
+}
+
+ar.bind(ConnectionMetrics, object_schema=CONNECTION_SCHEMA)
+
+class MetricsSnapshot(object):
+	def __init__(self, uptime=0.0, accepted=0, rejected=0, live=0, hellos=0,
+			accept_rate=0.0, hello_rate=0.0, service=None,
+			bytes_read=0, bytes_written=0,
+			queue_depth=0, peak_queue_depth=0, cache_hits=0, cache_misses=0, connections=None):
+		self.uptime = uptime
+		self.accepted = accepted
+		self.rejected = rejected
+		self.live = live
+		self.hellos = hellos
+		self.accept_rate = accept_rate
+		self.hello_rate = hello_rate
+		self.service = service
+		self.bytes_read = bytes_read
+		self.bytes_written = bytes_written
+		self.queue_depth = queue_depth
+		self.peak_queue_depth = peak_queue_depth
+		self.cache_hits = cache_hits
+		self.cache_misses = cache_misses
+		self.connections = connections or []
+
+SNAPSHOT_SCHEMA = {
+	'uptime': float,
+	'accepted': int,
+	'rejected': int,			# Shed by admission control.
+	'live': int,
+	'hellos': int,
+	'accept_rate': float,		# Since previous snapshot.
+	'hello_rate': float,		# Since previous snapshot.
+	'service': ar.UserDefined(LatencyReport),
+	'bytes_read': int,			# Over all connections, as of their latest Hello.
+	'bytes_written': int,
+	'queue_depth': int,
+	'peak_queue_depth': int,
+	'cache_hits': int,			# Welcome cache, if enabled.
+	'cache_misses': int,
+	'connections': ar.VectorOf(ar.UserDefined(ConnectionMetrics)),
+}
+
+ar.bind(MetricsSnapshot, object_schema=SNAPSHOT_SCHEMA)
+
+def queue_depth(self):
+	'''Number of messages waiting for the given object.'''
+	q = getattr(self, 'message_queue', None)
+	if q is None:
+		q = getattr(self.assigned_queue, 'message_queue', None)
+		if q is None:
+			return 0
+	return q.qsize()
+
+# Offset of tcpi_bytes_acked and tcpi_bytes_received
+# within the Linux tcp_info structure.
+TCP_INFO_BYTES = struct.Struct('=QQ')
+TCP_INFO_OFFSET = 120
+
+def tcp_bytes(remote_address):
+	'''Bytes received and sent over the connection to the remote address. Return a tuple or None.'''
+	tcp_info = getattr(socket, 'TCP_INFO', None)
+	if tcp_info is None:
+		return None
+	proxy = ar.find_object(remote_address)
+	s = getattr(proxy, 's', None)
+	if s is None:
+		return None
+	try:
+		b = s.getsockopt(socket.IPPROTO_TCP, tcp_info, 256)
+	except OSError:			# Closed.
+		return None
+	if len(b) < TCP_INFO_OFFSET + TCP_INFO_BYTES.size:
+		return None
+	acked, received = TCP_INFO_BYTES.unpack_from(b, TCP_INFO_OFFSET)
+	return received, acked
+
+class ServerMetrics(object):
+	def __init__(self):
+		self.started = time.monotonic()
+		self.accepted = 0
+		self.rejected = 0
+		self.hellos = 0
+		self.service = Latency()
+		self.peak_queue_depth = 0
+		self.bytes_read = 0
+		self.bytes_written = 0
+		self.connection = {}		# Keyed on address of remote.
+
+		self.previous_at = self.started
+		self.previous_accepted = 0
+		self.previous_hellos = 0
+
+	def accept(self, remote_address, accepted_ipp):
+		self.accepted += 1
+		self.connection[remote_address] = ConnectionMetrics(accepted_ipp=str(accepted_ipp))
+
+	def reject(self):
+		self.rejected += 1
+
+	def close(self, remote_address):
+		self.connection.pop(remote_address, None)
+
+	def hello(self, return_address, depth, seconds, count=1):
+		self.hellos += count
+		self.service.sample(seconds)
+		if depth > self.peak_queue_depth:
+			self.peak_queue_depth = depth
+		# Requests from remote objects have the address of
+		# the local proxy at the end.
+		remote_address = return_address[-1:]
+		c = self.connection.get(remote_address, None)
+		if c is None:
+			return
+		c.hellos += count
+		if depth > c.peak_queue_depth:
+			c.peak_queue_depth = depth
+
+		# Keep a running total, i.e. the increase
+		# since the previous reading.
+		t = tcp_bytes(remote_address)
+		if t is None:
+			return
+		read, written = t
+		self.bytes_read += read - c.bytes_read
+		self.bytes_written += written - c.bytes_written
+		c.bytes_read, c.bytes_written = read, written
+
+	def snapshot(self, depth=0, connections=True, cache=None):
+		now = time.monotonic()
+		uptime = now - self.started
+		span = now - self.previous_at
+		s = MetricsSnapshot(uptime=uptime, accepted=self.accepted, rejected=self.rejected, live=len(self.connection), hellos=self.hellos,
+			service=self.service.report(uptime),
+			bytes_read=self.bytes_read, bytes_written=self.bytes_written,
+			queue_depth=depth, peak_queue_depth=self.peak_queue_depth)
+		if span > 0.0:
+			s.accept_rate = (self.accepted - self.previous_accepted) / span
+			s.hello_rate = (self.hellos - self.previous_hellos) / span
+		if connections:
+			s.connections = list(self.connection.values())
+		if cache is not None:
+			s.cache_hits = cache.hits
+			s.cache_misses = cache.misses
+
+		self.previous_at = now
+		self.previous_accepted = self.accepted
+		self.previous_hellos = self.hellos
+		return s
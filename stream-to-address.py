@@ -0,0 +1,150 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Stream a large payload to a server.
+
+Connects to listen-at-address and streams either a file or, where no
+file is configured, a synthetic payload of the given size. Hellos are
+sent on the same connection during the stream, to show that messages
+are interleaved with the chunks rather than queued behind the whole.
+
+Returns a StreamReport, with the latency of the interleaved Hellos.
+'''
+import mmap
+import time
+import ansar.connect as ar
+from hello_welcome import *
+from latency import *
+from streaming import *
+
+class StreamReport(object):
+	def __init__(self, name=None, size=0, seconds=0.0, rate=0.0, hellos=None):
+		self.name = name
+		self.size = size
+		self.seconds = seconds
+		self.rate = rate
+		self.hellos = hellos
+
+	def __str__(self):
+		return f'"{self.name}" {self.size} bytes in {self.seconds:.3f}s ({self.rate:.1f}MB/s), hellos {self.hellos}'
+
+REPORT_SCHEMA = {
+	'name': str,
+	'size': int,
+	'seconds': float,
+	'rate': float,				# Megabytes per second.
+	'hellos': ar.UserDefined(LatencyReport),
+}
+
+ar.bind(StreamReport, object_schema=REPORT_SCHEMA)
+
+# The client object.
+def stream_to_address(self, settings):
+	ipp = ar.HostPort(settings.host, settings.port)
+	ar.connect(self, ipp)
+	m = self.select(ar.Connected, ar.NotConnected, ar.Stop)
+	if isinstance(m, ar.NotConnected):
+		return m
+	elif isinstance(m, ar.Stop):
+		return ar.Aborted()
+	server_address = self.return_address
+
+	if settings.stream_file:
+		payload = settings.stream_file
+	else:
+		payload = mmap.mmap(-1, max(1, settings.payload_size))		# Anonymous, zeroed.
+
+	started = time.monotonic()
+	sender = self.create(send_stream, payload, server_address, chunk_size=settings.chunk_size)
+
+	# Keep talking while the stream is in progress.
+	latency = Latency()
+	sent = None
+	if settings.hello_seconds:
+		self.start(ar.T1, settings.hello_seconds, repeating=True)
+	while True:
+		m = self.select(ar.Completed, Welcome, ar.T1, ar.Closed, ar.Abandoned, ar.Stop)
+		if isinstance(m, ar.Completed):
+			break
+		elif isinstance(m, Welcome):
+			if sent is not None:
+				latency.sample(time.monotonic() - sent)
+				sent = None
+		elif isinstance(m, ar.T1):
+			if sent is None:
+				sent = time.monotonic()
+				self.send(Hello(my_name=settings.client_name), server_address)
+		elif isinstance(m, (ar.Closed, ar.Abandoned)):
+			self.send(ar.Stop(), sender)
+			self.select(ar.Completed)
+			return m
+		elif isinstance(m, ar.Stop):
+			self.send(ar.Stop(), sender)
+			self.select(ar.Completed)
+			return ar.Aborted()
+
+	seconds = time.monotonic() - started
+	self.send(ar.Close(), server_address)
+	self.select(ar.Closed, ar.Abandoned, seconds=3.0)
+
+	received = m.value
+	if not isinstance(received, StreamReceived):
+		return received
+	report = StreamReport(name=received.name, size=received.size, seconds=seconds,
+		rate=received.size / seconds / 1000000.0 if seconds > 0.0 else 0.0,
+		hellos=latency.report(seconds))
+	self.console(f'Streamed - {report}')
+	return report
+
+ar.bind(stream_to_address)
+
+# Configuration for this executable.
+class Settings(object):
+	def __init__(self, client_name=None, host=None, port=None, stream_file=None, payload_size=None,
+			chunk_size=None, hello_seconds=None):
+		self.client_name = client_name
+		self.host = host
+		self.port = port
+		self.stream_file = stream_file
+		self.payload_size = payload_size
+		self.chunk_size = chunk_size
+		self.hello_seconds = hello_seconds
+
+SETTINGS_SCHEMA = {
+	'client_name': str,
+	'host': str,
+	'port': int,
+	'stream_file': str,			# File to send, or empty.
+	'payload_size': int,		# Bytes of synthetic payload.
+	'chunk_size': int,
+	'hello_seconds': float,		# Between interleaved Hellos, or zero.
+}
+
+ar.bind(Settings, object_schema=SETTINGS_SCHEMA)
+
+# Initial values.
+factory_settings = Settings(client_name='Gladys', host='127.0.0.1', port=32011,
+	stream_file='', payload_size=64 * 1048576, chunk_size=CHUNK_SIZE, hello_seconds=0.25)
+
+# Entry point.
+if __name__ == '__main__':
+	ar.create_object(stream_to_address, factory_settings=factory_settings)
@@ -0,0 +1,272 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Streaming of large payloads over an established connection.
+
+A payload, either a file or a bytes-like object, is sent as a series
+of chunks, each an ar.Blob. A file is memory-mapped and each chunk
+is a memoryview of that mapping, i.e. the only copy is made by the
+transport, as it frames the chunk for the socket. At the receiving
+end each chunk is written to its place in the output file as it
+arrives. At no point is the full payload held as a Python object.
+
+The exchange is driven by credit. The sender opens with a StreamOpen
+and may send as many chunks as the receiver has granted through
+StreamCredit. The receiver grants more as it consumes, so there are
+never more than a window of chunks in flight. A StreamEnd after the
+last chunk is answered with StreamReceived, or a Faulted.
+
+The send_stream object does the sending, so that the object owning
+the connection remains free to handle other messages, e.g. Stop. As
+the chunks are separate frames, other messages on the connection are
+interleaved with them. A StreamReceiver tracks the inbound streams
+of a server. While a stream is open, Blobs from the sending object
+are chunks of that stream. After a failure at the receiver, e.g. an
+overrun or a full disk, the chunks still in flight from that sender are
+discarded, up to its StreamEnd or the loss of the connection.
+'''
+import os
+import time
+import mmap
+import ansar.connect as ar
+
+__all__ = [
+	'StreamOpen',
+	'StreamCredit',
+	'StreamEnd',
+	'StreamReceived',
+	'send_stream',
+	'StreamReceiver',
+	'CHUNK_SIZE',
+	'WINDOW',
+]
+
+CHUNK_SIZE = 256 * 1024
+MAXIMUM_CHUNK = 1048576 - 4096		# Within the frame limit of the transport.
+WINDOW = 8							# Chunks in flight.
+
+class StreamOpen(object):
+	def __init__(self, stream_id=0, name=None, size=0, chunk_size=0):
+		self.stream_id = stream_id
+		self.name = name
+		self.size = size
+		self.chunk_size = chunk_size
+
+class StreamCredit(object):
+	def __init__(self, stream_id=0, chunks=0):
+		self.stream_id = stream_id
+		self.chunks = chunks
+
+class StreamEnd(object):
+	def __init__(self, stream_id=0, size=0):
+		self.stream_id = stream_id
+		self.size = size
+
+class StreamReceived(object):
+	def __init__(self, stream_id=0, name=None, size=0, seconds=0.0):
+		self.stream_id = stream_id
+		self.name = name
+		self.size = size
+		self.seconds = seconds
+
+	def __str__(self):
+		rate = self.size / self.seconds / 1000000.0 if self.seconds > 0.0 else 0.0
+		return f'"{self.name}" {self.size} bytes in {self.seconds:.3f}s ({rate:.1f}MB/s)'
+
+STREAM_SCHEMA = {
+	'stream_id': int,
+	'name': str,
+	'size': int,
+	'chunk_size': int,
+	'chunks': int,
+	'seconds': float,
+}
+
+ar.bind(StreamOpen, object_schema=STREAM_SCHEMA)
+ar.bind(StreamCredit, object_schema=STREAM_SCHEMA)
+ar.bind(StreamEnd, object_schema=STREAM_SCHEMA)
+ar.bind(StreamReceived, object_schema=STREAM_SCHEMA)
+
+# Framed by the transport as any other Blob but sent
+# without the usual copy, i.e. the block can be a view.
+class Chunk(ar.Blob):
+	pass
+
+ar.bind(Chunk, object_schema={'block': ar.Block()}, copy_before_sending=False)
+
+def payload_view(payload):
+	'''Present the payload as bytes. Return a memoryview and the mapping, if any.'''
+	if isinstance(payload, str):
+		with open(payload, 'rb') as f:
+			if os.fstat(f.fileno()).st_size == 0:
+				return memoryview(b''), None
+			mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		return memoryview(mapped), mapped
+	return memoryview(payload).cast('B'), None
+
+def release(view, mapped):
+	# Chunks not yet framed by the transport are
+	# still referring to the mapping. Leave those
+	# to the garbage collector.
+	try:
+		view.release()
+		if mapped is not None:
+			mapped.close()
+	except BufferError:
+		pass
+
+# The sending object.
+def send_stream(self, payload, remote_address, name=None, stream_id=0, chunk_size=CHUNK_SIZE, seconds=10.0):
+	try:
+		view, mapped = payload_view(payload)
+	except OSError as e:
+		return ar.Faulted(f'cannot stream "{payload}"', str(e))
+	size = len(view)
+	chunk_size = max(1, min(chunk_size, MAXIMUM_CHUNK))
+	if name is None:
+		name = os.path.basename(payload) if isinstance(payload, str) else f'stream-{stream_id}'
+
+	self.send(StreamOpen(stream_id=stream_id, name=name, size=size, chunk_size=chunk_size), remote_address)
+	offset, credit, ended = 0, 0, False
+	try:
+		while True:
+			while credit > 0 and offset < size:
+				self.send(Chunk(block=view[offset:offset + chunk_size]), remote_address)
+				offset += chunk_size
+				credit -= 1
+			if offset >= size and not ended:
+				self.send(StreamEnd(stream_id=stream_id, size=size), remote_address)
+				ended = True
+
+			# At this point can expect;
+			# 1. More credit,
+			# 2. Confirmation of the whole,
+			# 3. Failure at the receiver,
+			# 4. User intervention,
+			# 5. A stalled receiver.
+			m = self.select(StreamCredit, StreamReceived, ar.Faulted, ar.Stop, seconds=seconds)
+			if isinstance(m, StreamCredit):
+				credit += m.chunks
+			elif isinstance(m, (StreamReceived, ar.Faulted)):
+				return m
+			elif isinstance(m, ar.Stop):
+				return ar.Aborted()
+			elif isinstance(m, ar.SelectTimer):
+				return ar.TimedOut(m)
+	finally:
+		release(view, mapped)
+
+ar.bind(send_stream)
+
+# Runtime image of one inbound stream.
+class InboundStream(object):
+	def __init__(self, m, fd):
+		self.stream_id = m.stream_id
+		self.name = m.name
+		self.size = m.size
+		self.fd = fd
+		self.offset = 0
+		self.consumed = 0
+		self.started = time.monotonic()
+
+class StreamReceiver(object):
+	def __init__(self, directory=None, window=WINDOW):
+		self.directory = directory
+		self.window = max(2, window)
+		self.stream = {}		# Address of sender to InboundStream.
+		self.faulted = {}		# Address of sender to failed stream_id.
+
+	def open(self, m, return_address):
+		'''Start an inbound stream. Return the initial credit or a Faulted.'''
+		self.close(return_address)
+		self.faulted.pop(return_address, None)
+		fd = None
+		if self.directory:
+			name = os.path.basename(m.name or '') or f'stream-{m.stream_id}'
+			path = os.path.join(self.directory, name)
+			try:
+				fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+			except OSError as e:
+				return ar.Faulted(f'cannot receive "{path}"', str(e))
+		self.stream[return_address] = InboundStream(m, fd)
+		return StreamCredit(stream_id=m.stream_id, chunks=self.window)
+
+	def receiving(self, return_address):
+		return return_address in self.stream or return_address in self.faulted
+
+	def fault(self, return_address, s):
+		'''Abandon the stream, discarding any chunks still to arrive.'''
+		self.close(return_address)
+		self.faulted[return_address] = s.stream_id
+
+	def chunk(self, return_address, block):
+		'''Write the chunk in its place. Return further credit, a Faulted or None.'''
+		s = self.stream.get(return_address, None)
+		if s is None:			# In flight at the time of a failure.
+			return None
+		n = len(block)
+		if s.offset + n > s.size:
+			self.fault(return_address, s)
+			return ar.Faulted(f'overrun of "{s.name}"', f'{s.offset + n} bytes of {s.size}')
+		if s.fd is not None:
+			try:
+				os.pwrite(s.fd, block, s.offset)
+			except OSError as e:
+				self.fault(return_address, s)
+				return ar.Faulted(f'cannot write "{s.name}"', str(e))
+		s.offset += n
+		s.consumed += 1
+
+		# Grant in batches of half a window.
+		if s.consumed < self.window // 2:
+			return None
+		chunks, s.consumed = s.consumed, 0
+		return StreamCredit(stream_id=s.stream_id, chunks=chunks)
+
+	def end(self, m, return_address):
+		'''Complete the stream. Return StreamReceived or a Faulted.'''
+		s = self.stream.get(return_address, None)
+		if s is None:
+			if self.faulted.pop(return_address, None) is not None:
+				return ar.Faulted(f'stream {m.stream_id} failed earlier')
+			return ar.Faulted(f'no stream {m.stream_id}')
+		self.close(return_address)
+		if s.offset != m.size:
+			return ar.Faulted(f'short stream "{s.name}"', f'{s.offset} bytes of {m.size}')
+		return StreamReceived(stream_id=s.stream_id, name=s.name, size=s.offset,
+			seconds=time.monotonic() - s.started)
+
+	def close(self, return_address):
+		'''Discard the stream from the sender, if any.'''
+		s = self.stream.pop(return_address, None)
+		if s is not None and s.fd is not None:
+			os.close(s.fd)
+
+	def lost(self, remote_address):
+		'''Discard every stream over the lost connection.'''
+		# Addresses of remote senders end with the
+		# address of the local proxy.
+		n = len(remote_address)
+		for a in [a for a in self.stream.keys() if a[-n:] == remote_address]:
+			self.close(a)
+		for a in [a for a in self.faulted.keys() if a[-n:] == remote_address]:
+			del self.faulted[a]
@@ -0,0 +1,129 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Checks of the compact codec, i.e. round trips and malformed blocks.
+
+Run with python -m unittest test_compact_codec, or pytest.
+'''
+import random
+import unittest
+import ansar.encode as ar
+from hello_welcome import *
+from compact_codec import *
+
+def members(m):
+	'''Comparable form of a message, including nested messages.'''
+	if isinstance(m, list):
+		return [members(e) for e in m]
+	d = getattr(m, '__dict__', None)
+	if d is None:
+		return m
+	return (type(m).__name__, {k: members(v) for k, v in d.items()})
+
+def samples():
+	'''One of each message, covering the awkward values.'''
+	names = ['', 'Gladys', 'Zoë', '日本語', 'x' * 1000]
+	ids = [0, 1, -1, 63, -64, 64, 127, 128, 2 ** 31, -2 ** 31, 2 ** 62, 2 ** 63 - 1, -2 ** 63]
+	for n in names:
+		for i in ids:
+			yield Hello(my_name=n, request_id=i, trace_id=i // 2)
+			yield Welcome(your_name=n, my_name='Buster', request_id=i)
+	yield Hello(my_name=None)
+	yield HelloBatch(hellos=[])
+	yield WelcomeBatch(welcomes=[])
+	yield HelloBatch(hellos=[Hello(my_name=n, request_id=i) for n, i in zip(names, ids)])
+	yield WelcomeBatch(welcomes=[Welcome(your_name=n, my_name='Buster', request_id=i) for n, i in zip(names, ids)])
+	yield HelloBatch(hellos=[Hello(my_name='a', request_id=i) for i in range(300)])
+
+class TestRoundTrip(unittest.TestCase):
+	def test_messages(self):
+		for m in samples():
+			with self.subTest(message=members(m)):
+				b = HELLO_CODEC.encode(m)
+				d = HELLO_CODEC.decode(b)
+				self.assertIs(type(d), type(m))
+				self.assertEqual(members(d), members(m))
+
+	def test_blob(self):
+		m = Welcome(your_name='Gladys', my_name='Buster', request_id=7)
+		b = HELLO_CODEC.blob(m)
+		self.assertEqual(members(HELLO_CODEC.decode(b.block)), members(m))
+
+	def test_template(self):
+		m = Welcome(your_name='Gladys', my_name='Buster')
+		fill = HELLO_CODEC.template(m, 'request_id')
+		for i in (0, 1, -1, 2 ** 40):
+			m.request_id = i
+			self.assertEqual(fill(i), HELLO_CODEC.encode(m))
+
+class TestMalformed(unittest.TestCase):
+	def assertFails(self, block):
+		with self.assertRaises(CompactFailed):
+			HELLO_CODEC.decode(block)
+
+	def test_empty(self):
+		self.assertFails(b'')
+
+	def test_unknown_tag(self):
+		self.assertFails(b'\x09')
+		self.assertFails(b'\xff\xff\xff\x7f')
+
+	def test_truncated(self):
+		for m in samples():
+			b = bytes(HELLO_CODEC.encode(m))
+			for n in range(len(b)):
+				with self.subTest(message=members(m), length=n):
+					self.assertFails(b[:n])
+
+	def test_left_over(self):
+		b = HELLO_CODEC.encode(Hello(my_name='Gladys'))
+		self.assertFails(bytes(b) + b'\x00')
+
+	def test_oversize_string(self):
+		self.assertFails(b'\x00\x05ab')
+
+	def test_oversize_vector(self):
+		self.assertFails(b'\x02\xff\xff\xff\x7f')
+
+	def test_bad_utf8(self):
+		self.assertFails(b'\x00\x03\xff\xfe\x00\x00')
+
+	def test_garbage(self):
+		# Anything else may decode, but only ever
+		# fails with CompactFailed.
+		r = random.Random(1)
+		for _ in range(20000):
+			b = bytes(r.randrange(256) for _ in range(r.randrange(1, 24)))
+			try:
+				HELLO_CODEC.decode(b)
+			except CompactFailed:
+				pass
+
+	def test_request(self):
+		self.assertIsInstance(compact_request(b'\xff'), ar.Faulted)
+		w = HELLO_CODEC.encode(Welcome(your_name='a', my_name='b'))
+		self.assertIsInstance(compact_request(w), ar.Faulted)
+		h = compact_request(HELLO_CODEC.encode(Hello(my_name='a')))
+		self.assertIsInstance(h, Hello)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,109 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''Sampled tracing of request-response exchanges.
+
+A client decides whether to trace a Hello at the time of sending,
+at the configured rate. A traced Hello carries a non-zero trace_id
+and both ends record what happened to it, in time order;
+
+	client	connect		from ar.connect to Connected
+	client	Hello		from send to arrival of the Welcome (or time out)
+	server	queued		depth of the queue when the Hello was dequeued
+	server	dispatch	from dequeue to reply
+
+Events are written in the Chrome trace format, i.e. a JSON file
+that loads into chrome://tracing or ui.perfetto.dev. Timestamps come
+from the monotonic clock, which on Linux is shared by every process
+on a host. Loading the client and server files together lines up the
+two ends of each exchange, with flow arrows joining send and dispatch.
+The gaps between the spans are the network and the time the request
+spent in the server's queue.
+
+An untraced Hello costs a random number at the client and a test of
+an integer at the server. Recorded events are held in memory, up to
+a fixed limit, and written when the object terminates.
+'''
+import os
+import json
+import time
+import random
+import threading
+
+__all__ = [
+	'Tracer',
+]
+
+class Tracer(object):
+	def __init__(self, trace_file, rate=0.0, limit=65536):
+		self.trace_file = trace_file
+		self.rate = rate if trace_file else 0.0
+		self.limit = limit
+		self.pid = os.getpid()
+		self.event = []
+		self.dropped = 0
+		self.issued = 0
+
+	def sample(self):
+		'''Decide on tracing of a new request. Return a trace id, or zero.'''
+		if not self.rate or random.random() >= self.rate:
+			return 0
+		self.issued += 1
+		return (self.pid << 24) | (self.issued & 0xffffff)
+
+	def add(self, e):
+		if len(self.event) >= self.limit:
+			self.dropped += 1
+			return
+		e['pid'] = self.pid
+		e['tid'] = threading.get_ident()
+		self.event.append(e)
+
+	def span(self, name, trace_id, started, ended=None, **args):
+		'''Record a completed period, times from time.monotonic().'''
+		if not self.trace_file:
+			return
+		ended = time.monotonic() if ended is None else ended
+		args['trace_id'] = trace_id
+		self.add({'name': name, 'cat': 'hello', 'ph': 'X',
+			'ts': started * 1000000.0, 'dur': (ended - started) * 1000000.0,
+			'args': args})
+
+	def flow(self, trace_id, at, start):
+		'''Record one end of the arrow joining the client and server.'''
+		if not self.trace_file:
+			return
+		self.add({'name': 'hello', 'cat': 'hello', 'ph': 's' if start else 'f', 'bp': 'e',
+			'id': trace_id, 'ts': at * 1000000.0})
+
+	def store(self):
+		'''Write the recorded events, if any. Return the number written.'''
+		if not self.trace_file or not self.event:
+			return 0
+		trace = {
+			'traceEvents': self.event,
+			'displayTimeUnit': 'ms',
+			'otherData': {'dropped': self.dropped},
+		}
+		with open(self.trace_file, 'w') as f:
+			json.dump(trace, f)
+		return len(self.event)
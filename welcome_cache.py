@@ -0,0 +1,109 @@
+# Author: Scott Woods <scott.18.ansar@gmail.com>
+# MIT License
+#
+# Copyright (c) 2024 Scott Woods
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+'''A cache of Welcome responses, keyed on the name of the client.
+
+The server name is fixed for the life of a process and client names
+tend to repeat. A WelcomeCache holds, for each recently seen name, a
+Welcome object and two encodings of that Welcome with a gap for the
+request_id, one compact and one in the default encoding. A Hello is
+answered by filling the gap in the matching encoding, i.e. no object
+construction and no encoding of the names. The default encoding is
+sent as an EncodedMessage, which the transport puts on the wire as it
+is.
+
+Where a Welcome object is needed, e.g. in a WelcomeBatch, a Hello
+with no request_id is answered with the shared Welcome object.
+
+Entries are evicted in least-recently-used order once the size is
+reached. A size of zero disables the cache, every call producing a
+fresh response.
+'''
+from collections import OrderedDict
+import ansar.connect as ar
+from hello_welcome import *
+from broadcast import EncodedMessage, encode_once
+
+__all__ = [
+	'WelcomeCache',
+]
+
+def encoded_template(welcome):
+	'''Default encoding of the Welcome with a gap for the request_id. Return a function that fills the gap.'''
+	# Encode twice and find the one
+	# byte that differs.
+	welcome.request_id = 1
+	a = encode_once(welcome).block
+	welcome.request_id = 2
+	b = encode_once(welcome).block
+	welcome.request_id = 0
+	i = next(i for i, (x, y) in enumerate(zip(a, b)) if x != y)
+	before, after = a[:i], a[i + 1:]
+	if b != before + b'2' + after:
+		raise ValueError('no request_id gap in the encoded Welcome')
+	def fill(request_id):
+		return EncodedMessage(block=before + str(request_id).encode('ascii') + after, space=[])
+	return fill
+
+class WelcomeCache(object):
+	def __init__(self, server_name, size=0):
+		self.server_name = server_name
+		self.size = size
+		self.entry = OrderedDict()		# Name to Welcome and fill functions.
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def lookup(self, name):
+		e = self.entry.get(name, None)
+		if e is not None:
+			self.entry.move_to_end(name)
+			self.hits += 1
+			return e
+		self.misses += 1
+		welcome = Welcome(your_name=name, my_name=self.server_name)
+		e = (welcome, HELLO_CODEC.template(welcome, 'request_id'), encoded_template(welcome))
+		self.entry[name] = e
+		if len(self.entry) > self.size:
+			self.entry.popitem(last=False)
+			self.evictions += 1
+		return e
+
+	def welcome(self, hello):
+		'''Response to the Hello, in the default encoding.'''
+		if self.size and not hello.request_id:
+			return self.lookup(hello.my_name)[0]
+		return Welcome(your_name=hello.my_name, my_name=self.server_name, request_id=hello.request_id)
+
+	def encoded(self, hello):
+		'''Response to the Hello, in the default encoding and ready for sending.'''
+		if self.size:
+			fill = self.lookup(hello.my_name)[2]
+			return fill(hello.request_id)
+		return self.welcome(hello)
+
+	def blob(self, hello):
+		'''Response to the Hello, in the compact encoding.'''
+		if self.size:
+			fill = self.lookup(hello.my_name)[1]
+			return ar.Blob(block=fill(hello.request_id))
+		return HELLO_CODEC.blob(self.welcome(hello))